@@ -0,0 +1,343 @@
+"""
+Asyncio driver for the Keithley 2602.
+
+AsyncInstrument sends the same TSP as Instrument, but every bus transaction is awaited,
+so one event loop can drive many instruments, timers and the stream server without a
+thread per instrument. LAN instruments on a raw socket (TCPIP::host::port::SOCKET) are
+spoken to with native asyncio streams; any other VISA resource is opened through
+PyVISA and its blocking calls run on a small shared thread pool. Waiting for an
+instrument-side sweep is an asyncio.sleep between buffer polls, not a blocked thread.
+
+Usage:
+    async def main():
+        devices = [AsyncInstrument() for _ in resources]
+        await asyncio.gather(*(d.connect(r) for d, r in zip(devices, resources)))
+        await asyncio.gather(*(d.configure(compliance=1e-3) for d in devices))
+        results = await asyncio.gather(*(d.sweep(points) for d in devices))
+"""
+
+import asyncio
+import concurrent.futures
+import re
+import time
+import numpy as np
+from instrument import Instrument
+from logs import get_logger
+
+log = get_logger("async_instrument")
+
+SOCKET_RESOURCE = re.compile(r"^TCPIP\d*::([^:]+)::(\d+)::SOCKET$", re.IGNORECASE)
+
+_executor = None
+
+
+def shared_executor(max_workers=4):
+    """Thread pool shared by all AsyncInstrument objects for blocking VISA calls"""
+    global _executor
+    if _executor is None:
+        _executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="visa")
+    return _executor
+
+
+class SocketTransport:
+    """
+    Raw TSP over TCP with asyncio streams (one message per line)
+
+    Args:
+        host (str): Instrument address
+        port (int): Raw socket port (5025 on the 2600 series)
+        timeout (float): Timeout of connect and read in seconds
+        limit (int): Longest reply line in bytes (printbuffer replies are one line)
+    """
+
+    def __init__(self, host, port, timeout=10.0, limit=2 ** 24):
+        self.host = host
+        self.port = int(port)
+        self.timeout = timeout
+        self.limit = limit
+        self.reader = None
+        self.writer = None
+
+    async def open(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, limit=self.limit), self.timeout)
+
+    async def write(self, message):
+        self.writer.write((message + "\n").encode("ascii"))
+        await self.writer.drain()
+
+    async def read(self):
+        line = await asyncio.wait_for(self.reader.readline(), self.timeout)
+        if not line:
+            raise ConnectionError(f"Connection to {self.host}:{self.port} closed by the instrument")
+        return line.decode("ascii", errors="replace").rstrip("\r\n")
+
+    async def query(self, message):
+        await self.write(message)
+        return await self.read()
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except ConnectionError:
+                pass
+            self.writer = None
+
+
+class ExecutorTransport:
+    """
+    Blocking VISA resource driven from a bounded thread pool
+
+    Args:
+        resource_manager: PyVISA (or simulator) resource manager
+        resource_name (str): VISA resource name
+        executor (concurrent.futures.Executor): Pool running the blocking calls
+        timeout (float): VISA timeout in seconds
+    """
+
+    def __init__(self, resource_manager, resource_name, executor, timeout=10.0):
+        self.rm = resource_manager
+        self.resource_name = resource_name
+        self.executor = executor
+        self.timeout = timeout
+        self.resource = None
+
+    async def _run(self, function, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, function, *args)
+
+    async def open(self):
+        self.resource = await self._run(self.rm.open_resource, self.resource_name)
+        self.resource.timeout = int(self.timeout * 1000)
+        self.resource.write_termination = '\n'
+        self.resource.read_termination = '\n'
+
+    async def write(self, message):
+        await self._run(self.resource.write, message)
+
+    async def read(self):
+        return await self._run(self.resource.read)
+
+    async def query(self, message):
+        return await self._run(self.resource.query, message)
+
+    async def close(self):
+        if self.resource is not None:
+            await self._run(self.resource.close)
+            self.resource = None
+
+
+class AsyncInstrument:
+    """
+    Keithley 2602 (channel A) with awaitable connect, configure, sweep, fetch and ramp
+
+    Transactions of one instrument are serialized by an asyncio lock, so several tasks
+    may share it; different instruments run concurrently.
+
+    Args:
+        resource_manager (optional): Resource manager for non-socket resources; by default
+            a PyVISA ResourceManager with `backend` is created on first use
+        backend (str): PyVISA backend
+        executor (concurrent.futures.Executor, optional): Pool for blocking VISA calls;
+            None uses a pool shared by all instances
+        timeout (float): Bus timeout in seconds
+    """
+
+    def __init__(self, resource_manager=None, backend='@py', executor=None, timeout=10.0):
+        self.rm = resource_manager
+        self.backend = backend
+        self.executor = executor
+        self.timeout = timeout
+        self.transport = None
+        self.resource_name = None
+        self.compliance_limit = None
+        self.nplc = 1.0
+        self.lock = asyncio.Lock()
+
+    async def connect(self, resource_name):
+        """
+        Open the resource and reset the instrument
+
+        Returns:
+            str: Identification string
+        """
+        self.resource_name = resource_name
+        match = SOCKET_RESOURCE.match(resource_name)
+        try:
+            if match:
+                self.transport = SocketTransport(match.group(1), match.group(2), self.timeout)
+            else:
+                executor = self.executor or shared_executor()
+                if self.rm is None:
+                    import pyvisa
+                    self.rm = await asyncio.get_running_loop().run_in_executor(
+                        executor, pyvisa.ResourceManager, self.backend)
+                self.transport = ExecutorTransport(self.rm, resource_name, executor, self.timeout)
+            await self.transport.open()
+            log.info("Connected to %s (%s)", resource_name,
+                     "asyncio socket" if match else "VISA on thread pool")
+            await self.write("reset()")
+            await asyncio.sleep(0.5)  # Give it time to reset
+            idn = await self.query("print(_VERSION)")
+            return f"KEITHLEY 2602 TSP Version: {idn}"
+        except Exception as e:
+            raise ConnectionError(f"Failed to connect to instrument: {e}") from e
+
+    async def write(self, message):
+        async with self.lock:
+            await self.transport.write(message)
+
+    async def query(self, message):
+        async with self.lock:
+            return await self.transport.query(message)
+
+    async def configure(self, compliance=None, nplc=None):
+        """
+        Voltage source / current measurement mode with the output on
+
+        Args:
+            compliance (float, optional): Current limit in amperes (default 0.1 A)
+            nplc (float, optional): Integration time in power line cycles (default 1)
+        """
+        for command in Instrument.SOURCE_MODE_COMMANDS + Instrument.MEASUREMENT_MODE_COMMANDS:
+            await self.write(command)
+        self.compliance_limit = 0.1
+        if compliance is not None:
+            await self.write(f"smua.source.limiti = {compliance}")
+            self.compliance_limit = compliance
+        self.nplc = 1.0
+        if nplc is not None:
+            await self.write(f"smua.measure.nplc = {nplc}")
+            self.nplc = nplc
+
+    async def set_voltage(self, voltage):
+        await self.write(f"smua.source.levelv = {voltage}")
+
+    async def measure_iv(self):
+        """Return (current, measured voltage) of one reading"""
+        current, voltage = (await self.query("print(smua.measure.iv())")).split()
+        return float(current), float(voltage)
+
+    async def ramp(self, target_voltage, step_size=0.1, delay=0.02):
+        """Gradually ramp the source to target_voltage (awaiting between steps)"""
+        try:
+            present = float(await self.query("print(smua.source.levelv)"))
+        except ValueError:
+            present = 0.0
+        if abs(target_voltage - present) > step_size:
+            direction = step_size if target_voltage > present else -step_size
+            for voltage in np.arange(present, target_voltage, direction):
+                await self.set_voltage(voltage)
+                await asyncio.sleep(delay)
+        await self.set_voltage(target_voltage)
+
+    async def buffered_count(self, buffer="smua.nvbuffer1", iv=True):
+        return int(float(await self.query(Instrument.buffered_count_command(buffer, iv))))
+
+    async def wait_buffered(self, count, buffer="smua.nvbuffer1", poll=0.005, max_poll=0.1, timeout=None):
+        """
+        Wait until `count` I-V pairs are in the buffer, polling without blocking the loop
+
+        The polling interval grows from `poll` to `max_poll` so long sweeps do not flood the bus.
+
+        Returns:
+            int: Number of readings found
+        """
+        start = time.perf_counter()
+        while True:
+            n = await self.buffered_count(buffer)
+            if n >= count:
+                return n
+            if timeout is not None and time.perf_counter() - start > timeout:
+                raise TimeoutError(f"Only {n} of {count} readings after {timeout} s")
+            await asyncio.sleep(poll)
+            poll = min(poll * 1.5, max_poll)
+
+    async def fetch(self, start, end, buffer="smua.nvbuffer1", chunk=10000):
+        """
+        Read entries start..end (1-based, inclusive) of a combined I-V acquisition
+
+        Long ranges are read with one printbuffer per `chunk` entries, which keeps every
+        reply line well below the transport's line limit.
+
+        Returns:
+            tuple: numpy arrays (timestamps, measured voltages, currents)
+        """
+        columns = Instrument.iv_columns(buffer)
+        if end < start:
+            return tuple(np.empty(0) for _ in columns)
+        parts = []
+        for first in range(int(start), int(end) + 1, chunk):
+            last = min(first + chunk - 1, int(end))
+            response = await self.query(f"printbuffer({first}, {last}, {', '.join(columns)})")
+            parts.append(Instrument.parse_buffer(response, len(columns)))
+        return tuple(np.concatenate(column) for column in zip(*parts))
+
+    def sweep_timeout(self, count, source_delay=None, linefreq=50.0):
+        """
+        Longest wait for a list sweep of `count` points: twice its expected duration plus 10 s
+
+        The expected duration uses the configured NPLC at 50 Hz (the slower line frequency).
+        """
+        return count * (self.nplc / linefreq + (source_delay or 0.0)) * 2 + 10
+
+    async def sweep(self, voltages, source_delay=None, buffer="smua.nvbuffer1", poll=0.005, timeout=None):
+        """
+        Run a list sweep on the instrument and fetch it
+
+        The sweep is timed by the instrument; while it runs, the event loop is free.
+
+        Args:
+            voltages (array-like): Source voltages in sweep order
+            source_delay (float, optional): Delay after each source step in seconds
+            poll (float): First completion polling interval in seconds (see wait_buffered)
+            timeout (float, optional): Longest wait for the sweep in seconds; default
+                derived from the point count, NPLC and source delay (see sweep_timeout)
+
+        Raises:
+            TimeoutError: If the buffer stops filling (e.g. the sweep was aborted)
+
+        Returns:
+            tuple: numpy arrays (timestamps, measured voltages, currents)
+        """
+        voltages = np.asarray(voltages, dtype=float)
+        if len(voltages) == 0:
+            raise ValueError("Sweep must contain at least one voltage point.")
+        await self.ramp(voltages[0])
+        for command in Instrument.list_sweep_commands(voltages, source_delay=source_delay):
+            await self.write(command)
+        start = time.perf_counter()
+        await self.write(Instrument.start_list_sweep_command(buffer))
+        if timeout is None:
+            timeout = self.sweep_timeout(len(voltages), source_delay)
+        try:
+            await self.wait_buffered(len(voltages), buffer, poll, timeout=timeout)
+        except TimeoutError:
+            log.error("Sweep did not complete, shutting down safely")
+            await self.shutdown()
+            raise
+        log.debug("Sweep of %d points took %.3f s", len(voltages), time.perf_counter() - start)
+        result = await self.fetch(1, len(voltages), buffer)
+        await self.ramp(0)
+        return result
+
+    async def shutdown(self):
+        """Ramp to 0 V and turn the output off"""
+        try:
+            await self.ramp(0)
+            await self.write("smua.source.output = smua.OUTPUT_OFF")
+            log.info("Instrument safely shut down")
+        except Exception as e:
+            log.warning("Error during safe shutdown: %s", e)
+
+    async def close(self):
+        if self.transport is not None:
+            await self.transport.close()
+            self.transport = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Throughput Benchmark Suite
+Runs the Instrument, Measurement (single and pipelined cycling sweeps) and data saving
+code paths against the simulated Keithley 2602 (see simulator.py) so performance
+regressions can be caught on any machine without hardware attached.
+
+For every benchmark the suite reports points per second, bus transactions per point
+and peak Python memory. Results can be written to a JSON file and compared against a
+previous run with --baseline.
+
+Usage:
+    python benchmark.py --points 500 --latency 0.0005
+    python benchmark.py --json results.json
+    python benchmark.py --baseline results.json --tolerance 0.2
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from instrument import Instrument
+from measurement import Measurement
+from simulator import SimulatedKeithley2602, SimulatedResourceManager, MemristorModel
+from utils import save_data_to_csv
+
+
+def create_instrument(latency=0.0, realtime=False, seed=0, bandwidth=None):
+    """
+    Create a connected Instrument backed by the simulated 2602
+
+    Returns:
+        tuple: (Instrument, SimulatedResource)
+    """
+    device = SimulatedKeithley2602(model_a=MemristorModel(seed=seed), realtime=realtime)
+    rm = SimulatedResourceManager(device, latency=latency, bandwidth=bandwidth)
+    instrument = Instrument(resource_manager=rm)
+    instrument.connect("GPIB0::26::INSTR")
+    return instrument, instrument.instrument
+
+
+def run_benchmark(name, points, resource, func, repeat=1):
+    """
+    Time func() and collect throughput, bus and memory statistics
+
+    Args:
+        name (str): Benchmark name
+        points (int): Number of points processed by one call of func
+        resource (SimulatedResource, optional): Resource whose transactions are counted
+        func (callable): Benchmark body
+        repeat (int): Number of repetitions; the fastest run is reported
+    """
+    best = None
+    transactions = 0
+    peak_memory = 0
+
+    for _ in range(repeat):
+        if resource is not None:
+            resource.reset_counters()
+        tracemalloc.start()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        if best is None or elapsed < best:
+            best = elapsed
+        peak_memory = max(peak_memory, peak)
+        if resource is not None:
+            transactions = resource.transactions
+
+    return {
+        "name": name,
+        "points": points,
+        "seconds": best,
+        "points_per_sec": points / best if best > 0 else float('inf'),
+        "transactions_per_point": transactions / points if points else 0.0,
+        "peak_memory_kb": peak_memory / 1024.0,
+    }
+
+
+def benchmark_connect(latency):
+    device = SimulatedKeithley2602()
+    rm = SimulatedResourceManager(device, latency=latency)
+    instrument = Instrument(resource_manager=rm)
+
+    def body():
+        instrument.connect("GPIB0::26::INSTR")
+        instrument.set_voltage_source_mode()
+        instrument.set_current_measurement_mode()
+        instrument.set_current_compliance(0.01)
+
+    result = run_benchmark("connect_and_configure", 1, None, body)
+    result["transactions_per_point"] = instrument.instrument.transactions
+    return result
+
+
+def benchmark_set_measure(points, latency, repeat):
+    instrument, resource = create_instrument(latency)
+    instrument.set_voltage_source_mode()
+
+    def body():
+        for k in range(points):
+            instrument.set_voltage(0.1 + 0.001 * k)
+            instrument.measure_current()
+
+    return run_benchmark("set_voltage_measure_current", points, resource, body, repeat)
+
+
+def benchmark_voltage_sweep(points, latency, repeat):
+    instrument, resource = create_instrument(latency)
+    instrument.set_voltage_source_mode()
+    measurement = Measurement(instrument)
+    step = 1.0 / (points - 1)
+
+    def body():
+        measurement.voltage_sweep(0.0, 1.0, step, 0.0)
+
+    return run_benchmark("voltage_sweep", points, resource, body, repeat)
+
+
+def benchmark_cycling_sweep(points, latency, repeat, cycles=5):
+    instrument, resource = create_instrument(latency)
+    instrument.set_voltage_source_mode()
+    measurement = Measurement(instrument)
+    voltage_points = [k / points for k in range(points)]
+
+    def body():
+        measurement.cycling_sweep(voltage_points, cycles)
+
+    return run_benchmark("cycling_sweep_pipelined", points * cycles, resource, body, repeat)
+
+
+def benchmark_ramp_voltage(points, latency, repeat):
+    instrument, resource = create_instrument(latency)
+    instrument.set_voltage_source_mode()
+    step = 0.01
+    target = step * points
+
+    def body():
+        instrument.ramp_voltage(target, step_size=step, delay=0)
+        instrument.set_voltage(0)
+
+    return run_benchmark("ramp_voltage", points, resource, body, repeat)
+
+
+def benchmark_save_csv(points, repeat):
+    voltages = [k / points for k in range(points)]
+    currents = [v * 1e-3 for v in voltages]
+    metadata = {"Start Voltage (V)": 0, "Stop Voltage (V)": 1}
+    fd, filename = tempfile.mkstemp(suffix=".csv")
+    os.close(fd)
+
+    def body():
+        if not save_data_to_csv(filename, voltages, currents, metadata):
+            raise RuntimeError("save_data_to_csv failed")
+
+    try:
+        return run_benchmark("save_data_to_csv", points, None, body, repeat)
+    finally:
+        os.remove(filename)
+
+
+def run_suite(points=500, latency=0.0, repeat=3, csv_points=100000):
+    """Run all benchmarks and return a list of result dictionaries"""
+    return [
+        benchmark_connect(latency),
+        benchmark_set_measure(points, latency, repeat),
+        benchmark_voltage_sweep(points, latency, repeat),
+        benchmark_cycling_sweep(points, latency, repeat),
+        benchmark_ramp_voltage(points, latency, repeat),
+        benchmark_save_csv(csv_points, repeat),
+    ]
+
+
+def print_report(results, latency):
+    print(f"\n{'='*78}")
+    print(f" Throughput benchmark (simulated Keithley 2602, latency {latency*1e3:.3f} ms/transaction)")
+    print(f"{'='*78}\n")
+    print(f"{'Benchmark':<30}{'Points':>8}{'Points/s':>14}{'Tx/point':>10}{'Peak mem (kB)':>16}")
+    print("-" * 78)
+    for r in results:
+        print(f"{r['name']:<30}{r['points']:>8}{r['points_per_sec']:>14.1f}"
+              f"{r['transactions_per_point']:>10.2f}{r['peak_memory_kb']:>16.1f}")
+    print()
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """
+    Compare results against a baseline run
+
+    Returns:
+        list: Descriptions of regressions (empty if none)
+    """
+    previous = {r["name"]: r for r in baseline["results"]}
+    regressions = []
+    for r in results:
+        old = previous.get(r["name"])
+        if old is None:
+            continue
+        if r["points_per_sec"] < old["points_per_sec"] * (1.0 - tolerance):
+            regressions.append(f"{r['name']}: {r['points_per_sec']:.1f} points/s "
+                               f"(baseline {old['points_per_sec']:.1f})")
+        if r["transactions_per_point"] > old["transactions_per_point"] * (1.0 + tolerance):
+            regressions.append(f"{r['name']}: {r['transactions_per_point']:.2f} transactions/point "
+                               f"(baseline {old['transactions_per_point']:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the measurement code against a simulated Keithley 2602")
+    parser.add_argument("--points", type=int, default=500, help="Points per sweep/ramp benchmark")
+    parser.add_argument("--csv-points", type=int, default=100000, help="Points written by the CSV benchmark")
+    parser.add_argument("--latency", type=float, default=0.0, help="Simulated latency per bus transaction in seconds")
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per benchmark (fastest is reported)")
+    parser.add_argument("--json", help="Write results to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a JSON file from a previous run")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed relative slowdown before failing")
+    args = parser.parse_args()
+
+    results = run_suite(args.points, args.latency, args.repeat, args.csv_points)
+    print_report(results, args.latency)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"latency": args.latency, "points": args.points, "results": results}, f, indent=2)
+        print(f"Results written to {args.json}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("latency") != args.latency or baseline.get("points") != args.points:
+            print("Warning: baseline was recorded with different --latency/--points settings")
+        regressions = compare_to_baseline(results, baseline, args.tolerance)
+        if regressions:
+            print("Performance regressions detected:")
+            for regression in regressions:
+                print(f"- {regression}")
+            sys.exit(1)
+        print("No performance regressions detected")
+
+
+if __name__ == "__main__":
+    main()
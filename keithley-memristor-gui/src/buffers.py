@@ -0,0 +1,151 @@
+import numpy as np
+
+# Per-point status flags (bit field stored in AcquisitionBuffer.flags)
+FLAG_COMPLIANCE = 0x01  # Current reached the compliance limit
+FLAG_ABORTED = 0x02     # Last point taken before the measurement was aborted
+
+
+class AcquisitionBuffer:
+    """
+    Preallocated, typed storage for acquired points
+
+    Voltage, current, timestamp, flag, cycle and segment columns are kept in numpy arrays that are
+    allocated up front, so appending a point never creates Python objects per sample
+    and consumers (plotting, saving) get arrays without conversion.
+
+    In linear mode the buffer holds every point; if the capacity is exceeded the
+    arrays grow geometrically. In ring mode the buffer keeps only the most recent
+    `capacity` points and memory stays constant. Each ring sample is written twice
+    (at i and i + capacity) so the latest points are always contiguous and the
+    column properties can return views instead of copies.
+
+    Args:
+        capacity (int): Number of points to preallocate (ring size in ring mode)
+        ring (bool): Keep only the most recent `capacity` points
+    """
+
+    def __init__(self, capacity, ring=False):
+        if ring and capacity <= 0:
+            raise ValueError("Ring buffer capacity must be positive.")
+        self.capacity = max(int(capacity), 1)
+        self.ring = ring
+        size = 2 * self.capacity if ring else self.capacity
+        self._voltages = np.empty(size, dtype=np.float64)
+        self._currents = np.empty(size, dtype=np.float64)
+        self._timestamps = np.empty(size, dtype=np.float64)
+        self._flags = np.zeros(size, dtype=np.uint8)
+        self._cycles = np.zeros(size, dtype=np.int32)
+        self._segments = np.zeros(size, dtype=np.int32)
+        self._count = 0   # Points currently held
+        self._head = 0    # Ring mode: index of the next write
+        self.total = 0    # Points ever appended
+
+    _COLUMNS = ('_voltages', '_currents', '_timestamps', '_flags', '_cycles', '_segments')
+
+    def __len__(self):
+        return self._count
+
+    def clear(self):
+        self._count = 0
+        self._head = 0
+        self.total = 0
+
+    def _grow(self, required):
+        size = max(required, 2 * len(self._voltages))
+        for name in self._COLUMNS:
+            old = getattr(self, name)
+            new = np.empty(size, dtype=old.dtype)
+            new[:self._count] = old[:self._count]
+            setattr(self, name, new)
+        self.capacity = size
+
+    def append(self, voltage, current, timestamp=np.nan, flags=0, cycle=0, segment=0):
+        """Append one point"""
+        if self.ring:
+            for index in (self._head, self._head + self.capacity):
+                self._voltages[index] = voltage
+                self._currents[index] = current
+                self._timestamps[index] = timestamp
+                self._flags[index] = flags
+                self._cycles[index] = cycle
+                self._segments[index] = segment
+            self._head = (self._head + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+        else:
+            if self._count == len(self._voltages):
+                self._grow(self._count + 1)
+            i = self._count
+            self._voltages[i] = voltage
+            self._currents[i] = current
+            self._timestamps[i] = timestamp
+            self._flags[i] = flags
+            self._cycles[i] = cycle
+            self._segments[i] = segment
+            self._count += 1
+        self.total += 1
+
+    def extend(self, voltages, currents, timestamps=None, flags=None, cycles=None, segments=None):
+        """Append a block of points (vectorized); cycles/segments may be arrays or scalars"""
+        n = len(voltages)
+        if n == 0:
+            return
+        values = (voltages, currents,
+                  np.nan if timestamps is None else timestamps,
+                  0 if flags is None else flags,
+                  0 if cycles is None else cycles,
+                  0 if segments is None else segments)
+
+        if self.ring:
+            keep = min(n, self.capacity)
+            index = (self._head + np.arange(keep)) % self.capacity
+            for name, value in zip(self._COLUMNS, values):
+                column = getattr(self, name)
+                value = np.broadcast_to(value, (n,))[n - keep:]
+                column[index] = value
+                column[index + self.capacity] = value
+            self._head = (self._head + keep) % self.capacity
+            self._count = min(self._count + n, self.capacity)
+        else:
+            if self._count + n > len(self._voltages):
+                self._grow(self._count + n)
+            s = slice(self._count, self._count + n)
+            for name, value in zip(self._COLUMNS, values):
+                getattr(self, name)[s] = value
+            self._count += n
+        self.total += n
+
+    def _view(self, column):
+        if self.ring:
+            start = self._head + self.capacity - self._count
+            return column[start:start + self._count]
+        return column[:self._count]
+
+    @property
+    def voltages(self):
+        """Zero-copy view of the held voltages, oldest first"""
+        return self._view(self._voltages)
+
+    @property
+    def currents(self):
+        """Zero-copy view of the held currents, oldest first"""
+        return self._view(self._currents)
+
+    @property
+    def timestamps(self):
+        """Zero-copy view of the held timestamps in seconds, oldest first"""
+        return self._view(self._timestamps)
+
+    @property
+    def flags(self):
+        """Zero-copy view of the held per-point flags, oldest first"""
+        return self._view(self._flags)
+
+    @property
+    def cycles(self):
+        """Zero-copy view of the held cycle indices, oldest first"""
+        return self._view(self._cycles)
+
+    @property
+    def segments(self):
+        """Zero-copy view of the held waveform segment indices, oldest first"""
+        return self._view(self._segments)
@@ -0,0 +1,283 @@
+import json
+import os
+import threading
+import time
+import numpy as np
+from buffers import AcquisitionBuffer, FLAG_COMPLIANCE
+from instrument import is_connection_error
+from logs import get_logger
+
+log = get_logger("checkpoint")
+
+# Column order of the checkpoint data file (one float64 row per point)
+COLUMNS = ("voltage", "current", "timestamp", "flags", "cycle", "segment")
+
+
+class MeasurementCheckpoint:
+    """
+    Committed progress of a measurement on disk
+
+    Points are appended to a binary data file (`path`.dat) and the number of committed
+    points, together with the run identity and device state, is kept in a small JSON
+    file (`path`) that is replaced atomically after the data has been flushed. Rows
+    past the committed count (a crash between the two writes) are discarded on resume.
+
+    Args:
+        path (str): Checkpoint file
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.data_path = path + ".dat"
+        self.meta = None
+
+    def load(self):
+        """
+        Read the checkpoint
+
+        Returns:
+            dict: Checkpoint state (key, committed, state, ...), or None if there is none
+        """
+        if not os.path.exists(self.path):
+            return None
+        with open(self.path) as file:
+            self.meta = json.load(file)
+        return self.meta
+
+    def _write_meta(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as file:
+            json.dump(self.meta, file, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
+
+    def start(self, key, settings=None):
+        """Begin a new checkpointed run, discarding any previous progress"""
+        self.meta = {"key": key, "settings": settings or {}, "started": time.time(),
+                     "committed": 0, "reconnects": 0, "state": {}}
+        open(self.data_path, "wb").close()
+        self._write_meta()
+
+    def restore(self):
+        """
+        Return the committed points and prepare the data file for further commits
+
+        Returns:
+            numpy.ndarray: (committed, len(COLUMNS)) array
+        """
+        committed = self.meta["committed"]
+        rows = np.fromfile(self.data_path, dtype=np.float64, count=committed * len(COLUMNS))
+        if len(rows) < committed * len(COLUMNS):
+            raise RuntimeError(f"Checkpoint data {self.data_path} is shorter than its committed count")
+        with open(self.data_path, "r+b") as file:
+            file.truncate(rows.nbytes)
+        return rows.reshape(committed, len(COLUMNS))
+
+    def commit(self, rows, state=None, **fields):
+        """
+        Append points and make them part of the committed progress
+
+        Args:
+            rows (numpy.ndarray): (n, len(COLUMNS)) array of new points
+            state (dict, optional): Device/run state at the end of the rows
+            **fields: Further metadata to record (e.g. reconnect counts)
+        """
+        rows = np.ascontiguousarray(rows, dtype=np.float64)
+        with open(self.data_path, "ab") as file:
+            rows.tofile(file)
+            file.flush()
+            os.fsync(file.fileno())
+        self.meta["committed"] += len(rows)
+        if state is not None:
+            self.meta["state"] = state
+        self.meta.update(fields)
+        self._write_meta()
+
+    def update(self, **fields):
+        """Record metadata (e.g. reconnect counts) without committing points"""
+        self.meta.update(fields)
+        self._write_meta()
+
+    def remove(self):
+        for path in (self.path, self.data_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class ResumableSweep:
+    """
+    Recipe (sweep or waveform) execution with checkpoints and automatic reconnect
+
+    The points are measured in chunks; every completed chunk is committed to the
+    checkpoint with the point, cycle and segment index reached and the device state
+    (source voltage, compliance, last resistance). If the link drops, the instrument
+    is reconnected with exponential backoff, its configuration re-applied, and the
+    run continues from the last committed point. A list sweep that stops filling its
+    buffer for twice its expected duration plus 10 s is treated as a lost link.
+    Starting a run whose checkpoint already exists (e.g. after a crash) resumes it the
+    same way. The checkpoint is removed when the run completes; a stopped run keeps
+    it, with the points measured so far committed.
+
+    Args:
+        instrument (Instrument): Connected and configured instrument
+        recipe (SweepRecipe): Sweep definition
+        path (str): Checkpoint file
+        chunk_size (int): Points per committed chunk
+        reconnect_attempts (int): Connection attempts per link loss
+        initial_delay (float): First reconnect backoff delay in seconds
+        max_reconnects (int): Link losses tolerated per run before giving up
+        stream (StreamServer, optional): Server receiving every committed chunk and reconnect status
+        stop_event (threading.Event, optional): Event that stops the run when set (e.g. Measurement.stop)
+        on_chunk (callable, optional): Called as on_chunk(voltages, currents, cycles, timestamps, flags,
+            segments) with the points restored from the checkpoint and then with every committed
+            chunk (the signature of ParquetExporter.write)
+    """
+
+    def __init__(self, instrument, recipe, path, chunk_size=200, reconnect_attempts=6,
+                 initial_delay=1.0, max_reconnects=10, stream=None, stop_event=None, on_chunk=None):
+        self.instrument = instrument
+        self.on_chunk = on_chunk
+        self._stop = stop_event if stop_event is not None else threading.Event()
+        self.stream = stream
+        self.recipe = recipe
+        self.checkpoint = MeasurementCheckpoint(path)
+        self.chunk_size = max(int(chunk_size), 1)
+        self.reconnect_attempts = reconnect_attempts
+        self.initial_delay = initial_delay
+        self.max_reconnects = max_reconnects
+        points = len(recipe.voltage_points)
+        self.cycles = recipe.cycle_index if recipe.cycle_index is not None else np.zeros(points)
+        self.segments = recipe.segment_index if recipe.segment_index is not None else np.zeros(points)
+        self.buffer = AcquisitionBuffer(points)
+        self.resumed_from = 0
+
+    def _chunks(self, start):
+        """(first, stop, compliance) chunks from point `start`, never spanning a compliance change"""
+        for first, stop, compliance in self.recipe.compliance_runs():
+            first = max(first, start)
+            for a in range(first, stop, self.chunk_size):
+                yield a, min(a + self.chunk_size, stop), compliance
+
+    def _prepare(self):
+        meta = self.checkpoint.load()
+        if meta is not None and meta["key"] == self.recipe.key():
+            rows = self.checkpoint.restore()
+            if len(rows):
+                self.buffer.extend(*rows.T)
+                self._deliver(rows)
+            self.resumed_from = len(rows)
+            log.info("Resuming from checkpoint at point %d of %d", len(rows), len(self.recipe.voltage_points))
+        else:
+            settings = {"points": len(self.recipe.voltage_points), "nplc": self.recipe.nplc,
+                        "source_delay": self.recipe.source_delay, "current_range": self.recipe.current_range,
+                        "voltage_range": self.recipe.voltage_range}
+            self.checkpoint.start(self.recipe.key(), settings)
+
+    def run(self):
+        """
+        Execute (or resume) the run (blocking)
+
+        Returns:
+            AcquisitionBuffer: All points of the run
+        """
+        self._prepare()
+        reconnects = 0
+        while True:
+            try:
+                self._acquire(len(self.buffer))
+                self.instrument.ramp_voltage(0)
+                break
+            except Exception as e:
+                if not is_connection_error(e) or reconnects >= self.max_reconnects:
+                    log.error("Error during sweep, shutting down safely (progress kept in checkpoint)")
+                    self.instrument.safe_shutdown()
+                    raise e
+                reconnects += 1
+                log.warning("Connection lost at point %d: %s", len(self.buffer), e)
+                if self.stream is not None:
+                    self.stream.publish_status("reconnecting", source="sweep", point=len(self.buffer))
+                self.instrument.reconnect(self.reconnect_attempts, self.initial_delay)
+                self.checkpoint.update(reconnects=self.checkpoint.meta["reconnects"] + 1)
+        if self._stop.is_set():
+            log.info("Run stopped at point %d; checkpoint kept for resuming", len(self.buffer))
+        else:
+            self.checkpoint.remove()
+        return self.buffer
+
+    def chunk_timeout(self, points):
+        """Longest wait for a list sweep chunk: twice its expected duration (at 50 Hz) plus 10 s"""
+        return points * (self.recipe.nplc / 50.0 + self.recipe.source_delay) * 2 + 10
+
+    def _commit(self, first, voltages, currents, timestamps, compliance):
+        stop = first + len(voltages)
+        flags = np.where(np.abs(currents) >= 0.999 * compliance, FLAG_COMPLIANCE, 0)
+        rows = np.column_stack((voltages, currents, timestamps, flags,
+                                self.cycles[first:stop], self.segments[first:stop]))
+        self.buffer.extend(*rows.T)
+        last_current = currents[-1]
+        state = {"point": stop, "cycle": int(self.cycles[stop - 1]), "segment": int(self.segments[stop - 1]),
+                 "voltage": float(self.recipe.voltage_points[stop - 1]), "compliance": compliance,
+                 "resistance": float(voltages[-1] / last_current) if last_current else None}
+        self.checkpoint.commit(rows, state)
+        self._deliver(rows)
+        if self.stream is not None:
+            self.stream.publish_chunk("sweep", voltages, currents, timestamps, first=first,
+                                      cycles=self.cycles[first:stop], segments=self.segments[first:stop])
+
+    def _deliver(self, rows):
+        if self.on_chunk is not None:
+            voltages, currents, timestamps, flags, cycles, segments = rows.T
+            self.on_chunk(voltages, currents, cycles, timestamps, flags, segments)
+
+    def _acquire(self, start):
+        points = self.recipe.voltage_points
+        if start >= len(points):
+            return
+        started = self.checkpoint.meta["started"]
+        # Connecting (also on reconnect) resets the integration time and ranges; restore the recipe's.
+        # The checkpoint key includes them, so these are also the settings of the committed points
+        settings = self.checkpoint.meta["settings"]
+        self.instrument.configure_measurement(settings.get("nplc", self.recipe.nplc),
+                                              settings.get("current_range", self.recipe.current_range),
+                                              settings.get("voltage_range", self.recipe.voltage_range))
+        self.instrument.ramp_voltage(points[start])
+        for first, stop, compliance in self._chunks(start):
+            if self._stop.is_set():
+                return
+            self.instrument.set_current_compliance(compliance)
+            count = stop - first
+            if self.instrument.supports_buffered_acquisition:
+                chunk_start = time.time() - started
+                self.instrument.configure_list_sweep(points[first:stop], source_delay=self.recipe.source_delay)
+                self.instrument.start_list_sweep()
+                poll = min(max(count * self.recipe.nplc / 50.0 / 10, 0.001), 0.1)
+                deadline = time.perf_counter() + self.chunk_timeout(count)
+                taken = self.instrument.buffered_count(iv=True)
+                while taken < count and not self._stop.wait(poll):
+                    if time.perf_counter() > deadline:
+                        # Handled like a lost link: reconnect and resume from the last commit
+                        raise ConnectionError(f"List sweep stalled at {taken} of {count} readings")
+                    taken = self.instrument.buffered_count(iv=True)
+                if taken < count:
+                    # Stopped: abort the sweep but keep the readings already taken
+                    self.instrument.finish_buffered_acquisition()
+                    count = min(self.instrument.buffered_count(iv=True), count)
+                timestamps, voltages, currents = self.instrument.read_buffer_iv(1, count)
+                self.instrument.finish_buffered_acquisition()
+                if count:
+                    timestamps = chunk_start + timestamps - timestamps[0]
+            else:
+                voltages = np.empty(count)
+                currents = np.empty(count)
+                timestamps = np.empty(count)
+                for k in range(first, stop):
+                    if self._stop.is_set():
+                        count = k - first
+                        break
+                    self.instrument.set_voltage(points[k])
+                    time.sleep(self.recipe.source_delay)
+                    currents[k - first], voltages[k - first] = self.instrument.measure_iv()
+                    timestamps[k - first] = time.time() - started
+            if count:
+                self._commit(first, voltages[:count], currents[:count], timestamps[:count], compliance)
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""
+Crossbar / Device-Array Test Sequencer
+Visits every device of an array through a switch matrix or prober, runs the same
+sweep on each one and saves one CSV file per device tagged with its row and column.
+
+The routing hardware is reached through the SwitchMatrix interface; implement
+connect()/disconnect() (and optionally switching_time()) for a real matrix or
+prober and pass the class with --matrix. SimulatedSwitchMatrix stands in for it
+and, with the simulated 2602, gives every cell its own device model.
+
+Usage:
+    python crossbar.py 8 8 sweep start=0 stop=1 step=0.05 --simulate --output array
+    python crossbar.py 64 64 sweep start=0 stop=0.2 step=0.05 --simulate --sneak v/2
+    python crossbar.py 16 16 bipolar set_voltage=1.5 reset_voltage=-1.5 step=0.05 \\
+        --resource GPIB::26::INSTR --matrix mydrivers:MatrixCard --exclude 0,3 5,7
+"""
+
+import argparse
+import csv
+import importlib
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from crossbar_sim import CrossbarArray, SCHEMES
+from instrument import is_connection_error
+from logs import get_logger, add_logging_arguments, configure_from_arguments
+from measurement import Measurement
+from recipe import RecipeCache
+from scheduler import build_recipe, parse_parameters
+from utils import save_data_to_csv, write_csv_header
+
+log = get_logger("crossbar")
+
+
+class SwitchMatrix:
+    """
+    Interface of the hardware that routes the SMU to one device of an array
+
+    A switch matrix closes the relays of one row and one column; a prober moves
+    its chuck. Either way only connect(), disconnect() and the cost model below
+    are needed by the sequencer.
+    """
+
+    def connect(self, row, column):
+        """Route the SMU to the device at (row, column), replacing any previous route"""
+        raise NotImplementedError
+
+    def disconnect(self):
+        """Open all routes"""
+        raise NotImplementedError
+
+    def switching_time(self, origin, rows, columns):
+        """
+        Estimated time to re-route from origin (row, column), or None, to each target
+
+        The default charges one unit per changed row and per changed column, which
+        favours visiting a row before moving to the next.
+
+        Args:
+            rows, columns (numpy.ndarray): Target rows and columns
+
+        Returns:
+            numpy.ndarray: Time per target (any consistent unit)
+        """
+        if origin is None:
+            return np.zeros(len(rows))
+        return (rows != origin[0]).astype(float) + (columns != origin[1]).astype(float)
+
+    def close(self):
+        """Release the hardware"""
+        self.disconnect()
+
+
+class SimulatedSwitchMatrix(SwitchMatrix):
+    """
+    Switch matrix stand-in for testing without hardware
+
+    Routing waits for the relay settling time of every row or column that changes.
+    If a simulated 2602 is given, connect() attaches the selected device to smua:
+    a cell of `array` (a crossbar_sim.CrossbarArray, so reads include the sneak
+    paths through the rest of the array), or else an isolated MemristorModel per
+    cell with device-to-device variation in r_on / r_off / thresholds.
+
+    Args:
+        rows, columns (int): Array size
+        row_time, column_time (float): Settling time in seconds when the row / column changes
+        device (SimulatedKeithley2602, optional): Simulated instrument whose smua is re-routed
+        variation (float): Relative spread of the isolated cell parameters
+        seed (int, optional): Seed for the isolated cell parameters
+        array (CrossbarArray, optional): Array model providing the cells
+    """
+
+    def __init__(self, rows, columns, row_time=0.005, column_time=0.005, device=None, variation=0.1, seed=None,
+                 array=None):
+        from simulator import MemristorModel
+        if array is not None and (array.rows, array.columns) != (rows, columns):
+            raise ValueError("Array model size does not match the switch matrix.")
+        self.rows = rows
+        self.columns = columns
+        self.row_time = row_time
+        self.column_time = column_time
+        self.device = device
+        self.array = array
+        self.route = None
+        self.switches = 0
+        self.models = {}
+        if device is not None and array is None:
+            rng = np.random.default_rng(seed)
+            spread = lambda: 1.0 + variation * rng.standard_normal()
+            for r in range(rows):
+                for c in range(columns):
+                    self.models[(r, c)] = MemristorModel(r_on=1e3 * spread(), r_off=1e5 * spread(),
+                                                         v_set=1.0 * spread(), v_reset=-1.0 * spread(),
+                                                         seed=int(rng.integers(1 << 31)))
+
+    def _check(self, row, column):
+        if not (0 <= row < self.rows and 0 <= column < self.columns):
+            raise ValueError(f"Device ({row}, {column}) is outside the {self.rows}x{self.columns} array.")
+
+    def connect(self, row, column):
+        self._check(row, column)
+        time.sleep(float(self.switching_time(self.route, np.array([row]), np.array([column]))[0]))
+        if self.device is not None:
+            model = self.array.cell(row, column) if self.array is not None else self.models[(row, column)]
+            with self.device.lock:
+                self.device.smua.model = model
+        self.route = (row, column)
+        self.switches += 1
+
+    def disconnect(self):
+        self.route = None
+
+    def switching_time(self, origin, rows, columns):
+        if origin is None:
+            return np.full(len(rows), max(self.row_time, self.column_time))
+        return (rows != origin[0]) * self.row_time + (columns != origin[1]) * self.column_time
+
+
+class DeviceMap:
+    """
+    Devices of an array to be tested
+
+    Args:
+        devices (list): (row, column, label) per device
+    """
+
+    def __init__(self, devices):
+        self.devices = [(int(r), int(c), str(label)) for r, c, label in devices]
+
+    @classmethod
+    def grid(cls, rows, columns, exclude=()):
+        """All cells of a rows x columns array except the (row, column) pairs in exclude"""
+        skip = {tuple(cell) for cell in exclude}
+        return cls([(r, c, f"R{r}C{c}") for r in range(rows) for c in range(columns) if (r, c) not in skip])
+
+    def __len__(self):
+        return len(self.devices)
+
+    def __iter__(self):
+        return iter(self.devices)
+
+    def plan(self, matrix, start=None):
+        """
+        Order the devices to keep the total switching time low
+
+        Greedy nearest neighbour on matrix.switching_time: from the current route the
+        cheapest next device is visited, ties going to the lowest (row, column). With
+        the default cost model the array is visited row by row.
+
+        Returns:
+            list: (row, column, label) in visiting order
+        """
+        remaining = list(self.devices)
+        rows = np.array([d[0] for d in remaining])
+        columns = np.array([d[1] for d in remaining])
+        order = np.lexsort((columns, rows))
+        rows, columns = rows[order], columns[order]
+        remaining = [remaining[k] for k in order]
+        left = np.ones(len(remaining), dtype=bool)
+        route = start
+        plan = []
+        for _ in range(len(remaining)):
+            cost = np.asarray(matrix.switching_time(route, rows, columns), dtype=float)
+            cost[~left] = np.inf
+            k = int(np.argmin(cost))
+            left[k] = False
+            plan.append(remaining[k])
+            route = (rows[k], columns[k])
+        return plan
+
+
+class CrossbarSequencer:
+    """
+    Runs one sweep recipe on every device of a DeviceMap
+
+    The recipe is compiled once and reused for all devices. While device N's data is
+    written to disk by a background thread, the matrix is already routed to device
+    N + 1 and its measurement started, so saving never delays the array. A device that
+    fails is recorded and skipped; a lost instrument link stops the run.
+
+    Args:
+        instrument (Instrument): Connected instrument
+        matrix (SwitchMatrix): Routing hardware
+        device_map (DeviceMap): Devices to test
+        recipe (SweepRecipe): Measurement run on every device
+        output_dir (str): Directory receiving one CSV file per device and summary.csv
+        metadata (dict, optional): Extra metadata written to every file
+        on_device (callable, optional): Called as on_device(result) after each device
+        stream (StreamServer, optional): Server receiving measured data and device status
+    """
+
+    def __init__(self, instrument, matrix, device_map, recipe, output_dir=".", metadata=None,
+                 on_device=None, stream=None):
+        self.instrument = instrument
+        self.matrix = matrix
+        self.device_map = device_map
+        self.recipe = recipe
+        self.output_dir = output_dir
+        self.metadata = dict(metadata or {})
+        self.on_device = on_device
+        self.stream = stream
+        self.cache = RecipeCache()
+        self.results = []
+        self._stop = threading.Event()
+
+    def stop(self):
+        """Stop after the device being measured"""
+        self._stop.set()
+
+    def _filename(self, row, column, label):
+        label = "".join(c if c.isalnum() or c in "-_" else "_" for c in label)
+        return os.path.join(self.output_dir, f"r{row:03d}_c{column:03d}_{label}.csv")
+
+    def _save(self, result, voltages, currents, cycles, segments):
+        metadata = {"Row": result["row"], "Column": result["column"], "Device": result["label"]}
+        metadata.update(self.metadata)
+        if self.recipe.cycle_index is not None:
+            saved = save_data_to_csv(result["file"], voltages, currents, metadata, cycles, segments)
+        else:
+            saved = save_data_to_csv(result["file"], voltages, currents, metadata)
+        if not saved:
+            raise RuntimeError(f"Failed to save data to {result['file']}")
+
+    def run(self):
+        """
+        Visit and measure all devices (blocking)
+
+        Returns:
+            list: Per device a dict with row, column, label, status ("done"/"failed"),
+                file, error and seconds
+        """
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._stop.clear()
+        self.results = []
+        plan = self.device_map.plan(self.matrix, getattr(self.matrix, "route", None))
+        measurement = Measurement(self.instrument, self.stream)
+        saver = ThreadPoolExecutor(max_workers=1)
+        pending = []
+        try:
+            for row, column, label in plan:
+                if self._stop.is_set():
+                    break
+                result = {"row": row, "column": column, "label": label, "status": "failed",
+                          "file": self._filename(row, column, label), "error": None, "seconds": 0.0}
+                start = time.perf_counter()
+                try:
+                    # Source is at 0 V between devices (run_recipe ramps back); route, then measure
+                    self.matrix.connect(row, column)
+                    measurement.run_recipe(self.recipe, self.cache)
+                    # Copies: the next device reuses the measurement while the file is written
+                    pending.append((result, saver.submit(
+                        self._save, result, measurement.voltages.copy(), measurement.currents.copy(),
+                        measurement.cycles.copy(), measurement.segments.copy())))
+                    result["status"] = "done"
+                except Exception as e:
+                    if is_connection_error(e):
+                        raise
+                    result["error"] = str(e)
+                    log.error("Device %s (%d, %d) failed: %s", label, row, column, e)
+                result["seconds"] = time.perf_counter() - start
+                self.results.append(result)
+                if self.stream is not None:
+                    self.stream.publish("device", row=row, column=column, label=label,
+                                        status=result["status"], error=result["error"])
+                if self.on_device:
+                    self.on_device(result)
+        finally:
+            self.matrix.disconnect()
+            saver.shutdown(wait=True)
+            for result, future in pending:
+                if future.exception() is not None:
+                    result["status"], result["error"] = "failed", str(future.exception())
+            self._write_summary()
+        return self.results
+
+    def _write_summary(self):
+        with open(os.path.join(self.output_dir, "summary.csv"), "w", newline="") as file:
+            writer = csv.writer(file)
+            write_csv_header(writer, ["Row", "Column", "Device", "Status", "File", "Seconds", "Error"],
+                             {"Devices": len(self.results), **self.metadata})
+            for r in self.results:
+                writer.writerow([r["row"], r["column"], r["label"], r["status"], os.path.basename(r["file"]),
+                                 f"{r['seconds']:.3f}", r["error"] or ""])
+
+
+def load_matrix(spec, rows, columns):
+    """Instantiate a SwitchMatrix from "module:Class" (called with rows and columns)"""
+    module, _, name = spec.partition(":")
+    return getattr(importlib.import_module(module), name)(rows, columns)
+
+
+def main():
+    from instrument import Instrument
+    from simulator import SimulatedKeithley2602, SimulatedResourceManager
+
+    parser = argparse.ArgumentParser(description="Run a sweep on every device of a crossbar array")
+    parser.add_argument("rows", type=int)
+    parser.add_argument("columns", type=int)
+    parser.add_argument("kind", choices=("sweep", "bipolar"))
+    parser.add_argument("parameters", nargs="*", help="key=value pairs, e.g. start=0 stop=1 step=0.1")
+    parser.add_argument("--exclude", nargs="*", default=[], help="Cells to skip as row,column")
+    parser.add_argument("--resource", default="GPIB::26::INSTR", help="VISA resource name")
+    parser.add_argument("--backend", default="@py", help="PyVISA backend")
+    parser.add_argument("--simulate", action="store_true",
+                        help="Use the simulated 2602 and switch matrix (one device model per cell)")
+    parser.add_argument("--sneak", choices=SCHEMES,
+                        help="With --simulate: model the whole array with this bias of the unselected lines")
+    parser.add_argument("--matrix", help="Switch matrix driver as module:Class")
+    parser.add_argument("--output", default=".", help="Directory for the CSV files")
+    add_logging_arguments(parser)
+    args = parser.parse_args()
+    configure_from_arguments(args)
+
+    try:
+        parameters = parse_parameters(args.parameters)
+        recipe = build_recipe(args.kind, parameters)
+        exclude = [tuple(int(v) for v in cell.split(",")) for cell in args.exclude]
+    except (KeyError, ValueError) as e:
+        parser.error(f"Invalid parameters: {e}")
+    device_map = DeviceMap.grid(args.rows, args.columns, exclude)
+
+    if args.simulate:
+        device = SimulatedKeithley2602()
+        instrument = Instrument(resource_manager=SimulatedResourceManager(device))
+        array = None
+        if args.sneak:
+            array = CrossbarArray(args.rows, args.columns, variation=0.1, noise=0.01, scheme=args.sneak)
+        matrix = SimulatedSwitchMatrix(args.rows, args.columns, device=device, array=array)
+    else:
+        if not args.matrix:
+            parser.error("--matrix is required with real hardware")
+        instrument = Instrument(backend=args.backend)
+        matrix = load_matrix(args.matrix, args.rows, args.columns)
+    instrument.connect(args.resource)
+    instrument.set_voltage_source_mode()
+    instrument.set_current_measurement_mode()
+
+    sequencer = CrossbarSequencer(
+        instrument, matrix, device_map, recipe, args.output, metadata={"Measurement": args.kind, **parameters},
+        on_device=lambda r: print(f"({r['row']}, {r['column']}) {r['label']}: {r['status']} {r['seconds']:.2f} s"))
+    try:
+        sequencer.run()
+    except KeyboardInterrupt:
+        sequencer.stop()
+    finally:
+        instrument.safe_shutdown()
+        matrix.close()
+    done = sum(r["status"] == "done" for r in sequencer.results)
+    print(f"{done}/{len(device_map)} devices measured, summary in {os.path.join(args.output, 'summary.csv')}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Simulated crossbar array of stateful memristors with sneak-path currents.
+
+Every cell connects one row (word line) to one column (bit line). A read drives
+the selected row and grounds the selected column; the unselected lines either
+float or are held at a fraction of the read voltage (V/2, V/3 schemes). With
+floating lines, current also flows through series paths of unselected cells
+(sneak paths) into the selected column, which the nodal analysis below captures.
+
+Lines are ideal (no wire resistance), so the network has only rows + columns
+nodes. With floating lines the whole array is, seen from the SMU, a two-terminal
+resistor between the selected row and column: its value follows from the
+pseudo-inverse of the nodal conductance matrix, which is computed once per array
+state and then serves any batch of reads with a few vectorized lookups.
+"""
+
+import threading
+import numpy as np
+
+# Bias schemes for the unselected lines
+FLOATING = "floating"
+HALF = "v/2"
+THIRD = "v/3"
+SCHEMES = (FLOATING, HALF, THIRD)
+
+
+class CrossbarArray:
+    """
+    N x M array of linear-drift memristors (the MemristorModel equations, per cell)
+
+    Args:
+        rows, columns (int): Array size
+        r_on, r_off (float or numpy.ndarray): Low / high resistance per cell in ohms
+        v_set, v_reset (float or numpy.ndarray): Switching thresholds per cell in volts
+        rate (float): State drift rate in 1/(V*s)
+        variation (float): Relative device-to-device spread applied to the defaults
+        noise (float): Relative current noise of a read (standard deviation)
+        scheme (str): Bias of the unselected lines: "floating", "v/2" or "v/3"
+        state (float or numpy.ndarray): Initial state, 0 = high, 1 = low resistance
+        seed (int, optional): Seed for variation and noise
+    """
+
+    def __init__(self, rows, columns, r_on=1e3, r_off=1e5, v_set=1.0, v_reset=-1.0, rate=50.0,
+                 variation=0.0, noise=0.0, scheme=FLOATING, state=0.0, seed=None):
+        if scheme not in SCHEMES:
+            raise ValueError(f"Unknown bias scheme '{scheme}'. Choose from: {', '.join(SCHEMES)}")
+        self.rows = int(rows)
+        self.columns = int(columns)
+        self.rng = np.random.default_rng(seed)
+        shape = (self.rows, self.columns)
+        spread = lambda value: np.broadcast_to(value, shape) * (1.0 + variation * self.rng.standard_normal(shape))
+        self.r_on = spread(r_on)
+        self.r_off = spread(r_off)
+        self.v_set = spread(v_set)
+        self.v_reset = spread(v_reset)
+        self.rate = rate
+        self.noise = noise
+        self.scheme = scheme
+        self.lock = threading.RLock()
+        self._pinv = None
+        self.state = np.clip(np.broadcast_to(np.asarray(state, dtype=float), shape).copy(), 0.0, 1.0)
+
+    @property
+    def state(self):
+        return self._state
+
+    @state.setter
+    def state(self, value):
+        with self.lock:
+            self._state = value
+            self._pinv = None
+
+    def conductance(self):
+        return 1.0 / (self.r_on * self.state + self.r_off * (1.0 - self.state))
+
+    def _laplacian_pinv(self):
+        """Pseudo-inverse of the nodal conductance matrix (rows first, then columns), cached per state"""
+        if self._pinv is None:
+            g = self.conductance()
+            n, m = self.rows, self.columns
+            laplacian = np.zeros((n + m, n + m))
+            laplacian[:n, :n] = np.diag(g.sum(axis=1))
+            laplacian[n:, n:] = np.diag(g.sum(axis=0))
+            laplacian[:n, n:] = -g
+            laplacian[n:, :n] = -g.T
+            # The network is connected, so pinv(L) = inv(L + J / size) - J / size
+            size = n + m
+            self._pinv = np.linalg.inv(laplacian + 1.0 / size) - 1.0 / size
+        return self._pinv
+
+    def _effective_resistance(self, rows, columns):
+        lp = self._laplacian_pinv()
+        a, b = rows, self.rows + columns
+        return lp[a, a] + lp[b, b] - 2.0 * lp[a, b]
+
+    def node_voltages(self, rows, columns, voltages, scheme=None):
+        """
+        Row and column voltages for a batch of reads
+
+        Args:
+            rows, columns (array-like): Selected cell of every read
+            voltages (array-like): Voltage on the selected row of every read
+
+        Returns:
+            tuple: (B, N) row voltages and (B, M) column voltages
+        """
+        rows, columns, voltages = np.broadcast_arrays(np.atleast_1d(rows), np.atleast_1d(columns),
+                                                      np.atleast_1d(np.asarray(voltages, dtype=float)))
+        scheme = scheme or self.scheme
+        batch = np.arange(len(rows))
+        n, m = self.rows, self.columns
+        if scheme != FLOATING:
+            row_level, column_level = (0.5, 0.5) if scheme == HALF else (1.0 / 3.0, 2.0 / 3.0)
+            u = np.repeat(voltages[:, None] * row_level, n, axis=1)
+            w = np.repeat(voltages[:, None] * column_level, m, axis=1)
+            u[batch, rows] = voltages
+            w[batch, columns] = 0.0
+            return u, w
+
+        # Current I = V / R_eff enters at the row and leaves at the column; the node
+        # potentials are I * pinv(L) (e_row - e_column), shifted to ground the column
+        with self.lock:
+            lp = self._laplacian_pinv()
+            current = voltages / self._effective_resistance(rows, columns)
+        x = current[:, None] * (lp[:, rows] - lp[:, n + columns]).T
+        x -= x[batch, n + columns][:, None]
+        return x[:, :n], x[:, n:]
+
+    def read(self, rows, columns, voltages, scheme=None, chunk=1024):
+        """
+        Currents into the grounded column for a batch of reads (no change of state)
+
+        Args:
+            rows, columns (array-like): Selected cell of every read
+            voltages (array-like): Read voltage(s)
+            scheme (str, optional): Bias scheme; None uses the array's
+            chunk (int): Reads whose node voltages are held in memory at once (driven schemes)
+
+        Returns:
+            numpy.ndarray: Measured current per read, sneak paths included
+        """
+        rows, columns, voltages = np.broadcast_arrays(np.atleast_1d(rows), np.atleast_1d(columns),
+                                                      np.atleast_1d(np.asarray(voltages, dtype=float)))
+        scheme = scheme or self.scheme
+        currents = np.empty(len(rows))
+        with self.lock:
+            if scheme == FLOATING:
+                currents[:] = voltages / self._effective_resistance(rows, columns)
+            else:
+                g = self.conductance()
+                for k in range(0, len(rows), chunk):
+                    s = slice(k, k + chunk)
+                    u, _ = self.node_voltages(rows[s], columns[s], voltages[s], scheme)
+                    # Current flowing from every row into the selected (grounded) column
+                    currents[s] = np.einsum('bn,nb->b', u, g[:, columns[s]])
+        if self.noise:
+            currents *= 1.0 + self.noise * self.rng.standard_normal(len(currents))
+        return currents
+
+    def ideal_current(self, rows, columns, voltages):
+        """Current of the selected cells alone (what a read would give without sneak paths)"""
+        with self.lock:
+            return np.asarray(voltages, dtype=float) * self.conductance()[rows, columns]
+
+    def apply(self, row, column, voltage, dt, scheme=None):
+        """
+        Bias the array for dt seconds and return the measured current
+
+        Every cell drifts according to the voltage across it, so half-selected cells
+        and cells on sneak paths are disturbed as on a real array.
+        """
+        with self.lock:
+            u, w = self.node_voltages(row, column, voltage, scheme)
+            g = self.conductance()
+            current = float(u[0] @ g[:, column])
+            cell = u[0][:, None] - w[0][None, :]
+            grow = np.where(cell > self.v_set, self.rate * (cell - self.v_set) * dt * (1.0 - self.state), 0.0)
+            shrink = np.where(cell < self.v_reset, self.rate * (self.v_reset - cell) * dt * self.state, 0.0)
+            state = np.clip(self.state + grow - shrink, 0.0, 1.0)
+            # Below the thresholds nothing moves and the cached network solution stays valid
+            if np.any(state != self.state):
+                self.state = state
+        if self.noise:
+            current *= 1.0 + self.noise * self.rng.standard_normal()
+        return current
+
+    def cell(self, row, column):
+        """Device model for the selected cell, usable in place of simulator.MemristorModel"""
+        return CrossbarCell(self, row, column)
+
+
+class CrossbarCell:
+    """
+    One selected cell of a CrossbarArray, seen through the SMU
+
+    Implements current(voltage, dt) like MemristorModel, so the simulated 2602 can
+    drive it; the returned current includes the sneak paths of the whole array.
+    """
+
+    def __init__(self, array, row, column):
+        if not (0 <= row < array.rows and 0 <= column < array.columns):
+            raise ValueError(f"Cell ({row}, {column}) is outside the {array.rows}x{array.columns} array.")
+        self.array = array
+        self.row = row
+        self.column = column
+
+    @property
+    def state(self):
+        return float(self.array.state[self.row, self.column])
+
+    def resistance(self):
+        return 1.0 / float(self.array.conductance()[self.row, self.column])
+
+    def current(self, voltage, dt):
+        return self.array.apply(self.row, self.column, voltage, dt)
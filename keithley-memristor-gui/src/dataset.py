@@ -0,0 +1,334 @@
+"""
+Out-of-core storage for long measurements.
+
+A dataset is a directory with one raw binary file per column and a small JSON index.
+Points are appended cycle by cycle; the offset of every cycle is kept in a separate
+file, so any range of cycles can be located without scanning the data. Readers map
+the column files into memory (numpy.memmap): slicing by cycle returns views whose pages
+are only read from disk when touched, so files far larger than RAM can be plotted,
+analysed and exported piece by piece.
+
+As with checkpoints, the index (committed points and cycles) is replaced atomically
+after the data has been flushed; rows past the committed counts are ignored.
+"""
+
+import itertools
+import json
+import os
+import time
+import numpy as np
+from utils import read_csv_header, write_csv_header
+
+INDEX = "index.json"
+
+# Column name -> dtype of its data file
+COLUMNS = {"voltage": np.float64, "current": np.float64, "timestamp": np.float64,
+           "flags": np.uint8, "segment": np.int32}
+# Per-cycle index: first point and cycle number of every cycle
+OFFSETS = "offsets"
+CYCLE_NUMBERS = "cycle_numbers"
+
+
+def _column_path(path, name):
+    return os.path.join(path, name + ".bin")
+
+
+class DatasetWriter:
+    """
+    Append-only writer of a dataset
+
+    write_cycle() matches the on_chunk callback of PipelinedAcquisition and
+    Measurement.cycling_sweep, so a run can stream straight to disk:
+
+        writer = DatasetWriter("run.dataset", metadata={"device": "D12"})
+        PipelinedAcquisition(instrument, points, cycles=10**6, on_chunk=writer.write_cycle).run()
+        writer.close()
+
+    Args:
+        path (str): Dataset directory (created if needed)
+        metadata (dict, optional): Run metadata stored in the index
+        append (bool): Continue an existing dataset instead of starting a new one
+        commit_every (int): Points written between two index updates
+    """
+
+    def __init__(self, path, metadata=None, append=False, commit_every=100000):
+        self.path = path
+        self.commit_every = commit_every
+        os.makedirs(path, exist_ok=True)
+        index_path = os.path.join(path, INDEX)
+        if append and os.path.exists(index_path):
+            with open(index_path) as file:
+                self.index = json.load(file)
+            self.index["metadata"].update(metadata or {})
+        else:
+            self.index = {"points": 0, "cycles": 0, "created": time.time(), "metadata": metadata or {}}
+        names = list(COLUMNS) + [OFFSETS, CYCLE_NUMBERS]
+        self._files = {}
+        for name in names:
+            file = open(_column_path(path, name), "ab" if append else "wb")
+            # Drop rows past the committed counts (interrupted write)
+            rows = self.index["cycles"] if name in (OFFSETS, CYCLE_NUMBERS) else self.index["points"]
+            itemsize = np.dtype(COLUMNS.get(name, np.int64)).itemsize
+            file.truncate(rows * itemsize)
+            file.seek(0, os.SEEK_END)
+            self._files[name] = file
+        self.points = self.index["points"]
+        self.cycles = self.index["cycles"]
+        self._uncommitted = 0
+
+    def write_cycle(self, cycle, voltages, currents, timestamps=None, flags=None, segments=None):
+        """
+        Append the points of one cycle
+
+        Args:
+            cycle (int): Cycle number
+            voltages, currents (array-like): Points of the cycle
+            timestamps, flags, segments (array-like or scalar, optional): Further columns
+        """
+        np.array([self.points], dtype=np.int64).tofile(self._files[OFFSETS])
+        np.array([cycle], dtype=np.int64).tofile(self._files[CYCLE_NUMBERS])
+        self.cycles += 1
+        self._write_points(voltages, currents, timestamps, flags, segments)
+
+    def extend(self, voltages, currents, timestamps=None, flags=None, segments=None):
+        """Append points to the last cycle (cycle 0 of an empty dataset), e.g. a retention run read in chunks"""
+        if self.cycles == 0:
+            self.write_cycle(0, voltages, currents, timestamps, flags, segments)
+        else:
+            self._write_points(voltages, currents, timestamps, flags, segments)
+
+    def _write_points(self, voltages, currents, timestamps, flags, segments):
+        n = len(voltages)
+        values = {"voltage": voltages, "current": currents,
+                  "timestamp": np.nan if timestamps is None else timestamps,
+                  "flags": 0 if flags is None else flags,
+                  "segment": 0 if segments is None else segments}
+        for name, dtype in COLUMNS.items():
+            np.broadcast_to(np.asarray(values[name], dtype=dtype), (n,)).tofile(self._files[name])
+        self.points += n
+        self._uncommitted += n
+        if self._uncommitted >= self.commit_every:
+            self.commit()
+
+    def write(self, voltages, currents, cycles, timestamps=None, flags=None, segments=None):
+        """Append points of several cycles (e.g. a Measurement); cycles holds the cycle of every point"""
+        cycles = np.asarray(cycles)
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(cycles)) + 1, [len(cycles)]))
+        column = lambda value, s: value[s] if np.ndim(value) else value
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            s = slice(start, stop)
+            self.write_cycle(int(cycles[start]), voltages[s], currents[s], column(timestamps, s),
+                             column(flags, s), column(segments, s))
+
+    def commit(self):
+        """Flush the data and record it in the index"""
+        for file in self._files.values():
+            file.flush()
+            os.fsync(file.fileno())
+        self.index["points"] = self.points
+        self.index["cycles"] = self.cycles
+        tmp = os.path.join(self.path, INDEX + ".tmp")
+        with open(tmp, "w") as file:
+            json.dump(self.index, file, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, os.path.join(self.path, INDEX))
+        self._uncommitted = 0
+
+    def close(self):
+        self.commit()
+        for file in self._files.values():
+            file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Dataset:
+    """
+    Read-only, memory-mapped view of a dataset
+
+    Column properties return numpy.memmap arrays of all points; cycle() and
+    cycle_range() return views of the points of one or several cycles. Nothing is
+    read from disk until the values are used.
+
+    Args:
+        path (str): Dataset directory
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INDEX)) as file:
+            self.index = json.load(file)
+        self.metadata = self.index["metadata"]
+        self.points = self.index["points"]
+        self.cycle_count = self.index["cycles"]
+        self._columns = {name: self._map(name, dtype, self.points) for name, dtype in COLUMNS.items()}
+        self.offsets = np.append(self._map(OFFSETS, np.int64, self.cycle_count), self.points)
+        self.cycle_numbers = self._map(CYCLE_NUMBERS, np.int64, self.cycle_count)
+
+    def _map(self, name, dtype, count):
+        if count == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(_column_path(self.path, name), dtype=dtype, mode="r", shape=(count,))
+
+    def __len__(self):
+        return self.points
+
+    @property
+    def voltages(self):
+        return self._columns["voltage"]
+
+    @property
+    def currents(self):
+        return self._columns["current"]
+
+    @property
+    def timestamps(self):
+        return self._columns["timestamp"]
+
+    @property
+    def flags(self):
+        return self._columns["flags"]
+
+    @property
+    def segments(self):
+        return self._columns["segment"]
+
+    def cycles(self):
+        """Cycle number of every point (computed from the index; allocates one array)"""
+        return np.repeat(self.cycle_numbers, np.diff(self.offsets))
+
+    def _slice(self, first, last):
+        return slice(int(self.offsets[first]), int(self.offsets[last]))
+
+    def cycle(self, k):
+        """
+        Points of the k-th stored cycle
+
+        Returns:
+            tuple: (voltages, currents, timestamps) views
+        """
+        if not 0 <= k < self.cycle_count:
+            raise IndexError(f"Cycle {k} out of range (dataset has {self.cycle_count})")
+        s = self._slice(k, k + 1)
+        return self.voltages[s], self.currents[s], self.timestamps[s]
+
+    def cycle_range(self, start=0, stop=None):
+        """Points of stored cycles start..stop-1 as (voltages, currents, timestamps) views"""
+        stop = self.cycle_count if stop is None else min(stop, self.cycle_count)
+        s = self._slice(start, max(stop, start))
+        return self.voltages[s], self.currents[s], self.timestamps[s]
+
+    def iter_cycles(self, start=0, stop=None, step=1):
+        """Yield (cycle number, voltages, currents, timestamps) one cycle at a time"""
+        stop = self.cycle_count if stop is None else min(stop, self.cycle_count)
+        for k in range(start, stop, step):
+            yield (int(self.cycle_numbers[k]), *self.cycle(k))
+
+    def _blocks(self, points, start, stop):
+        """(first, end) cycle indices of blocks of whole cycles with about `points` points each"""
+        stop = self.cycle_count if stop is None else min(stop, self.cycle_count)
+        k = start
+        while k < stop:
+            # Last cycle starting within the block, at least one cycle per block
+            end = int(np.searchsorted(self.offsets, self.offsets[k] + points, side="right")) - 1
+            end = min(max(end, k + 1), stop)
+            yield k, end
+            k = end
+
+    def iter_blocks(self, points=1000000, start=0, stop=None):
+        """
+        Yield whole cycles in blocks of about `points` points
+
+        Yields:
+            tuple: (first cycle index, voltages, currents, timestamps) views
+        """
+        for first, end in self._blocks(points, start, stop):
+            yield (first, *self.cycle_range(first, end))
+
+    def to_csv(self, filename, start=0, stop=None, points=1000000):
+        """Export stored cycles start..stop-1 in the CSV format of save_data_to_csv, block by block"""
+        import csv
+
+        with open(filename, mode='w', newline='') as file:
+            write_csv_header(csv.writer(file), ['Cycle', 'Segment', 'Voltage (V)', 'Current (A)', 'Time (s)'],
+                             self.metadata)
+            for first, end in self._blocks(points, start, stop):
+                s = self._slice(first, end)
+                cycles = np.repeat(self.cycle_numbers[first:end], np.diff(self.offsets[first:end + 1]))
+                rows = np.column_stack((cycles, self.segments[s], self.voltages[s], self.currents[s],
+                                        self.timestamps[s]))
+                np.savetxt(file, rows, fmt=['%d', '%d', '%.8e', '%.8e', '%.6f'], delimiter=',')
+
+
+def open_datasets(directory):
+    """
+    Open every dataset in a directory (e.g. one per device of a crossbar run)
+
+    Returns:
+        dict: Device label (metadata "device", else the directory name) -> Dataset
+    """
+    datasets = {}
+    for name in sorted(os.listdir(directory)):
+        path = os.path.join(directory, name)
+        if os.path.exists(os.path.join(path, INDEX)):
+            dataset = Dataset(path)
+            datasets[dataset.metadata.get("device", name)] = dataset
+    return datasets
+
+
+def convert_csv(filename, path, chunk=1000000, metadata=None):
+    """
+    Convert a measurement CSV file into a dataset without loading it whole
+
+    Files with a Cycle column keep their cycles; other files become one cycle.
+
+    Args:
+        filename (str): CSV file written by save_data_to_csv or a retention run
+        path (str): Dataset directory to create
+        chunk (int): Rows read at a time
+        metadata (dict, optional): Added to the metadata of the file header
+
+    Returns:
+        Dataset: The new dataset
+    """
+    with open(filename, newline='') as file:
+        names, header = read_csv_header(file)
+        header.update(metadata or {})
+        column = {name: k for k, name in enumerate(names)}
+        get = lambda rows, name: rows[:, column[name]] if name in column else None
+        with DatasetWriter(path, header) as writer:
+            if "Cycle" not in column:
+                # One cycle: append every chunk as it is read instead of holding it back
+                while True:
+                    lines = list(itertools.islice(file, chunk))
+                    if not lines:
+                        break
+                    rows = np.loadtxt(lines, delimiter=',', ndmin=2)
+                    writer.extend(get(rows, "Voltage (V)"), get(rows, "Current (A)"), get(rows, "Time (s)"),
+                                  segments=get(rows, "Segment"))
+            else:
+                carry = np.empty((0, len(names)))
+                while True:
+                    lines = list(itertools.islice(file, chunk))
+                    last = not lines
+                    rows = np.loadtxt(lines, delimiter=',', ndmin=2) if lines else carry[:0]
+                    rows = np.concatenate((carry, rows))
+                    if len(rows) == 0:
+                        break
+                    cycles = get(rows, "Cycle")
+                    # Hold back the last (possibly incomplete) cycle until the next chunk
+                    split = len(rows) if last else int(np.searchsorted(cycles, cycles[-1], side="left"))
+                    if split == 0 and not last:
+                        carry = rows
+                        continue
+                    done, carry = rows[:split], rows[split:]
+                    writer.write(get(done, "Voltage (V)"), get(done, "Current (A)"), cycles[:split].astype(np.int64),
+                                 get(done, "Time (s)"), segments=get(done, "Segment"))
+                    if last:
+                        break
+    return Dataset(path)
@@ -0,0 +1,151 @@
+import threading
+import numpy as np
+
+
+class CycleDensity:
+    """
+    2D histogram of I-V points over voltage and log10|I| for overlaying many cycles
+
+    Points are binned with one vectorized bincount per block, so adding a cycle costs
+    time proportional to its points only and the histogram has a fixed size however
+    many cycles it holds. Median and percentile envelopes are read from the cumulative
+    counts of each voltage column, so they also cost the same for 10 or 100000 cycles.
+
+    Currents below the lower limit (including 0 A) are counted in the lowest row,
+    currents above the upper limit in the highest; voltages outside the range are dropped.
+
+    Args:
+        voltage_range (tuple): (min, max) voltage in volts
+        current_range (tuple): (min, max) |current| in amperes
+        bins (tuple): Number of (voltage, current) bins
+    """
+
+    def __init__(self, voltage_range, current_range=(1e-12, 1e-1), bins=(200, 150)):
+        v_min, v_max = (float(v) for v in voltage_range)
+        i_min, i_max = (float(i) for i in current_range)
+        if v_max <= v_min:
+            raise ValueError("Voltage range must be increasing.")
+        if i_min <= 0 or i_max <= i_min:
+            raise ValueError("Current range must be positive and increasing.")
+        self.v_bins, self.i_bins = (int(b) for b in bins)
+        if self.v_bins < 1 or self.i_bins < 1:
+            raise ValueError("Number of bins must be positive.")
+        self.v_range = (v_min, v_max)
+        self.log_range = (np.log10(i_min), np.log10(i_max))
+        self.counts = np.zeros((self.i_bins, self.v_bins), dtype=np.int64)
+        self.points = 0
+        self.cycles = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def for_waveform(cls, waveform, **kwargs):
+        """Histogram covering the voltage span of a Waveform, with a small margin"""
+        voltages = np.concatenate([segment.points() for segment in waveform.segments])
+        margin = max(0.02 * (voltages.max() - voltages.min()), 1e-3)
+        return cls((voltages.min() - margin, voltages.max() + margin), **kwargs)
+
+    def add(self, voltages, currents, cycles=1):
+        """
+        Add a block of points (vectorized); safe to call from an acquisition thread
+
+        Args:
+            voltages, currents (array-like): Points of one or more cycles
+            cycles (int): Number of cycles the block completes (for display only)
+        """
+        voltages = np.asarray(voltages, dtype=float)
+        currents = np.abs(np.asarray(currents, dtype=float))
+        v_min, v_max = self.v_range
+        log_min, log_max = self.log_range
+        column = np.floor((voltages - v_min) / (v_max - v_min) * self.v_bins).astype(np.int64)
+        with np.errstate(divide='ignore'):
+            log_i = np.log10(currents)
+        row = np.floor((log_i - log_min) / (log_max - log_min) * self.i_bins)
+        row = np.clip(np.nan_to_num(row, nan=0, neginf=0), 0, self.i_bins - 1).astype(np.int64)
+        keep = (column >= 0) & (column < self.v_bins)
+        flat = np.bincount(row[keep] * self.v_bins + column[keep], minlength=self.counts.size)
+        with self.lock:
+            self.counts += flat.reshape(self.counts.shape)
+            self.points += len(voltages)
+            self.cycles += cycles
+
+    def clear(self):
+        with self.lock:
+            self.counts[:] = 0
+            self.points = 0
+            self.cycles = 0
+
+    @property
+    def extent(self):
+        """(left, right, bottom, top) of the histogram in (V, log10|I|) for imshow"""
+        return (*self.v_range, *self.log_range)
+
+    def image(self):
+        """Return log10(1 + counts), rows from low to high current"""
+        with self.lock:
+            return np.log10(1.0 + self.counts)
+
+    def voltage_centers(self):
+        v_min, v_max = self.v_range
+        step = (v_max - v_min) / self.v_bins
+        return v_min + step * (np.arange(self.v_bins) + 0.5)
+
+    def envelope(self, percentile):
+        """
+        Percentile of log10|I| in every voltage column
+
+        Returns:
+            numpy.ndarray: log10|I| per voltage bin (nan for empty columns)
+        """
+        with self.lock:
+            cumulative = np.cumsum(self.counts, axis=0)
+        total = cumulative[-1]
+        target = total * (percentile / 100.0)
+        # First row whose cumulative count reaches the target, per column
+        row = (cumulative < target).sum(axis=0)
+        row = np.minimum(row, self.i_bins - 1)
+        log_min, log_max = self.log_range
+        level = log_min + (log_max - log_min) * (row + 0.5) / self.i_bins
+        return np.where(total > 0, level, np.nan)
+
+
+class DensityView:
+    """
+    Matplotlib artists showing a CycleDensity: one image plus optional envelope lines
+
+    The artists are created once; update() only replaces their data, so redrawing
+    takes the same time for any number of cycles.
+
+    Args:
+        ax (matplotlib.axes.Axes): Axes to draw into (cleared)
+        density (CycleDensity): Histogram to show
+        percentiles (sequence): Envelopes drawn on top; the 50th is drawn as the median
+        cmap (str): Colormap of the image
+    """
+
+    def __init__(self, ax, density, percentiles=(10, 50, 90), cmap="viridis"):
+        self.ax = ax
+        self.density = density
+        self.percentiles = tuple(percentiles)
+        ax.clear()
+        self.artist = ax.imshow(density.image(), origin="lower", aspect="auto",
+                                extent=density.extent, cmap=cmap, interpolation="nearest")
+        centers = density.voltage_centers()
+        self.lines = []
+        for p in self.percentiles:
+            style = dict(color="w", linewidth=1.5) if p == 50 else dict(color="w", linewidth=0.8, linestyle="--")
+            (line,) = ax.plot(centers, np.full(len(centers), np.nan), label=f"P{p:g}", **style)
+            self.lines.append(line)
+        ax.set_xlabel("Voltage (V)")
+        ax.set_ylabel("log10 |Current| (A)")
+        if self.lines:
+            ax.legend(loc="lower right", fontsize="small")
+        self.update()
+
+    def update(self):
+        """Refresh image and envelopes from the histogram"""
+        image = self.density.image()
+        self.artist.set_data(image)
+        self.artist.set_clim(0, max(image.max(), 1e-9))
+        for p, line in zip(self.percentiles, self.lines):
+            line.set_ydata(self.density.envelope(p))
+        self.ax.set_title(f"I-V Density - {self.density.cycles} Cycles")
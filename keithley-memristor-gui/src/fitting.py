@@ -0,0 +1,356 @@
+"""
+Batch fitting of compact memristor models to measured I-V cycles.
+
+Models are simulated for many parameter sets at once (one row per cycle), so the
+residuals of a whole batch of cycles - and the finite-difference Jacobian, which
+needs one extra simulation per parameter - are computed with a handful of numpy
+operations per time step. A batched Levenberg-Marquardt loop then updates every
+cycle in the batch in parallel. Only numpy is required.
+
+Typical use with the arrays of a Measurement:
+
+    cycles = split_cycles(m.voltages, m.currents, m.timestamps, m.cycles)
+    results = fit_cycles(LinearDriftModel(), cycles)
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+
+# Currents are compared as log10(|I| + CURRENT_FLOOR) so all decades count alike
+CURRENT_FLOOR = 1e-12
+
+
+def _logit(p):
+    p = np.clip(p, 1e-6, 1 - 1e-6)
+    return np.log(p / (1 - p))
+
+
+def _logistic(x):
+    with np.errstate(over='ignore'):
+        return 1.0 / (1.0 + np.exp(-x))
+
+
+class CompactModel:
+    """
+    Base class of fittable models
+
+    Parameters are fitted in an unconstrained space: names listed in `positive` as
+    log values, names in `unit` (between 0 and 1) as logits, the rest as they are.
+    Subclasses define `names`, `positive`, `unit`, initial_guess() and step().
+    """
+
+    names = ()
+    positive = ()
+    unit = ()
+
+    def encode(self, params):
+        """Parameter array (..., P) -> fit space"""
+        theta = np.array(params, dtype=float)
+        for k, name in enumerate(self.names):
+            if name in self.positive:
+                theta[..., k] = np.log(theta[..., k])
+            elif name in self.unit:
+                theta[..., k] = _logit(theta[..., k])
+        return theta
+
+    def decode(self, theta):
+        """Fit space (..., P) -> parameter array"""
+        params = np.array(theta, dtype=float)
+        for k, name in enumerate(self.names):
+            if name in self.positive:
+                params[..., k] = np.exp(params[..., k])
+            elif name in self.unit:
+                params[..., k] = _logistic(params[..., k])
+        return params
+
+    def initial_guess(self, voltages, currents):
+        """Parameter array (P,) to start fitting one cycle from"""
+        raise NotImplementedError
+
+    def step(self, params, state, voltage, dt):
+        """
+        Advance the states by one point and return (current, new state)
+
+        Args:
+            params (numpy.ndarray): (B, P) parameters
+            state (numpy.ndarray): (B,) state variable in [0, 1]
+            voltage, dt (numpy.ndarray): (B,) applied voltage and time at this point
+        """
+        raise NotImplementedError
+
+    def simulate(self, params, voltages, dt):
+        """
+        Currents of B parameter sets driven by B voltage sequences
+
+        Args:
+            params (numpy.ndarray): (B, P) parameters; the "state" column is the initial state
+            voltages, dt (numpy.ndarray): (B, N) voltages and time steps
+
+        Returns:
+            numpy.ndarray: (B, N) currents
+        """
+        state = params[:, self.names.index("state")].copy()
+        currents = np.empty_like(voltages)
+        for n in range(voltages.shape[1]):
+            currents[:, n], state = self.step(params, state, voltages[:, n], dt[:, n])
+        return currents
+
+    @staticmethod
+    def _resistance_span(voltages, currents):
+        """Lowest and highest |V/I| of the points well away from 0 V"""
+        v = np.abs(voltages)
+        use = (v > 0.1 * v.max()) & (np.abs(currents) > CURRENT_FLOOR)
+        if not np.any(use):
+            return 1e3, 1e5
+        r = v[use] / np.abs(currents[use])
+        r_on, r_off = np.percentile(r, 2), np.percentile(r, 98)
+        return r_on, max(r_off, 1.5 * r_on)
+
+
+class LinearDriftModel(CompactModel):
+    """
+    Linear ion-drift model (the model of the simulated instrument)
+
+    R = r_on * w + r_off * (1 - w); above v_set w grows at rate * (V - v_set) * (1 - w),
+    below v_reset it shrinks at rate * (v_reset - V) * w.
+    """
+
+    names = ("r_on", "r_off", "v_set", "v_reset", "rate", "state")
+    positive = ("r_on", "r_off", "rate")
+    unit = ("state",)
+
+    def initial_guess(self, voltages, currents):
+        r_on, r_off = self._resistance_span(voltages, currents)
+        return np.array([r_on, r_off, 0.6 * voltages.max(), 0.6 * voltages.min(), 10.0, 0.05])
+
+    def step(self, params, state, voltage, dt):
+        r_on, r_off, v_set, v_reset, rate = (params[:, k] for k in range(5))
+        grow = np.where(voltage > v_set, rate * (voltage - v_set) * dt * (1.0 - state), 0.0)
+        shrink = np.where(voltage < v_reset, rate * (v_reset - voltage) * dt * state, 0.0)
+        state = np.clip(state + grow - shrink, 0.0, 1.0)
+        return voltage / (r_on * state + r_off * (1.0 - state)), state
+
+
+class VTEAMModel(CompactModel):
+    """
+    VTEAM-style threshold model with nonlinear switching kinetics
+
+    dw/dt = k_set * (V / v_set - 1) ** alpha_set above v_set and
+    -k_reset * (V / v_reset - 1) ** alpha_reset below v_reset; the resistance
+    interpolates exponentially, R = r_off * (r_on / r_off) ** w.
+    """
+
+    names = ("r_on", "r_off", "v_set", "v_reset", "k_set", "k_reset", "alpha_set", "alpha_reset", "state")
+    positive = ("r_on", "r_off", "k_set", "k_reset", "alpha_set", "alpha_reset")
+    unit = ("state",)
+
+    def initial_guess(self, voltages, currents):
+        r_on, r_off = self._resistance_span(voltages, currents)
+        return np.array([r_on, r_off, 0.6 * voltages.max(), 0.6 * voltages.min(), 10.0, 10.0, 2.0, 2.0, 0.05])
+
+    def step(self, params, state, voltage, dt):
+        r_on, r_off, v_set, v_reset, k_set, k_reset, a_set, a_reset = (params[:, k] for k in range(8))
+        with np.errstate(invalid='ignore', divide='ignore', over='ignore'):
+            drive_set = np.where(voltage > v_set, np.abs(voltage / v_set - 1.0) ** a_set, 0.0)
+            drive_reset = np.where(voltage < v_reset, np.abs(voltage / v_reset - 1.0) ** a_reset, 0.0)
+        state = np.clip(state + (k_set * drive_set - k_reset * drive_reset) * dt, 0.0, 1.0)
+        return voltage / (r_off * (r_on / r_off) ** state), state
+
+
+class FitResult:
+    """
+    Fitted parameters of one cycle
+
+    Attributes:
+        params (dict): Parameter name -> value
+        rmse (float): Root mean square residual in decades of current
+        iterations (int): Levenberg-Marquardt iterations used
+        converged (bool): True if the cost stopped improving before max_iter
+    """
+
+    def __init__(self, params, rmse, iterations, converged):
+        self.params = params
+        self.rmse = rmse
+        self.iterations = iterations
+        self.converged = converged
+
+    def __repr__(self):
+        values = ", ".join(f"{k}={v:.4g}" for k, v in self.params.items())
+        return f"<FitResult rmse={self.rmse:.3f} dec, {self.iterations} it: {values}>"
+
+
+def split_cycles(voltages, currents, timestamps=None, cycles=None):
+    """
+    Split Measurement arrays into per-cycle (voltages, currents, timestamps) tuples
+
+    Args:
+        cycles (array-like, optional): Cycle index per point (Measurement.cycles); None is one cycle
+    """
+    voltages, currents = np.asarray(voltages, dtype=float), np.asarray(currents, dtype=float)
+    timestamps = np.full(len(voltages), np.nan) if timestamps is None else np.asarray(timestamps, dtype=float)
+    if cycles is None:
+        return [(voltages, currents, timestamps)]
+    bounds = np.flatnonzero(np.diff(np.asarray(cycles))) + 1
+    return list(zip(np.split(voltages, bounds), np.split(currents, bounds), np.split(timestamps, bounds)))
+
+
+def _pad(cycles, default_dt):
+    """Stack cycles of different length into (B, N) arrays with a validity mask"""
+    n = max(len(c[0]) for c in cycles)
+    voltages = np.zeros((len(cycles), n))
+    currents = np.zeros((len(cycles), n))
+    dt = np.zeros((len(cycles), n))
+    mask = np.zeros((len(cycles), n), dtype=bool)
+    for b, (v, i, t) in enumerate(cycles):
+        steps = np.diff(t, prepend=t[0] - (t[1] - t[0]) if len(t) > 1 else np.nan)
+        steps = np.where(np.isfinite(steps) & (steps > 0), steps, default_dt)
+        voltages[b, :len(v)] = v
+        currents[b, :len(v)] = i
+        dt[b, :len(v)] = steps
+        mask[b, :len(v)] = True
+    return voltages, np.log10(np.abs(currents) + CURRENT_FLOOR), dt, mask
+
+
+def _residuals(model, theta, voltages, log_currents, dt, mask):
+    with np.errstate(over='ignore', invalid='ignore'):
+        currents = model.simulate(model.decode(theta), voltages, dt)
+        residual = np.log10(np.abs(currents) + CURRENT_FLOOR) - log_currents
+    return np.where(mask, np.nan_to_num(residual, nan=10.0, posinf=10.0, neginf=10.0), 0.0)
+
+
+def fit_batch(model, cycles, initial=None, max_iter=50, tol=1e-6, default_dt=0.02):
+    """
+    Fit one parameter set per cycle, all cycles of the batch at once
+
+    Args:
+        model (CompactModel): Model to fit
+        cycles (list): (voltages, currents, timestamps) per cycle, e.g. from split_cycles
+        initial (numpy.ndarray, optional): (B, P) start parameters; None uses model.initial_guess
+        max_iter (int): Maximum Levenberg-Marquardt iterations
+        tol (float): Relative cost improvement below which a cycle counts as converged
+        default_dt (float): Time step in seconds where timestamps are missing
+
+    Returns:
+        list: One FitResult per cycle
+    """
+    if not cycles:
+        return []
+    voltages, log_currents, dt, mask = _pad(cycles, default_dt)
+    if initial is None:
+        initial = np.array([model.initial_guess(v, i) for v, i, _ in cycles])
+    theta = model.encode(initial)
+    count, size = theta.shape
+    eye = np.eye(size)
+
+    residual = _residuals(model, theta, voltages, log_currents, dt, mask)
+    cost = (residual ** 2).sum(axis=1)
+    damping = np.full(count, 1e-2)
+    done = np.zeros(count, dtype=bool)
+    iterations = np.zeros(count, dtype=int)
+
+    for _ in range(max_iter):
+        active = np.flatnonzero(~done)
+        if len(active) == 0:
+            break
+        iterations[active] += 1
+        a = len(active)
+        # Forward-difference Jacobian: all P perturbations of all active cycles in one simulation
+        h = 1e-4 * (1.0 + np.abs(theta[active]))
+        perturbed = (theta[active][:, None, :] + eye[None] * h[:, :, None]).reshape(a * size, size)
+        repeat = lambda x: np.repeat(x[active], size, axis=0)
+        shifted = _residuals(model, perturbed, repeat(voltages), repeat(log_currents), repeat(dt), repeat(mask))
+        jacobian = (shifted.reshape(a, size, -1) - residual[active][:, None, :]) / h[:, :, None]
+
+        jtj = jacobian @ jacobian.transpose(0, 2, 1)
+        gradient = (jacobian @ residual[active][:, :, None])[:, :, 0]
+        diagonal = np.einsum('bii->bi', jtj) + 1e-12
+        system = jtj + damping[active][:, None, None] * (diagonal[:, :, None] * eye[None])
+        delta = -np.linalg.solve(system, gradient[:, :, None])[:, :, 0]
+
+        trial = theta[active] + delta
+        trial_residual = _residuals(model, trial, voltages[active], log_currents[active], dt[active], mask[active])
+        trial_cost = (trial_residual ** 2).sum(axis=1)
+
+        better = trial_cost < cost[active]
+        improvement = (cost[active] - trial_cost) / np.maximum(cost[active], 1e-30)
+        accepted = active[better]
+        theta[accepted] = trial[better]
+        residual[accepted] = trial_residual[better]
+        cost[accepted] = trial_cost[better]
+        damping[accepted] *= 0.3
+        damping[active[~better]] *= 10.0
+        done[active[better & (improvement < tol)]] = True
+        done[active[damping[active] > 1e10]] = True
+
+    params = model.decode(theta)
+    points = mask.sum(axis=1)
+    return [FitResult(dict(zip(model.names, (float(p) for p in params[b]))),
+                      float(np.sqrt(cost[b] / points[b])), int(iterations[b]), bool(done[b]))
+            for b in range(count)]
+
+
+def fit_cycles(model, cycles, warm_start=True, **options):
+    """
+    Fit every cycle of one device
+
+    With warm_start each cycle starts from the previous cycle's fit (cycles are fitted
+    one after the other); without it all cycles are fitted as one batch.
+
+    Args:
+        model (CompactModel): Model to fit
+        cycles (list): (voltages, currents, timestamps) per cycle, e.g. from split_cycles
+        **options: fit_batch options (max_iter, tol, default_dt)
+
+    Returns:
+        list: One FitResult per cycle
+    """
+    return fit_devices(model, [cycles], warm_start, **options)[0]
+
+
+def _fit_group(model, devices, warm_start, options):
+    if not warm_start:
+        flat = [cycle for cycles in devices for cycle in cycles]
+        results = iter(fit_batch(model, flat, **options))
+        return [[next(results) for _ in cycles] for cycles in devices]
+
+    # Lockstep over cycle number: cycle k of every device in one batch, each
+    # starting from the fit of the same device's cycle k - 1
+    results = [[] for _ in devices]
+    for k in range(max((len(cycles) for cycles in devices), default=0)):
+        batch = [d for d, cycles in enumerate(devices) if k < len(cycles)]
+        initial = np.array([
+            [results[d][-1].params[name] for name in model.names] if results[d]
+            else model.initial_guess(*devices[d][k][:2]) for d in batch])
+        for d, result in zip(batch, fit_batch(model, [devices[d][k] for d in batch], initial, **options)):
+            results[d].append(result)
+    return results
+
+
+def fit_devices(model, devices, warm_start=True, processes=None, **options):
+    """
+    Fit every cycle of many devices, batched across devices
+
+    Args:
+        model (CompactModel): Model to fit
+        devices (list): Per device, a list of (voltages, currents, timestamps) cycles
+        warm_start (bool): Start each cycle from the previous cycle's fit of the same device
+        processes (int, optional): Split the devices over this many worker processes
+        **options: fit_batch options (max_iter, tol, default_dt)
+
+    Returns:
+        list: Per device, one FitResult per cycle
+    """
+    devices = list(devices)
+    if not processes or processes < 2 or len(devices) < 2:
+        return _fit_group(model, devices, warm_start, options)
+
+    groups = [devices[k::processes] for k in range(processes)]
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(_fit_group, model, group, warm_start, options) for group in groups if group]
+        grouped = [future.result() for future in futures]
+    # Undo the round-robin split
+    results = [None] * len(devices)
+    for k, group in enumerate(grouped):
+        for j, result in enumerate(group):
+            results[k + j * processes] = result
+    return results
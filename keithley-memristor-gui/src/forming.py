@@ -0,0 +1,228 @@
+import hashlib
+import json
+import threading
+import time
+import numpy as np
+from logs import get_logger
+
+log = get_logger("forming")
+
+
+class FormingResult:
+    """
+    Outcome of a forming / SET ramp
+
+    Attributes:
+        switched (bool): True if a threshold was crossed before the end of the ramp
+        index (int): Number of points measured (the switching point is the last one)
+        voltage (float): Source voltage of the last point (the switching voltage if switched)
+        current (float): Current measured at that point
+        resistance (float): voltage / current at that point (inf for zero current)
+        voltages, currents, timestamps (numpy.ndarray): The last points before and
+            including the switching point (at most `context_points` of them)
+    """
+
+    def __init__(self, switched, index, voltage, current, voltages, currents, timestamps):
+        self.switched = switched
+        self.index = index
+        self.voltage = voltage
+        self.current = current
+        self.resistance = voltage / current if current else float('inf')
+        self.voltages = voltages
+        self.currents = currents
+        self.timestamps = timestamps
+
+    def __repr__(self):
+        state = "switched" if self.switched else "no switching"
+        return (f"<FormingResult {state} at point {self.index}: V = {self.voltage:.4f} V, "
+                f"I = {self.current:.4e} A, R = {self.resistance:.4e} ohm>")
+
+
+class FormingRoutine:
+    """
+    Forming / SET ramp with early termination, executed as a TSP loop on the instrument
+
+    The voltage is stepped from start to stop; after every reading the instrument
+    itself checks the current and resistance thresholds and, as soon as one is
+    crossed, sets the source back to 0 V. The reaction time is therefore one
+    measurement period instead of a bus round trip plus the host delay. Only the
+    switching point and the last few points are transferred to the host.
+
+    In simulation mode (no instrument-side scripts) the same loop runs on the host.
+
+    Args:
+        instrument (Instrument): Connected and configured instrument
+        start_voltage (float): First voltage of the ramp
+        stop_voltage (float): Last voltage of the ramp if no switching occurs
+        step_voltage (float): Step size
+        compliance (float): Current limit in amperes during the ramp
+        current_threshold (float, optional): Stop when |I| reaches this value;
+            defaults to 90% of the compliance
+        resistance_threshold (float, optional): Stop when |V/I| falls to this value
+        nplc (float): Integration time in power line cycles
+        source_delay (float): Delay after each source step in seconds
+        context_points (int): Points before the switching point transferred to the host
+    """
+
+    def __init__(self, instrument, start_voltage=0.0, stop_voltage=3.0, step_voltage=0.01, compliance=1e-3,
+                 current_threshold=None, resistance_threshold=None, nplc=1.0, source_delay=0.0,
+                 context_points=20):
+        from measurement import Measurement
+        if step_voltage == 0:
+            raise ValueError("Step voltage cannot be zero.")
+        if compliance <= 0:
+            raise ValueError("Current compliance must be positive.")
+        if current_threshold is not None and current_threshold <= 0:
+            raise ValueError("Current threshold must be positive.")
+        if resistance_threshold is not None and resistance_threshold <= 0:
+            raise ValueError("Resistance threshold must be positive.")
+        if source_delay < 0:
+            raise ValueError("Delay time cannot be negative.")
+        self.instrument = instrument
+        step = abs(step_voltage) if stop_voltage >= start_voltage else -abs(step_voltage)
+        self.voltage_points = Measurement.sweep_points(start_voltage, stop_voltage, step)
+        self.compliance = float(compliance)
+        self.current_threshold = float(current_threshold) if current_threshold else 0.9 * self.compliance
+        self.resistance_threshold = resistance_threshold
+        self.nplc = float(nplc)
+        self.source_delay = float(source_delay)
+        self.context_points = max(int(context_points), 1)
+        self._stop = threading.Event()
+        self._script_running = False
+
+    def stop(self):
+        """Stop the ramp from another thread (a ramp running on the instrument is aborted with a device clear)"""
+        self._stop.set()
+        if self._script_running:
+            self.instrument.abort()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def key(self):
+        parameters = {
+            "start": float(self.voltage_points[0]), "stop": float(self.voltage_points[-1]),
+            "count": len(self.voltage_points), "compliance": self.compliance,
+            "current_threshold": self.current_threshold, "resistance_threshold": self.resistance_threshold,
+            "nplc": self.nplc, "source_delay": self.source_delay,
+        }
+        return hashlib.sha1(json.dumps(parameters, sort_keys=True).encode()).hexdigest()[:12]
+
+    @property
+    def name(self):
+        return f"MemristorForming_{self.key()}"
+
+    def script(self):
+        """TSP program defining <name>_run(buffer); prints: switched index, points, voltage, current"""
+        points = self.voltage_points
+        step = (points[-1] - points[0]) / (len(points) - 1) if len(points) > 1 else 0.0
+        condition = f"math.abs(i) >= {self.current_threshold:.10g}"
+        if self.resistance_threshold:
+            # |V / I| <= R written without division (I may be 0)
+            condition += f" or (v ~= 0 and math.abs(v) <= {self.resistance_threshold:.10g} * math.abs(i))"
+        lines = [
+            f"function {self.name}_run(buffer)",
+            "smua.source.func = smua.OUTPUT_DCVOLTS",
+            "smua.source.autorangev = smua.AUTORANGE_ON",
+            f"smua.source.limiti = {self.compliance:.10g}",
+            "smua.measure.autorangei = smua.AUTORANGE_ON",
+            f"smua.measure.nplc = {self.nplc:.10g}",
+            "smua.measure.autozero = smua.AUTOZERO_ONCE",
+            "buffer.clear() buffer.appendmode = 1 buffer.collecttimestamps = 1 buffer.collectsourcevalues = 1",
+            f"smua.source.levelv = {points[0]:.10g}",
+            "smua.source.output = smua.OUTPUT_ON",
+            "local hit = 0",
+            "local n = 0",
+            "local v = 0",
+            "local i = 0",
+            f"for k = 1, {len(points)} do",
+            f"v = {points[0]:.10g} + (k - 1) * {step:.10g}",
+            "smua.source.levelv = v",
+        ]
+        if self.source_delay > 0:
+            lines.append(f"delay({self.source_delay:.10g})")
+        lines += [
+            "i = smua.measure.i(buffer)",
+            "n = k",
+            f"if {condition} then",
+            "smua.source.levelv = 0",
+            "hit = k",
+            "break",
+            "end",
+            "end",
+            "smua.source.levelv = 0",
+            "print(hit, n, v, i)",
+            "end",
+        ]
+        return "\n".join(lines)
+
+    def estimated_duration(self, linefreq=50.0):
+        return len(self.voltage_points) * (self.nplc / linefreq + self.source_delay)
+
+    def run(self, buffer="smua.nvbuffer1"):
+        """
+        Execute the ramp (blocking)
+
+        Returns:
+            FormingResult: Switching point and the points leading up to it
+        """
+        self._stop.clear()
+        try:
+            self.instrument.ramp_voltage(self.voltage_points[0])
+            if self.instrument.supports_buffered_acquisition:
+                result = self._run_instrument(buffer)
+            else:
+                result = self._run_host()
+            self.instrument.ramp_voltage(0)
+            return result
+        except Exception as e:
+            log.error("Error during forming, shutting down safely")
+            self.instrument.safe_shutdown()
+            raise e
+
+    def _run_instrument(self, buffer):
+        if not self.instrument.script_loaded(self.name):
+            self.instrument.load_script(self.name, self.script())
+        self.instrument.compliance_limit = self.compliance
+        self._script_running = True
+        try:
+            response = self.instrument.query_script(f"{self.name}_run({buffer})", self.estimated_duration())
+        finally:
+            self._script_running = False
+        hit, count, voltage, current = (float(value) for value in response.split())
+        first = max(int(count) - self.context_points + 1, 1)
+        timestamps, voltages, currents = self.instrument.read_buffer_columns(
+            first, int(count), (f"{buffer}.timestamps", f"{buffer}.sourcevalues", f"{buffer}.readings"))
+        return FormingResult(hit > 0, int(count), voltage, current, voltages, currents, timestamps)
+
+    def _crossed(self, voltage, current):
+        if abs(current) >= self.current_threshold:
+            return True
+        return bool(self.resistance_threshold) and voltage != 0 and \
+            abs(voltage) <= self.resistance_threshold * abs(current)
+
+    def _run_host(self):
+        self.instrument.set_current_compliance(self.compliance)
+        voltages, currents, timestamps = [], [], []
+        start = time.perf_counter()
+        switched = False
+        for voltage in self.voltage_points:
+            if self._stop.is_set():
+                break
+            self.instrument.set_voltage(voltage)
+            time.sleep(self.source_delay)
+            current = self.instrument.measure_current()
+            voltages.append(voltage)
+            currents.append(current)
+            timestamps.append(time.perf_counter() - start)
+            if self._crossed(voltage, current):
+                self.instrument.set_voltage(0)
+                switched = True
+                break
+        context = slice(-self.context_points, None)
+        if not voltages:
+            # Stopped before the first point
+            return FormingResult(False, 0, 0.0, 0.0, np.empty(0), np.empty(0), np.empty(0))
+        return FormingResult(switched, len(voltages), voltages[-1], currents[-1], np.array(voltages[context]),
+                             np.array(currents[context]), np.array(timestamps[context]))
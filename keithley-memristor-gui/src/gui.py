@@ -1,15 +1,34 @@
-from tkinter import Tk, Label, Entry, Button, StringVar, messagebox, Frame, Toplevel
-from tkinter.filedialog import asksaveasfilename
+from tkinter import Tk, Label, Entry, Button, Checkbutton, Listbox, StringVar, BooleanVar, messagebox, Frame, Toplevel
+from tkinter.filedialog import asksaveasfilename, askdirectory, askopenfilename
+from tkinter.simpledialog import askfloat
 import matplotlib.pyplot as plt
 from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+import logging
 import threading
 import time
 import numpy as np
-from instrument import Instrument
+from instrument import Instrument, is_connection_error
 from measurement import Measurement
+from buffers import AcquisitionBuffer
+from retention import RetentionMeasurement
+from recipe import SweepRecipe, RecipeCache
+from waveform import Waveform
+from forming import FormingRoutine
+from density import CycleDensity, DensityView
+from replay import connect_replay
+from online_stats import CampaignStatistics
+from profiling import PerformanceMonitor, Profiler, TkLoopMonitor
+from scheduler import JobQueue, JobScheduler, MeasurementJob, QUEUED
+from stream import StreamServer
 from utils import validate_numerical_input, save_data_to_csv, show_error_message
+from logs import get_logger, point_logger
+
+log = get_logger("gui")
 
 class KeithleyMemristorGUI:
+    # Cycle overlays with more cycles are drawn as a density image instead of one line per cycle
+    MAX_OVERLAY_LINES = 50
+
     def __init__(self, master):
         self.master = master
         master.title("Keithley Memristor Measurement GUI")
@@ -31,9 +50,39 @@ class KeithleyMemristorGUI:
 
         # Add measurement control flag
         self.measurement_running = False
+        self.retention = None
+        # Run stopped by the Abort button (Measurement, FormingRoutine or RetentionMeasurement);
+        # None for the point-by-point sweep, which checks measurement_running itself
+        self.active_run = None
+        
+        # Compiled sweeps are cached across runs (and kept as scripts on the instrument)
+        self.instrument_sweep = BooleanVar(value=False)
+        self.recipe_cache = RecipeCache()
+        # Waveform of the last bipolar loop run (None for plain sweeps)
+        self.waveform = None
+        # Per-cycle HRS/LRS, switching voltage and yield statistics of the last bipolar loop run
+        self.statistics = None
+        self.statistics_text = StringVar()
+        
+        # Persistent job queue, shared with the headless scheduler (python scheduler.py job_queue.json ...)
+        self.job_queue = None
+        self.scheduler = None
+        
+        # Optional local publish/subscribe server for live data (see stream.py)
+        self.stream = None
+
+        # Live performance counters (always on) and opt-in cProfile of measurement threads
+        self.performance = PerformanceMonitor()
+        self.performance.add_gauge("Stream queue", lambda: self.stream.pending if self.stream else "-")
+        self.performance.add_gauge("Queued jobs", lambda: sum(job.status == QUEUED for job in self.job_queue.jobs)
+                                   if self.job_queue else "-")
+        self.profiler = Profiler()
+        self.loop_monitor = TkLoopMonitor(master, self.performance)
+        self.stream_enabled = BooleanVar(value=False)
 
         self.create_widgets()
         self.create_plot()
+        self.update_controls()
 
         # Add this line to register a close event handler
         master.protocol("WM_DELETE_WINDOW", self.on_closing)
@@ -42,15 +91,19 @@ class KeithleyMemristorGUI:
         Label(self.master, text="GPIB Address:").grid(row=0, column=0)
         Entry(self.master, textvariable=self.gpib_address).grid(row=0, column=1)
 
-        Button(self.master, text="Connect", command=self.connect_instrument).grid(row=0, column=2)
+        # Buttons that use the instrument; disabled while a measurement or queued job runs (update_controls)
+        self.start_buttons = []
+        self.start_button(self.master, "Connect", self.connect_instrument).grid(row=0, column=2)
         Button(self.master, text="List Resources", command=self.list_resources).grid(row=0, column=3)
-        Button(self.master, text="Self-Test", command=self.run_self_test).grid(row=0, column=4)
+        self.start_button(self.master, "Self-Test", self.run_self_test).grid(row=0, column=4)
         Button(self.master, text="Diagnostics", command=self.run_diagnostics).grid(row=0, column=5)
         
         # Add status indicator with colored background
         self.status_label = Label(self.master, textvariable=self.connection_status, 
                             bg="red", fg="white", width=15)
         self.status_label.grid(row=0, column=6, padx=10)
+        self.start_button(self.master, "Replay...", self.connect_replay).grid(row=0, column=7)
+        Button(self.master, text="Performance", command=self.open_performance_panel).grid(row=0, column=8)
 
         Label(self.master, text="Start Voltage (V):").grid(row=1, column=0)
         Entry(self.master, textvariable=self.start_voltage).grid(row=1, column=1)
@@ -71,12 +124,46 @@ class KeithleyMemristorGUI:
         measurement_frame = Frame(self.master)
         measurement_frame.grid(row=5, column=0, columnspan=2)
         
-        Button(measurement_frame, text="Start Measurement", command=self.start_measurement).grid(row=0, column=0, padx=5)
+        self.start_button(measurement_frame, "Start Measurement", self.start_measurement).grid(row=0, column=0, padx=5)
         self.abort_button = Button(measurement_frame, text="Abort", command=self.abort_measurement, state="disabled")
         self.abort_button.grid(row=0, column=1, padx=5)
+        self.start_button(measurement_frame, "Retention...", self.open_retention_dialog).grid(row=0, column=2, padx=5)
+        self.start_button(measurement_frame, "Bipolar Loop...", self.open_waveform_dialog).grid(row=0, column=3, padx=5)
+        Button(measurement_frame, text="Job Queue...", command=self.open_queue_dialog).grid(row=0, column=4, padx=5)
+        self.start_button(measurement_frame, "Forming...", self.open_forming_dialog).grid(row=0, column=5, padx=5)
+        Checkbutton(measurement_frame, text="Instrument-side sweep (cached)",
+                    variable=self.instrument_sweep).grid(row=1, column=0, columnspan=3)
+        Checkbutton(measurement_frame, text="Stream live data (localhost:5556)",
+                    variable=self.stream_enabled, command=self.toggle_stream).grid(row=2, column=0, columnspan=3)
 
         Button(self.master, text="Save Data", command=self.save_data).grid(row=6, column=0, columnspan=3)
 
+    def start_button(self, parent, text, command):
+        """Create a button that starts instrument traffic (disabled while the instrument is busy)"""
+        button = Button(parent, text=text, command=command)
+        self.start_buttons.append(button)
+        return button
+
+    def instrument_busy(self):
+        """True while a measurement, retention run or queued job is using the instrument"""
+        return self.measurement_running or (self.scheduler is not None and self.scheduler.running)
+
+    def check_idle(self, parent=None):
+        """Show an error and return False if the instrument is busy"""
+        if self.instrument_busy():
+            messagebox.showerror("Measurement Error", "A measurement or queued job is already running.",
+                                 **({"parent": parent} if parent else {}))
+            return False
+        return True
+
+    def update_controls(self):
+        """Enable start buttons only while the instrument is idle and Abort while a measurement runs"""
+        busy = self.instrument_busy()
+        for button in self.start_buttons:
+            button.config(state="disabled" if busy else "normal")
+        self.abort_button.config(state="normal" if self.measurement_running else "disabled")
+        self.master.after(250, self.update_controls)
+
     def create_plot(self):
         self.fig, self.ax = plt.subplots()
         self.ax.set_title("I-V Characteristics")
@@ -85,8 +172,12 @@ class KeithleyMemristorGUI:
         self.ax.grid(True)
         self.canvas = FigureCanvasTkAgg(self.fig, master=self.master)
         self.canvas.get_tk_widget().grid(row=7, column=0, columnspan=3)
+        Label(self.master, textvariable=self.statistics_text, justify="left",
+              font=("Courier", 9)).grid(row=8, column=0, columnspan=3, sticky="w")
 
     def connect_instrument(self):
+        if not self.check_idle():
+            return
         try:
             # Ask if user wants simulation mode
             use_simulation = messagebox.askyesno("Connection Mode", 
@@ -132,6 +223,26 @@ class KeithleyMemristorGUI:
             else:
                 messagebox.showerror("Connection Error", f"Failed to connect to instrument: {str(e)}")
 
+    def connect_replay(self):
+        """Use a recorded measurement file in place of the instrument"""
+        if not self.check_idle():
+            return
+        filename = askopenfilename(filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not filename:
+            return
+        speed = askfloat("Replay Speed", "Playback speed (1 = real time, 10 = 10x, 0 = as fast as possible):",
+                         initialvalue=1.0, minvalue=0.0)
+        if speed is None:
+            return
+        try:
+            self.instrument, model = connect_replay(filename, speed or None)
+        except Exception as e:
+            messagebox.showerror("Replay Error", str(e))
+            return
+        self.connection_status.set("REPLAY")
+        self.status_label.config(bg="orange")
+        messagebox.showinfo("Replay", f"Replaying {len(model.recording)} points from {filename}")
+
     def list_resources(self):
         try:
             import pyvisa
@@ -150,12 +261,12 @@ class KeithleyMemristorGUI:
                 else:
                     message = "PyVISA-py backend found no resources"
                 error_messages.append(message)
-                print(message)
+                log.info(message)
             except Exception as e:
                 backends.append("@py (failed)")
                 message = f"PyVISA-py backend error: {str(e)}"
                 error_messages.append(message)
-                print(message)
+                log.info(message)
                 
             # Try system backend (NI-VISA)
             try:
@@ -168,12 +279,12 @@ class KeithleyMemristorGUI:
                 else:
                     message = "System backend found no resources"
                 error_messages.append(message)
-                print(message)
+                log.info(message)
             except Exception as e:
                 backends.append("system (failed)")
                 message = f"System backend error: {str(e)}"
                 error_messages.append(message)
-                print(message)
+                log.info(message)
             
             # Show results
             if resources:
@@ -194,6 +305,8 @@ class KeithleyMemristorGUI:
         if not self.instrument:
             messagebox.showerror("Connection Error", "Please connect to an instrument first.")
             return
+        if not self.check_idle():
+            return
             
         try:
             # Handle negative values properly with validation
@@ -237,7 +350,8 @@ class KeithleyMemristorGUI:
                 messagebox.showerror("Input Error", "Step voltage must be negative when start voltage > stop voltage.")
                 return
 
-            self.measurement = Measurement(self.instrument)
+            self.measurement = Measurement(self.instrument, self.stream)
+            self.waveform = None
             self.instrument.set_voltage_source_mode()
             self.instrument.set_current_measurement_mode()
             self.instrument.set_current_compliance(compliance)  # Set current compliance
@@ -255,14 +369,26 @@ class KeithleyMemristorGUI:
             self.abort_button.config(state="normal")
 
             # Use threading to prevent GUI freezing
-            threading.Thread(target=self.execute_measurement, 
-                            args=(start_v, stop_v, step_v, delay), 
-                            daemon=True).start()
+            if self.instrument_sweep.get() and self.instrument.supports_buffered_acquisition:
+                recipe = SweepRecipe.linear(start_v, stop_v, step_v, compliance=compliance, source_delay=delay)
+                self.active_run = self.measurement
+                threading.Thread(target=self.profiler.call,
+                                args=(self.execute_recipe_measurement, recipe),
+                                daemon=True).start()
+            elif self.instrument.supports_buffered_acquisition:
+                self.active_run = self.measurement
+                threading.Thread(target=self.profiler.call,
+                                args=(self.execute_list_sweep, start_v, stop_v, step_v, delay),
+                                daemon=True).start()
+            else:
+                threading.Thread(target=self.profiler.call,
+                                args=(self.execute_measurement, start_v, stop_v, step_v, delay),
+                                daemon=True).start()
         except Exception as e:
             show_error_message(f"Error starting measurement: {str(e)}")
 
     def save_data(self):
-        if not hasattr(self, 'measurement') or not hasattr(self.measurement, 'voltages') or not self.measurement.voltages:
+        if not hasattr(self, 'measurement') or not hasattr(self.measurement, 'voltages') or len(self.measurement.voltages) == 0:
             messagebox.showerror("Error", "No measurement data available to save.")
             return
             
@@ -284,7 +410,20 @@ class KeithleyMemristorGUI:
                     "Instrument": self.connection_status.get()
                 }
                 
-                save_data_to_csv(filename, self.measurement.voltages, self.measurement.currents, metadata)
+                if self.waveform is not None:
+                    metadata = {"Waveform Cycles": self.waveform.repetitions,
+                                "Waveform Segments": "; ".join(
+                                    f"{s.start:g} -> {s.stop:g} V step {s.step:g} V, "
+                                    f"compliance {s.compliance or self.waveform.compliance:g} A"
+                                    for s in self.waveform.segments),
+                                "Delay Time (s)": self.delay_time.get(),
+                                "Instrument": self.connection_status.get()}
+                    save_data_to_csv(filename, self.measurement.voltages, self.measurement.currents, metadata,
+                                     self.measurement.cycles, self.measurement.segments,
+                                     timestamps=self.measurement.timestamps)
+                else:
+                    save_data_to_csv(filename, self.measurement.voltages, self.measurement.currents, metadata,
+                                     timestamps=self.measurement.timestamps)
                 messagebox.showinfo("Success", f"Data saved to {filename}")
         except Exception as e:
             messagebox.showerror("Error", f"Failed to save data: {str(e)}")
@@ -301,53 +440,65 @@ class KeithleyMemristorGUI:
             line, = self.ax.plot([], [], 'bo-')
             self.canvas.draw()
             
-            # Create local lists for data
-            voltages = []
-            currents = []
-            
             # Create a measurement object
-            self.measurement = Measurement(self.instrument)
+            self.measurement = Measurement(self.instrument, self.stream)
             
-            # Calculate step count
-            if step_v == 0:
-                step_count = 1
-            else:
-                step_count = abs(int((stop_v - start_v) / step_v)) + 1
-                
             # Generate voltage points
-            voltage_points = np.linspace(start_v, stop_v, step_count)
+            voltage_points = Measurement.sweep_points(start_v, stop_v, step_v)
+            step_count = len(voltage_points)
+            
+            # Preallocate storage; the measurement keeps a reference so partial data can be saved
+            buffer = AcquisitionBuffer(step_count)
+            self.measurement.buffer = buffer
+            start_time = time.perf_counter()
+            reconnects = 0
             
             # Perform the sweep with abort checking
             for i, voltage in enumerate(voltage_points):
                 # Check if abort was requested
                 if not self.measurement_running:
-                    print("Measurement aborted by user")
+                    log.info("Measurement aborted by user")
                     break
                     
-                # Set voltage and measure current
-                self.instrument.set_voltage(voltage)
-                time.sleep(delay)
-                current = self.instrument.measure_current()
+                # Set voltage and measure current and voltage; after a link loss reconnect (with backoff),
+                # return to the sweep voltage and repeat the point instead of losing the run
+                while True:
+                    try:
+                        with self.performance.timed("bus"):
+                            self.instrument.set_voltage(voltage)
+                        time.sleep(delay)
+                        with self.performance.timed("bus"):
+                            current, measured_voltage = self.instrument.measure_iv()
+                        break
+                    except Exception as e:
+                        if not is_connection_error(e) or reconnects >= 3:
+                            raise
+                        reconnects += 1
+                        self.master.title(f"Keithley Memristor Measurement - reconnecting at point {i + 1}")
+                        self.instrument.reconnect()
+                        self.instrument.ramp_voltage(voltage)
                 
                 # Store values
-                voltages.append(voltage)
-                currents.append(current)
+                buffer.append(measured_voltage, current, time.perf_counter() - start_time,
+                              self.measurement.point_flags(current))
+                self.performance.add_points()
+                if point_logger.isEnabledFor(logging.DEBUG):
+                    point_logger.debug("V = %.6f V, I = %.6e A", measured_voltage, current)
+                if self.stream is not None:
+                    self.stream.publish_chunk("sweep", [measured_voltage], [current], buffer.timestamps[-1:], first=i)
                 
-                # Update plot in real-time
-                line.set_data(voltages, currents)
-                self.ax.relim()
-                self.ax.autoscale_view()
-                self.canvas.draw_idle()
-                self.master.update()
+                # Update plot in real-time (views into the preallocated arrays)
+                with self.performance.timed("frame"):
+                    line.set_data(buffer.voltages, buffer.currents)
+                    self.ax.relim()
+                    self.ax.autoscale_view()
+                    self.canvas.draw_idle()
+                    self.master.update()
                 
                 # Update progress in the window title
                 progress_percent = int((i + 1) / step_count * 100)
                 self.master.title(f"Keithley Memristor Measurement - {progress_percent}%")
             
-            # Store data in measurement object for later saving
-            self.measurement.voltages = voltages
-            self.measurement.currents = currents
-            
             # Reset title after completion
             self.master.title("Keithley Memristor Measurement GUI")
             
@@ -373,18 +524,364 @@ class KeithleyMemristorGUI:
             except:
                 pass
 
+    def execute_list_sweep(self, start_v, stop_v, step_v, delay):
+        """
+        Run the live sweep as an instrument-timed list sweep, plotting the points as they are fetched
+
+        The points carry instrument timestamps. After a link loss the instrument is
+        reconnected and the sweep continues with the points not yet measured.
+        """
+        line, = self.ax.plot([], [], 'bo-')
+        voltage_points = Measurement.sweep_points(start_v, stop_v, step_v)
+        buffer = AcquisitionBuffer(len(voltage_points))
+        self.measurement.buffer = buffer
+        start_time = time.perf_counter()
+
+        def draw():
+            with self.performance.timed("frame"):
+                line.set_data(buffer.voltages, buffer.currents)
+                self.ax.relim()
+                self.ax.autoscale_view()
+                self.canvas.draw_idle()
+            self.master.title(f"Keithley Memristor Measurement - {int(len(buffer) / len(voltage_points) * 100)}%")
+
+        try:
+            reconnects = 0
+            self.instrument.ramp_voltage(voltage_points[0])
+            while len(buffer) < len(voltage_points) and not self.measurement.stopped:
+                first = len(buffer)
+                # Instrument time within the sweep, anchored to host time at its start
+                sweep_start = time.perf_counter() - start_time
+
+                def store(offset, timestamps, voltages, currents):
+                    buffer.extend(voltages, currents, sweep_start + timestamps,
+                                  [self.measurement.point_flags(c) for c in currents])
+                    self.performance.add_points(len(currents))
+                    if self.stream is not None:
+                        self.stream.publish_chunk("sweep", voltages, currents, sweep_start + timestamps,
+                                                  first=first + offset)
+                    self.master.after(0, draw)
+
+                try:
+                    with self.performance.timed("bus"):
+                        self.measurement.list_sweep(voltage_points[first:], delay, on_points=store)
+                except Exception as e:
+                    if not is_connection_error(e) or reconnects >= 3:
+                        raise
+                    reconnects += 1
+                    self.master.after(0, self.master.title,
+                                      f"Keithley Memristor Measurement - reconnecting at point {len(buffer) + 1}")
+                    self.instrument.reconnect()
+                    self.instrument.ramp_voltage(voltage_points[len(buffer)])
+            self.instrument.ramp_voltage(0)
+            self.master.after(0, self.show_live_sweep_completed)
+        except Exception as e:
+            try:
+                self.instrument.ramp_voltage(0)
+            except Exception:
+                pass
+            if not self.measurement.stopped:
+                self.master.after(0, messagebox.showerror, "Measurement Error", str(e))
+        finally:
+            self.active_run = None
+            self.measurement_running = False
+            self.master.after(0, self.abort_button.config, {"state": "disabled"})
+
+    def show_live_sweep_completed(self):
+        self.master.title("Keithley Memristor Measurement GUI")
+        self.ax.set_title("I-V Characteristics - Completed")
+        self.canvas.draw()
+
+    def execute_recipe_measurement(self, recipe):
+        """Run the sweep as a cached instrument-side program and plot the result when done"""
+        try:
+            self.master.after(0, self.master.title, "Keithley Memristor Measurement - sweeping on instrument")
+            voltages, currents = self.measurement.run_recipe(recipe, self.recipe_cache)
+            self.performance.add_points(len(currents))
+            self.master.after(0, self.show_recipe_result, voltages, currents)
+        except Exception as e:
+            if not self.measurement.stopped:
+                self.master.after(0, messagebox.showerror, "Measurement Error", str(e))
+        finally:
+            self.active_run = None
+            self.measurement_running = False
+            self.master.after(0, self.abort_button.config, {"state": "disabled"})
+
+    def open_waveform_dialog(self):
+        """Open the bipolar switching loop (multi-segment waveform) window"""
+        if not self.instrument:
+            messagebox.showerror("Connection Error", "Please connect to an instrument first.")
+            return
+        if not self.check_idle():
+            return
+
+        window = Toplevel(self.master)
+        window.title("Bipolar Switching Loop")
+        fields = [
+            ("SET Voltage (V):", StringVar(value="1.5")),
+            ("RESET Voltage (V):", StringVar(value="-1.5")),
+            ("Step Voltage (V):", StringVar(value="0.05")),
+            ("SET Compliance (A):", StringVar(value="0.001")),
+            ("RESET Compliance (A):", StringVar(value="0.01")),
+            ("Cycles:", StringVar(value="10")),
+        ]
+        for row, (text, var) in enumerate(fields):
+            Label(window, text=text).grid(row=row, column=0)
+            Entry(window, textvariable=var).grid(row=row, column=1)
+
+        def start():
+            if not self.check_idle(window):
+                return
+            for text, var in fields:
+                if not validate_numerical_input(var.get()):
+                    messagebox.showerror("Input Error", f"{text.rstrip(':')} must be a valid number.", parent=window)
+                    return
+            delay = float(self.delay_time.get()) if validate_numerical_input(self.delay_time.get()) else 0.0
+            set_v, reset_v, step_v, set_i, reset_i, cycles = (float(var.get()) for _, var in fields)
+            try:
+                waveform = Waveform.bipolar(set_v, reset_v, step_v, int(cycles), set_i, reset_i)
+                self.measurement = Measurement(self.instrument, self.stream)
+                self.instrument.set_voltage_source_mode()
+                self.instrument.set_current_measurement_mode()
+            except Exception as e:
+                messagebox.showerror("Input Error", str(e), parent=window)
+                return
+
+            self.waveform = waveform
+            self.ax.clear()
+            self.ax.set_title("I-V Characteristics")
+            self.ax.set_xlabel("Voltage (V)")
+            self.ax.set_ylabel("Current (A)")
+            self.ax.grid(True)
+            self.canvas.draw()
+            self.measurement_running = True
+            self.active_run = self.measurement
+            self.abort_button.config(state="normal")
+            threading.Thread(target=self.profiler.call, args=(self.execute_waveform_measurement, waveform, delay),
+                             daemon=True).start()
+            window.destroy()
+
+        Button(window, text="Start", command=start).grid(row=len(fields), column=0, columnspan=2, pady=5)
+
+    def execute_waveform_measurement(self, waveform, delay):
+        """Run all cycles of the waveform as one sweep and plot the loops when done"""
+        try:
+            self.master.after(0, self.master.title, "Keithley Memristor Measurement - running waveform")
+            statistics = CampaignStatistics()
+            self.measurement.waveform_sweep(waveform, delay, self.recipe_cache, statistics)
+            self.statistics = statistics
+            self.performance.add_points(len(self.measurement.currents))
+            self.master.after(0, self.show_waveform_result)
+        except Exception as e:
+            if not self.measurement.stopped:
+                self.master.after(0, messagebox.showerror, "Measurement Error", str(e))
+        finally:
+            self.active_run = None
+            self.measurement_running = False
+            self.master.after(0, self.abort_button.config, {"state": "disabled"})
+
+    def show_waveform_result(self):
+        self.master.title("Keithley Memristor Measurement GUI")
+        voltages, currents, cycles = self.measurement.voltages, self.measurement.currents, self.measurement.cycles
+        # One line per cycle; boundaries found once instead of masking per cycle
+        bounds = np.flatnonzero(np.diff(cycles)) + 1
+        self.statistics_text.set(self.statistics.format())
+        if len(bounds) + 1 > self.MAX_OVERLAY_LINES:
+            # Too many lines to draw: show all cycles as one density image with envelopes
+            density = CycleDensity.for_waveform(self.waveform)
+            density.add(voltages, currents, cycles=len(bounds) + 1)
+            DensityView(self.ax, density)
+            self.ax.grid(True)
+            with self.performance.timed("frame"):
+                self.canvas.draw()
+            return
+        for v, i in zip(np.split(voltages, bounds), np.split(currents, bounds)):
+            self.ax.plot(v, np.abs(i), '-', linewidth=0.8)
+        self.ax.set_yscale('log')
+        self.ax.set_ylabel("|Current| (A)")
+        self.ax.set_title(f"I-V Characteristics - {len(bounds) + 1} Cycles")
+        with self.performance.timed("frame"):
+            self.canvas.draw()
+
+    def open_forming_dialog(self):
+        """Open the forming / SET window: ramp until the device switches, stopping on the instrument"""
+        if not self.instrument:
+            messagebox.showerror("Connection Error", "Please connect to an instrument first.")
+            return
+        if not self.check_idle():
+            return
+
+        window = Toplevel(self.master)
+        window.title("Forming / SET")
+        fields = [
+            ("Start Voltage (V):", StringVar(value="0")),
+            ("Stop Voltage (V):", StringVar(value="3")),
+            ("Step Voltage (V):", StringVar(value="0.01")),
+            ("Compliance (A):", StringVar(value="0.001")),
+            ("Current Threshold (A, blank = 90% of compliance):", StringVar(value="")),
+            ("Resistance Threshold (ohm, blank = off):", StringVar(value="")),
+        ]
+        for row, (text, var) in enumerate(fields):
+            Label(window, text=text).grid(row=row, column=0)
+            Entry(window, textvariable=var).grid(row=row, column=1)
+
+        def start():
+            if not self.check_idle(window):
+                return
+            values = []
+            for k, (text, var) in enumerate(fields):
+                if k >= 4 and not var.get().strip():
+                    values.append(None)
+                elif not validate_numerical_input(var.get()):
+                    messagebox.showerror("Input Error", f"{text.split(' (')[0]} must be a valid number.", parent=window)
+                    return
+                else:
+                    values.append(float(var.get()))
+            delay = float(self.delay_time.get()) if validate_numerical_input(self.delay_time.get()) else 0.0
+            try:
+                routine = FormingRoutine(self.instrument, *values[:4], current_threshold=values[4],
+                                         resistance_threshold=values[5], source_delay=delay)
+                self.instrument.set_voltage_source_mode()
+                self.instrument.set_current_measurement_mode()
+            except Exception as e:
+                messagebox.showerror("Input Error", str(e), parent=window)
+                return
+            self.measurement_running = True
+            self.active_run = routine
+            self.abort_button.config(state="normal")
+            threading.Thread(target=self.execute_forming, args=(routine,), daemon=True).start()
+            window.destroy()
+
+        Button(window, text="Start", command=start).grid(row=len(fields), column=0, columnspan=2, pady=5)
+
+    def execute_forming(self, routine):
+        try:
+            self.master.after(0, self.master.title, "Keithley Memristor Measurement - forming")
+            result = routine.run()
+            if not routine.stopped:
+                self.master.after(0, self.show_forming_result, result)
+        except Exception as e:
+            if not routine.stopped:
+                self.master.after(0, messagebox.showerror, "Forming Error", str(e))
+        finally:
+            self.active_run = None
+            self.measurement_running = False
+            self.master.after(0, self.abort_button.config, {"state": "disabled"})
+
+    def show_forming_result(self, result):
+        self.master.title("Keithley Memristor Measurement GUI")
+        self.ax.clear()
+        self.ax.plot(result.voltages, result.currents, 'bo-')
+        if result.switched:
+            self.ax.plot([result.voltage], [result.current], 'r*', markersize=12)
+        self.ax.set_title(f"Forming - {'switched' if result.switched else 'no switching'} at {result.voltage:.3f} V")
+        self.ax.set_xlabel("Voltage (V)")
+        self.ax.set_ylabel("Current (A)")
+        self.ax.grid(True)
+        self.canvas.draw()
+        if result.switched:
+            messagebox.showinfo("Forming", f"Switched at {result.voltage:.4f} V after {result.index} points\n"
+                                           f"I = {result.current:.4e} A, R = {result.resistance:.4e} ohm")
+        else:
+            messagebox.showinfo("Forming", f"No switching up to {result.voltage:.4f} V")
+
+    def open_queue_dialog(self):
+        """Open the job queue window: queue sweeps from the main settings and run them back to back"""
+        if self.job_queue is None:
+            self.job_queue = JobQueue("job_queue.json")
+
+        window = Toplevel(self.master)
+        window.title(f"Job Queue - {self.job_queue.path}")
+        device = StringVar()
+        priority = StringVar(value="0")
+        Label(window, text="Device:").grid(row=0, column=0)
+        Entry(window, textvariable=device).grid(row=0, column=1)
+        Label(window, text="Priority:").grid(row=1, column=0)
+        Entry(window, textvariable=priority).grid(row=1, column=1)
+        jobs_list = Listbox(window, width=80, height=15)
+        jobs_list.grid(row=3, column=0, columnspan=4)
+        shown = []
+
+        def add():
+            fields = [("Start voltage", self.start_voltage), ("Stop voltage", self.stop_voltage),
+                      ("Step voltage", self.step_voltage), ("Delay time", self.delay_time),
+                      ("Current compliance", self.current_compliance), ("Priority", priority)]
+            for name, var in fields:
+                if not validate_numerical_input(var.get()):
+                    messagebox.showerror("Input Error", f"{name} must be a valid number.", parent=window)
+                    return
+            parameters = {"start": float(self.start_voltage.get()), "stop": float(self.stop_voltage.get()),
+                          "step": float(self.step_voltage.get()), "delay": float(self.delay_time.get()),
+                          "compliance": float(self.current_compliance.get())}
+            try:
+                Measurement(self.instrument).validate_parameters(parameters["start"], parameters["stop"],
+                                                                 parameters["step"], parameters["delay"])
+                self.job_queue.add(MeasurementJob("sweep", parameters, int(float(priority.get())), device.get()))
+            except ValueError as e:
+                messagebox.showerror("Input Error", str(e), parent=window)
+            refresh(once=True)
+
+        def remove():
+            for index in jobs_list.curselection():
+                self.job_queue.remove(shown[index].job_id)
+            refresh(once=True)
+
+        def start():
+            if not self.instrument:
+                messagebox.showerror("Connection Error", "Please connect to an instrument first.", parent=window)
+                return
+            if not self.check_idle(window):
+                return
+            output_dir = askdirectory(title="Directory for Job Data", parent=window)
+            if not output_dir:
+                return
+            self.scheduler = JobScheduler(self.instrument, self.job_queue, output_dir, stream=self.stream)
+            self.scheduler.start(wait=True)
+
+        def stop():
+            if self.scheduler:
+                self.scheduler.stop()
+
+        def refresh(once=False):
+            if not window.winfo_exists():
+                return
+            shown[:] = sorted(self.job_queue.jobs, key=lambda job: (job.status != "running", job.status != "queued",
+                                                                    -job.priority, job.submitted))
+            jobs_list.delete(0, "end")
+            for job in shown:
+                parameters = ", ".join(f"{key}={value:g}" for key, value in job.parameters.items())
+                jobs_list.insert("end", f"{job.status:8} p={job.priority:<3} {job.device or '-':12} {job.kind} "
+                                        f"{parameters}  {job.error or ''}")
+            if not once:
+                window.after(1000, refresh)
+
+        buttons = Frame(window)
+        buttons.grid(row=2, column=0, columnspan=4, pady=5)
+        Button(buttons, text="Queue Current Sweep", command=add).grid(row=0, column=0, padx=5)
+        Button(buttons, text="Remove Selected", command=remove).grid(row=0, column=1, padx=5)
+        Button(buttons, text="Run Queue", command=start).grid(row=0, column=2, padx=5)
+        Button(buttons, text="Stop After Current Job", command=stop).grid(row=0, column=3, padx=5)
+        refresh()
+
+    def show_recipe_result(self, voltages, currents):
+        self.master.title("Keithley Memristor Measurement GUI")
+        self.ax.plot(voltages, currents, 'bo-')
+        self.ax.set_title("I-V Characteristics - Completed")
+        with self.performance.timed("frame"):
+            self.canvas.draw()
+
     def abort_measurement(self):
         """Safely abort the measurement process"""
         try:
-            # Set flag to stop the measurement thread
-            self.measurement_running = False
-            
-            # Reset instrument to safe state
-            if self.instrument:
-                self.instrument.ramp_voltage(0)  # Set voltage to 0V
+            # Stop the running routine; its worker thread ramps to 0 V and clears the busy flag.
+            # The point-by-point sweep checks measurement_running between points
+            if self.active_run is not None:
+                self.active_run.stop()
+            else:
+                self.measurement_running = False
             
             messagebox.showinfo("Measurement Aborted", 
-                           "Measurement has been aborted.\nVoltage has been set to 0V for safety.")
+                           "Measurement has been aborted.\nVoltage is ramped to 0V for safety.")
                            
             # Update GUI elements
             self.abort_button.config(state="disabled")
@@ -392,11 +889,122 @@ class KeithleyMemristorGUI:
         except Exception as e:
             messagebox.showerror("Error", f"Error during abort: {str(e)}")
 
+    def open_retention_dialog(self):
+        """Open the retention (constant bias time-series) measurement window"""
+        if not self.instrument:
+            messagebox.showerror("Connection Error", "Please connect to an instrument first.")
+            return
+        if not self.check_idle():
+            return
+
+        window = Toplevel(self.master)
+        window.title("Retention Measurement")
+        bias = StringVar(value="0.1")
+        interval = StringVar(value="1")
+        duration = StringVar(value="")
+
+        Label(window, text="Bias Voltage (V):").grid(row=0, column=0)
+        Entry(window, textvariable=bias).grid(row=0, column=1)
+        Label(window, text="Sample Interval (s):").grid(row=1, column=0)
+        Entry(window, textvariable=interval).grid(row=1, column=1)
+        Label(window, text="Duration (h, blank = until stopped):").grid(row=2, column=0)
+        Entry(window, textvariable=duration).grid(row=2, column=1)
+
+        def start():
+            if not self.check_idle(window):
+                return
+            for name, var in (("Bias voltage", bias), ("Sample interval", interval)):
+                if not validate_numerical_input(var.get()):
+                    messagebox.showerror("Input Error", f"{name} must be a valid number.", parent=window)
+                    return
+            if duration.get().strip() and not validate_numerical_input(duration.get()):
+                messagebox.showerror("Input Error", "Duration must be a valid number.", parent=window)
+                return
+            if not validate_numerical_input(self.current_compliance.get()) or float(self.current_compliance.get()) <= 0:
+                messagebox.showerror("Input Error", "Current compliance must be a positive number.", parent=window)
+                return
+
+            filename = asksaveasfilename(
+                defaultextension=".csv",
+                filetypes=[("CSV files", "*.csv"), ("All files", "*.*")],
+                title="Save Full-Rate Retention Data",
+                parent=window
+            )
+            if not filename:
+                return
+
+            try:
+                hours = float(duration.get()) if duration.get().strip() else None
+                self.retention = RetentionMeasurement(
+                    self.instrument, float(bias.get()), float(interval.get()),
+                    duration=hours * 3600 if hours else None, filename=filename,
+                    metadata={"Current Compliance (A)": self.current_compliance.get(),
+                              "Instrument": self.connection_status.get()},
+                    stream=self.stream)
+                self.instrument.set_voltage_source_mode()
+                self.instrument.set_current_measurement_mode()
+                self.instrument.set_current_compliance(float(self.current_compliance.get()))
+            except Exception as e:
+                messagebox.showerror("Retention Error", str(e), parent=window)
+                return
+
+            start_button.config(state="disabled")
+            stop_button.config(state="normal")
+            self.measurement_running = True
+            self.active_run = self.retention
+            threading.Thread(target=self.execute_retention, args=(self.retention,), daemon=True).start()
+            self.master.after(1000, self.update_retention_plot, self.retention, start_button, stop_button)
+
+        def stop():
+            if self.retention:
+                self.retention.stop()
+
+        start_button = Button(window, text="Start", command=start)
+        start_button.grid(row=3, column=0, pady=5)
+        stop_button = Button(window, text="Stop", command=stop, state="disabled")
+        stop_button.grid(row=3, column=1, pady=5)
+
+    def execute_retention(self, retention):
+        """Worker thread body for a retention measurement"""
+        try:
+            retention.run()
+        except Exception as e:
+            self.master.after(0, messagebox.showerror, "Retention Error", str(e))
+        finally:
+            self.active_run = None
+            self.measurement_running = False
+
+    def update_retention_plot(self, retention, start_button, stop_button):
+        """Redraw the downsampled retention data; reschedules itself while the run is active"""
+        t, lo, hi, mean = retention.summary.series()
+        self.ax.clear()
+        self.ax.set_title(f"Retention at {retention.voltage} V - {retention.samples} samples")
+        self.ax.set_xlabel("Time (s)")
+        self.ax.set_ylabel("Current (A)")
+        self.ax.grid(True)
+        if len(t):
+            self.ax.fill_between(t, lo, hi, color='b', alpha=0.2, linewidth=0)
+            self.ax.plot(t, mean, 'b-')
+        self.canvas.draw_idle()
+
+        if retention.running:
+            self.master.after(1000, self.update_retention_plot, retention, start_button, stop_button)
+        else:
+            self.ax.set_title(f"Retention at {retention.voltage} V - Completed ({retention.samples} samples)")
+            self.canvas.draw_idle()
+            for button, state in ((start_button, "normal"), (stop_button, "disabled")):
+                try:
+                    button.config(state=state)
+                except Exception:
+                    pass  # Dialog was closed
+
     def run_self_test(self):
         """Run instrument self-test"""
         if not self.instrument:
             messagebox.showerror("Self-Test Error", "Instrument not connected")
             return
+        if not self.check_idle():
+            return
             
         # Show wait message
         self.master.config(cursor="wait")
@@ -491,14 +1099,88 @@ class KeithleyMemristorGUI:
             # Restore cursor
             self.master.config(cursor="")
 
+    def open_performance_panel(self):
+        """Show live throughput, latency and queue counters and control profiling"""
+        window = Toplevel(self.master)
+        window.title("Performance")
+        text = StringVar(value=self.performance.format())
+        Label(window, textvariable=text, justify="left", font=("Courier", 10)).grid(
+            row=0, column=0, columnspan=4, padx=10, pady=10, sticky="w")
+
+        profiling = BooleanVar(value=self.profiler.enabled)
+
+        def toggle_profiling():
+            self.profiler.enabled = profiling.get()
+
+        def show_profile():
+            from tkinter import scrolledtext
+            report = Toplevel(window)
+            report.title("Profile")
+            report.geometry("900x500")
+            area = scrolledtext.ScrolledText(report, wrap="none", font=("Courier", 9))
+            area.pack(fill="both", expand=True)
+            area.insert("1.0", self.profiler.summary())
+            area.config(state="disabled")
+
+        def export_profile():
+            filename = asksaveasfilename(defaultextension=".prof",
+                                         filetypes=[("Profile files", "*.prof"), ("All files", "*.*")],
+                                         parent=window)
+            if filename:
+                try:
+                    self.profiler.export(filename)
+                except ValueError as e:
+                    messagebox.showerror("Profile", str(e), parent=window)
+
+        Checkbutton(window, text="Profile measurements (cProfile)", variable=profiling,
+                    command=toggle_profiling).grid(row=1, column=0, sticky="w", padx=10)
+        Button(window, text="Show Profile", command=show_profile).grid(row=1, column=1, padx=5)
+        Button(window, text="Export Profile...", command=export_profile).grid(row=1, column=2, padx=5)
+        Button(window, text="Reset", command=self.profiler.reset).grid(row=1, column=3, padx=5)
+
+        def refresh():
+            if not window.winfo_exists():
+                return
+            text.set(self.performance.format())
+            window.after(500, refresh)
+
+        def close():
+            self.loop_monitor.stop()
+            window.destroy()
+
+        # Main-loop latency is only probed while the panel is open
+        self.loop_monitor.start()
+        window.protocol("WM_DELETE_WINDOW", close)
+        refresh()
+
+    def toggle_stream(self):
+        """Start or stop the local live data server; applies to measurements started afterwards"""
+        try:
+            if self.stream_enabled.get() and self.stream is None:
+                self.stream = StreamServer(("127.0.0.1", 5556))
+                self.stream.start()
+            elif not self.stream_enabled.get() and self.stream is not None:
+                self.stream.stop()
+                self.stream = None
+        except OSError as e:
+            self.stream_enabled.set(False)
+            self.stream = None
+            messagebox.showerror("Stream Error", f"Could not start the data stream server: {e}")
+
     def on_closing(self):
         """Handle application closing"""
         try:
+            if self.retention:
+                self.retention.stop()
+            if self.scheduler:
+                self.scheduler.stop()
+            if self.stream:
+                self.stream.stop()
             if self.instrument:
-                print("Shutting down instrument safely...")
+                log.info("Shutting down instrument safely...")
                 self.instrument.safe_shutdown()
         except Exception as e:
-            print(f"Error during shutdown: {e}")
+            log.error("Error during shutdown: %s", e)
         
-        print("Application closing...")
+        log.info("Application closing...")
         self.master.destroy()
\ No newline at end of file
@@ -4,45 +4,101 @@ import time
 import random
 import sys
 import os
+import threading
+from logs import get_logger
+
+log = get_logger("instrument")
+
+
+def is_connection_error(error):
+    """
+    True if an exception (or one it was raised from) means the instrument link was lost
+    
+    Instrument methods wrap VISA errors in RuntimeError, so the cause chain is checked.
+    """
+    while error is not None:
+        if isinstance(error, (pyvisa.errors.VisaIOError, ConnectionError)):
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+# Size of the dynamic reading buffers that hold the measured voltages paired with
+# smua.nvbuffer1/2; matches the capacity of the nonvolatile buffers
+VOLTAGE_BUFFER_CAPACITY = 100000
+
+
+def voltage_buffer(buffer):
+    """Name of the dynamic reading buffer holding the measured voltages paired with `buffer`"""
+    return "_iv_" + buffer.replace(".", "_")
+
 
 class Instrument:
-    def __init__(self, simulation_mode=False, backend='@py'):
+    # TSP sent by set_voltage_source_mode / set_current_measurement_mode, one message each
+    SOURCE_MODE_COMMANDS = (
+        "smua.source.func = smua.OUTPUT_DCVOLTS",
+        "smua.source.autorangev = smua.AUTORANGE_ON",
+        "smua.source.levelv = 0",  # Start at 0V
+        "smua.measure.autorangei = smua.AUTORANGE_ON",
+        "smua.measure.nplc = 1",  # Integration time (adjust as needed)
+        "smua.source.output = smua.OUTPUT_ON",
+    )
+    MEASUREMENT_MODE_COMMANDS = (
+        "smua.measure.autozero = smua.AUTOZERO_ONCE",
+        "smua.source.limiti = 0.1",  # Current compliance (protection), 100mA limit
+    )
+
+    def __init__(self, simulation_mode=False, backend='@py', resource_manager=None):
         self.simulation_mode = simulation_mode
-        if not simulation_mode:
+        if resource_manager is not None:
+            # Externally supplied resource manager (e.g. simulator.SimulatedResourceManager)
+            self.rm = resource_manager
+        elif not simulation_mode:
             try:
                 # Try with specified backend
                 self.rm = pyvisa.ResourceManager(backend)
-                print(f"Using PyVISA backend: {backend}")
+                log.info("Using PyVISA backend: %s", backend)
             except Exception as e:
-                print(f"Failed to use backend {backend}: {str(e)}")
+                log.warning("Failed to use backend %s: %s", backend, e)
                 # Try alternate backend
                 try:
                     alt_backend = "" if backend == "@py" else "@py"
                     self.rm = pyvisa.ResourceManager(alt_backend) 
-                    print(f"Using alternate backend: {alt_backend}")
+                    log.info("Using alternate backend: %r", alt_backend)
                 except Exception:
                     # Last resort - default backend
-                    print("Using default backend")
+                    log.info("Using default backend")
                     self.rm = pyvisa.ResourceManager()
         self.instrument = None
+        self.resource_name = None
         self.current_voltage = 0
+        self.compliance_limit = None
+        # Serializes bus access when buffers are read from a background thread
+        self.bus_lock = threading.RLock()
+        # Names of TSP scripts known to be loaded on the connected instrument
+        self.loaded_scripts = set()
 
     def connect(self, resource_name):
+        self.resource_name = resource_name
         if self.simulation_mode:
             return "KEITHLEY INSTRUMENTS INC.,MODEL 2602,1398687,3.0.0 (SIMULATION)"
             
         try:
             # Check if we're using pyvisa-py backend
-            using_pyvisa_py = '@py' in str(self.rm._visalib)
+            # (ResourceManager._visalib was renamed to visalib in newer PyVISA releases)
+            visalib = getattr(self.rm, 'visalib', None) or getattr(self.rm, '_visalib', None)
+            using_pyvisa_py = type(visalib).__name__ == 'PyVisaLibrary'
             
             self.instrument = self.rm.open_resource(resource_name)
+            self.loaded_scripts = set()
             # Set appropriate timeout and termination characters
             self.instrument.timeout = 10000  # 10 seconds
             self.instrument.write_termination = '\n'
             self.instrument.read_termination = '\n'
             
-            # Print backend information for diagnostics
-            print(f"Connected using backend: {'PyVISA-py' if using_pyvisa_py else 'NI-VISA or other vendor implementation'}")
+            # Log backend information for diagnostics
+            log.info("Connected using backend: %s",
+                     "PyVISA-py" if using_pyvisa_py else "NI-VISA or other vendor implementation")
             
             # Reset the instrument and clear buffers
             self.instrument.write("reset()")
@@ -64,6 +120,48 @@ class Instrument:
             self.instrument.close()
             self.instrument = None
 
+    def reconnect(self, attempts=6, initial_delay=1.0, max_delay=60.0):
+        """
+        Reopen the connection after a link loss and restore the source/measure configuration
+        
+        Attempts are retried with exponential backoff (initial_delay, 2x, 4x, ... up to max_delay).
+        The instrument is reset on connect, so the output is re-enabled at 0 V with the
+        last compliance limit.
+        
+        Args:
+            attempts (int): Maximum number of connection attempts
+            initial_delay (float): Wait before the second attempt in seconds
+            max_delay (float): Upper limit for the wait between attempts
+            
+        Returns:
+            str: Instrument identification
+        """
+        if self.resource_name is None:
+            raise RuntimeError("Instrument was never connected")
+        compliance = self.compliance_limit
+        delay = initial_delay
+        for attempt in range(1, attempts + 1):
+            if self.instrument is not None:
+                try:
+                    self.instrument.close()
+                except Exception:
+                    pass
+                self.instrument = None
+            try:
+                idn = self.connect(self.resource_name)
+                self.set_voltage_source_mode()
+                self.set_current_measurement_mode()
+                if compliance:
+                    self.set_current_compliance(compliance)
+                log.info("Reconnected to %s (attempt %d)", self.resource_name, attempt)
+                return idn
+            except Exception as e:
+                log.warning("Reconnect attempt %d/%d failed: %s", attempt, attempts, e)
+                if attempt == attempts:
+                    raise ConnectionError(f"Could not reconnect to {self.resource_name} after {attempts} attempts") from e
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+
     def set_voltage(self, voltage):
         if self.simulation_mode:
             self.current_voltage = voltage
@@ -83,28 +181,38 @@ class Instrument:
             # Measure and return current
             return float(self.instrument.query("print(smua.measure.i())"))
 
+    def measure_iv(self):
+        """
+        Measure current and voltage in one reading
+        
+        Returns:
+            tuple: (current, voltage); the voltage is the measured one, not the programmed level
+        """
+        if self.simulation_mode:
+            return self.measure_current(), float(self.current_voltage)
+            
+        if self.instrument:
+            current, voltage = self.instrument.query("print(smua.measure.iv())").split()
+            return float(current), float(voltage)
+
     def set_voltage_source_mode(self):
         if self.simulation_mode:
             return
             
         if self.instrument:
             # Configure for voltage source mode and current measurement
-            self.instrument.write("smua.source.func = smua.OUTPUT_DCVOLTS")
-            self.instrument.write("smua.source.autorangev = smua.AUTORANGE_ON")
-            self.instrument.write("smua.source.levelv = 0")  # Start at 0V
-            self.instrument.write("smua.measure.autorangei = smua.AUTORANGE_ON")
-            self.instrument.write("smua.measure.nplc = 1")  # Integration time (adjust as needed)
-            self.instrument.write("smua.source.output = smua.OUTPUT_ON")
+            for command in self.SOURCE_MODE_COMMANDS:
+                self.instrument.write(command)
 
     def set_current_measurement_mode(self):
         if self.simulation_mode:
             return
             
         if self.instrument:
-            # Configure current measurement settings
-            self.instrument.write("smua.measure.autozero = smua.AUTOZERO_ONCE")
-            # Set current compliance (protection)
-            self.instrument.write("smua.source.limiti = 0.1")  # 100mA limit
+            # Configure current measurement settings and compliance
+            for command in self.MEASUREMENT_MODE_COMMANDS:
+                self.instrument.write(command)
+            self.compliance_limit = 0.1
 
     def set_current_compliance(self, limit_amps):
         """
@@ -113,6 +221,7 @@ class Instrument:
         Args:
             limit_amps (float): Maximum allowed current in amperes
         """
+        self.compliance_limit = limit_amps
         if self.simulation_mode:
             return
             
@@ -120,10 +229,39 @@ class Instrument:
             try:
                 # Convert to scientific notation for better precision
                 self.instrument.write(f"smua.source.limiti = {limit_amps}")
-                print(f"Current compliance set to {limit_amps} A")
+                log.debug("Current compliance set to %s A", limit_amps)
             except Exception as e:
                 raise RuntimeError(f"Failed to set current compliance: {e}")
 
+    @staticmethod
+    def measure_settings_commands(nplc=1.0, current_range=None, voltage_range=None):
+        """TSP for integration time and ranges; a range of None selects autorange"""
+        if voltage_range is None:
+            source_range = "smua.source.autorangev = smua.AUTORANGE_ON"
+        else:
+            source_range = f"smua.source.rangev = {voltage_range}"
+        if current_range is None:
+            measure_range = "smua.measure.autorangei = smua.AUTORANGE_ON"
+        else:
+            measure_range = f"smua.measure.rangei = {current_range}"
+        return [source_range, measure_range, f"smua.measure.nplc = {nplc}"]
+
+    def configure_measurement(self, nplc=1.0, current_range=None, voltage_range=None):
+        """
+        Set the integration time and the source/measure ranges
+
+        Args:
+            nplc (float): Integration time in power line cycles
+            current_range (float, optional): Fixed current measure range; None for autorange
+            voltage_range (float, optional): Fixed voltage source range; None for autorange
+        """
+        if self.simulation_mode:
+            return
+
+        if self.instrument:
+            for command in self.measure_settings_commands(nplc, current_range, voltage_range):
+                self.instrument.write(command)
+
     def ramp_voltage(self, target_voltage, step_size=0.1, delay=0.02):
         """
         Gradually ramp voltage to target value for device safety
@@ -183,9 +321,268 @@ class Instrument:
                 self.ramp_voltage(0)
                 # Turn off output
                 self.instrument.write("smua.source.output = smua.OUTPUT_OFF")
-                print("Instrument safely shut down")
+                log.info("Instrument safely shut down")
             except Exception as e:
-                print(f"Warning: Error during safe shutdown: {e}")
+                log.warning("Error during safe shutdown: %s", e)
+
+    @property
+    def supports_buffered_acquisition(self):
+        """True if instrument-timed, buffered acquisition is available"""
+        return not self.simulation_mode and self.instrument is not None
+
+    def start_buffered_current(self, count, interval, buffer="smua.nvbuffer1"):
+        """
+        Start an instrument-timed current acquisition into a reading buffer
+
+        The instrument takes `count` readings `interval` seconds apart at the present
+        source level and stores them with timestamps; the call returns immediately.
+
+        Args:
+            count (int): Number of readings
+            interval (float): Time between readings in seconds
+            buffer (str): TSP name of the reading buffer
+        """
+        if not self.supports_buffered_acquisition:
+            raise RuntimeError("Buffered acquisition requires a connected instrument")
+
+        # One message to keep the bus transactions per chunk constant
+        with self.bus_lock:
+            self.instrument.write(
+                f"{buffer}.clear() {buffer}.appendmode = 1 {buffer}.collecttimestamps = 1 "
+                f"smua.measure.count = {int(count)} smua.measure.interval = {interval} "
+                f"smua.measure.overlappedi({buffer})"
+            )
+
+    def configure_list_sweep(self, voltages, chunk_size=500, source_delay=None):
+        """
+        Load a list of source voltages into the trigger model for instrument-side sweeps
+        
+        The list is uploaded in chunks to stay within the instrument's command length limit.
+        
+        Args:
+            voltages (array-like): Source voltages in sweep order
+            chunk_size (int): Values sent per bus message
+            source_delay (float, optional): Delay after each source step; None keeps the current setting
+        """
+        if not self.supports_buffered_acquisition:
+            raise RuntimeError("List sweeps require a connected instrument")
+
+        with self.bus_lock:
+            for command in self.list_sweep_commands(voltages, chunk_size, source_delay):
+                self.instrument.write(command)
+
+    @staticmethod
+    def list_sweep_commands(voltages, chunk_size=500, source_delay=None):
+        """TSP messages that load a list sweep (see configure_list_sweep)"""
+        commands = ["_sweep_points = {}"]
+        for k in range(0, len(voltages), chunk_size):
+            values = ",".join(f"{float(v):.10g}" for v in voltages[k:k + chunk_size])
+            commands.append(f"for _, v in ipairs({{{values}}}) do table.insert(_sweep_points, v) end")
+        commands.append(
+            f"smua.trigger.source.listv(_sweep_points) smua.trigger.source.action = smua.ENABLE "
+            f"smua.trigger.measure.action = smua.ENABLE smua.trigger.count = {len(voltages)} "
+            f"smua.trigger.arm.count = 1 smua.trigger.endsweep.action = smua.SOURCE_HOLD"
+        )
+        if source_delay is not None:
+            commands.append(f"smua.source.delay = {source_delay}")
+        return commands
+
+    @staticmethod
+    def _make_voltage_buffer(buffer):
+        """TSP that creates the voltage buffer paired with `buffer` unless it exists"""
+        vbuffer = voltage_buffer(buffer)
+        return f"if {vbuffer} == nil then {vbuffer} = smua.makebuffer({VOLTAGE_BUFFER_CAPACITY}) end"
+
+    @classmethod
+    def _prepare_iv_buffers(cls, buffer):
+        """
+        TSP that clears `buffer` and its paired voltage buffer for a combined I-V acquisition
+        
+        Both collect timestamps and source values.
+        """
+        vbuffer = voltage_buffer(buffer)
+        return (f"{cls._make_voltage_buffer(buffer)} "
+                + " ".join(f"{b}.clear() {b}.appendmode = 1 {b}.collecttimestamps = 1 {b}.collectsourcevalues = 1"
+                           for b in (buffer, vbuffer)))
+
+    def start_list_sweep(self, buffer="smua.nvbuffer1"):
+        """
+        Run the configured list sweep once, measuring current and voltage together
+        
+        Currents go to `buffer`, measured voltages to its paired voltage buffer, both with
+        instrument timestamps. The sweep runs on the instrument; the call returns immediately.
+        """
+        with self.bus_lock:
+            self.instrument.write(self.start_list_sweep_command(buffer))
+
+    @classmethod
+    def start_list_sweep_command(cls, buffer="smua.nvbuffer1"):
+        """TSP message that starts the configured list sweep (see start_list_sweep)"""
+        return (f"{cls._prepare_iv_buffers(buffer)} "
+                f"smua.trigger.measure.iv({buffer}, {voltage_buffer(buffer)}) smua.trigger.initiate()")
+
+    def buffered_count(self, buffer="smua.nvbuffer1", iv=False):
+        """
+        Return the number of readings currently stored in a reading buffer
+        
+        With iv=True only complete current/voltage pairs of a combined acquisition are counted.
+        """
+        with self.bus_lock:
+            return int(float(self.instrument.query(self.buffered_count_command(buffer, iv))))
+
+    @staticmethod
+    def buffered_count_command(buffer="smua.nvbuffer1", iv=False):
+        if iv:
+            return f"print(math.min({buffer}.n, {voltage_buffer(buffer)}.n))"
+        return f"print({buffer}.n)"
+
+    def read_buffer(self, start, end, buffer="smua.nvbuffer1"):
+        """
+        Read readings start..end (1-based, inclusive) with their timestamps
+
+        Returns:
+            tuple: numpy arrays (timestamps, readings)
+        """
+        return self.read_buffer_columns(start, end, (f"{buffer}.timestamps", f"{buffer}.readings"))
+
+    def read_buffer_iv(self, start, end, buffer="smua.nvbuffer1"):
+        """
+        Read entries start..end (1-based, inclusive) of a combined I-V acquisition in one transfer
+        
+        Returns:
+            tuple: numpy arrays (timestamps, measured voltages, currents)
+        """
+        return self.read_buffer_columns(start, end, self.iv_columns(buffer))
+
+    @staticmethod
+    def iv_columns(buffer="smua.nvbuffer1"):
+        """Buffer columns of a combined I-V acquisition: timestamps, measured voltages, currents"""
+        return (f"{buffer}.timestamps", f"{voltage_buffer(buffer)}.readings", f"{buffer}.readings")
+
+    def read_buffer_columns(self, start, end, columns):
+        """
+        Read entries start..end (1-based, inclusive) of several buffer columns in one transfer
+
+        Args:
+            columns (sequence): TSP names of the columns, e.g. ("smua.nvbuffer1.sourcevalues", ...)
+
+        Returns:
+            tuple: One numpy array per column
+        """
+        if end < start:
+            return tuple(np.empty(0) for _ in columns)
+        with self.bus_lock:
+            response = self.instrument.query(f"printbuffer({int(start)}, {int(end)}, {', '.join(columns)})")
+        return self.parse_buffer(response, len(columns))
+
+    @staticmethod
+    def parse_buffer(response, columns):
+        """Split a printbuffer() response into one numpy array per column"""
+        values = np.array(response.split(','), dtype=float).reshape(-1, columns)
+        return tuple(values[:, k] for k in range(columns))
+
+    def finish_buffered_acquisition(self):
+        """Abort any running buffered acquisition and restore single-reading measurements"""
+        if not self.supports_buffered_acquisition:
+            return
+        with self.bus_lock:
+            self.instrument.write("smua.abort() waitcomplete() smua.measure.count = 1 smua.measure.interval = 0")
+
+    def load_script(self, name, body):
+        """
+        Load a named TSP script on the instrument and run it once (defining its functions)
+        
+        Args:
+            name (str): Script name (must be a valid TSP identifier)
+            body (str): Script source
+        """
+        if not self.supports_buffered_acquisition:
+            return
+        with self.bus_lock:
+            self.instrument.write(f"loadandrunscript {name}\n{body}\nendscript")
+        self.loaded_scripts.add(name)
+
+    def script_loaded(self, name):
+        """Return True if a script of this name is loaded on the instrument"""
+        if not self.supports_buffered_acquisition:
+            return False
+        if name in self.loaded_scripts:
+            return True
+        with self.bus_lock:
+            exists = self.instrument.query(f"print({name} ~= nil)").strip() == "true"
+        if exists:
+            self.loaded_scripts.add(name)
+        return exists
+
+    def delete_script(self, name):
+        """
+        Remove a script loaded with load_script and the globals it defined
+
+        script.delete frees the script itself (named scripts stay in script.user.scripts
+        otherwise); the script variable and its helper globals are then set to nil.
+        """
+        self.loaded_scripts.discard(name)
+        if not self.supports_buffered_acquisition:
+            return
+        with self.bus_lock:
+            self.instrument.write(f"script.delete('{name}') {name} = nil {name}_run = nil {name}_points = nil "
+                                  f"{name}_limits = nil {name}_counts = nil collectgarbage()")
+
+    def run_script_sweep(self, function, count, duration=0.0, buffer="smua.nvbuffer1"):
+        """
+        Call a loaded sweep function and fetch its readings in a single query
+        
+        The function is passed `buffer` and its paired voltage buffer and measures current
+        and voltage together.
+        
+        Args:
+            function (str): TSP function that starts the sweep into `buffer`
+            count (int): Expected number of readings
+            duration (float): Expected sweep time, used to extend the bus timeout
+            buffer (str): TSP name of the reading buffer
+            
+        Returns:
+            tuple: numpy arrays (timestamps, measured voltages, currents)
+        """
+        vbuffer = voltage_buffer(buffer)
+        response = self.query_script(
+            f"{self._make_voltage_buffer(buffer)} {function}({buffer}, {vbuffer}) waitcomplete() "
+            f"printbuffer(1, {int(count)}, {buffer}.timestamps, {vbuffer}.readings, {buffer}.readings)", duration)
+        values = np.array(response.split(','), dtype=float).reshape(-1, 3)
+        return values[:, 0], values[:, 1], values[:, 2]
+
+    def query_script(self, command, duration=0.0):
+        """
+        Send a command that runs on the instrument for a while and read its one-line response
+        
+        Args:
+            command (str): TSP command, typically a call of a loaded script function
+            duration (float): Expected run time, used to extend the bus timeout
+        """
+        if not self.supports_buffered_acquisition:
+            raise RuntimeError("Instrument-side scripts require a connected instrument")
+        with self.bus_lock:
+            timeout = self.instrument.timeout
+            self.instrument.timeout = max(timeout, int((duration * 2 + 10) * 1000))
+            try:
+                return self.instrument.query(command).strip()
+            finally:
+                self.instrument.timeout = timeout
+
+    def abort(self):
+        """
+        Abort a script or sweep running on the instrument with a device clear
+
+        Safe to call from another thread while query_script() waits (it does not take
+        the bus lock); the waiting query then fails and the caller shuts down safely.
+        """
+        if self.simulation_mode or not self.instrument:
+            return
+        try:
+            self.instrument.clear()
+            log.info("Instrument-side run aborted (device clear)")
+        except Exception as e:
+            log.warning("Device clear failed: %s", e)
 
     def self_test(self):
         """Perform instrument self-test and verify basic functionality"""
@@ -203,8 +600,8 @@ class Instrument:
             # Run TSP built-in self-test
             result = self.instrument.query("print(smua.selftest.run())")
             
-            # 0 means success
-            if result.strip() == "0":
+            # 0 means success (TSP prints numbers in exponent format, e.g. 0.00000e+00)
+            if float(result) == 0:
                 # Now test communication by setting/reading a parameter
                 self.instrument.write("smua.measure.nplc = 1.0")
                 nplc = self.instrument.query("print(smua.measure.nplc)").strip()
@@ -0,0 +1,152 @@
+"""
+Logging for the measurement code.
+
+All modules log through loggers below "memristor" (get_logger). configure_logging()
+routes them through a QueueHandler: the measurement thread only puts the record on a
+queue, and a QueueListener thread formats and writes it, so console or file I/O never
+blocks acquisition. Records can be written as plain text or as one JSON object per line.
+
+Per-point messages go to the "memristor.points" logger, which is off by default; when
+enabled (point_logging=True) it is rate limited so that fast sweeps cannot flood the
+console. Hot loops check point_logger.isEnabledFor(logging.DEBUG) before formatting
+anything, so a disabled point log costs one attribute lookup per point.
+"""
+
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+
+ROOT = "memristor"
+POINTS = ROOT + ".points"
+
+point_logger = logging.getLogger(POINTS)
+point_logger.setLevel(logging.WARNING)
+
+_listener = None
+
+
+def get_logger(name):
+    """Logger for a module, e.g. get_logger("instrument") -> "memristor.instrument\""""
+    return logging.getLogger(f"{ROOT}.{name}")
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Let at most one record per message template through every interval seconds
+
+    Records are grouped by logger name and unformatted message, so e.g. all per-point
+    lines of a sweep share one limit. The number of dropped records is added to the
+    next record that passes.
+
+    Args:
+        interval (float): Minimum time between records of the same template in seconds
+    """
+
+    def __init__(self, interval=0.1):
+        super().__init__()
+        self.interval = interval
+        self._last = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record):
+        key = (record.name, record.msg)
+        now = time.monotonic()
+        with self._lock:
+            last, suppressed = self._last.get(key, (-float('inf'), 0))
+            if now - last < self.interval:
+                self._last[key] = (last, suppressed + 1)
+                return False
+            self._last[key] = (now, 0)
+        if suppressed:
+            record.suppressed = suppressed
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record: time, level, logger, message and any extra fields"""
+
+    RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {"time": record.created, "level": record.levelname, "logger": record.name,
+                 "message": record.getMessage()}
+        entry.update({key: value for key, value in vars(record).items() if key not in self.RESERVED})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s: %(message)s")
+
+    def format(self, record):
+        text = super().format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        return f"{text} ({suppressed} similar suppressed)" if suppressed else text
+
+
+def configure_logging(level="INFO", json_format=False, filename=None, point_logging=False,
+                      point_interval=0.1):
+    """
+    Set up non-blocking logging for the application (call once at startup)
+
+    Args:
+        level (str or int): Level of the "memristor" loggers
+        json_format (bool): Write JSON lines instead of text
+        filename (str, optional): Log file; None writes to stderr
+        point_logging (bool): Log every measured point (at DEBUG, rate limited)
+        point_interval (float): Minimum time between two point records in seconds
+
+    Returns:
+        logging.handlers.QueueListener: The running listener (stopped at exit)
+    """
+    global _listener
+    _stop_listener()
+
+    handler = logging.FileHandler(filename) if filename else logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if json_format else TextFormatter())
+    records = queue.SimpleQueue()
+    queue_handler = logging.handlers.QueueHandler(records)
+
+    root = logging.getLogger(ROOT)
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(queue_handler)
+    root.setLevel(level)
+    root.propagate = False
+
+    point_logger.setLevel(logging.DEBUG if point_logging else logging.WARNING)
+    for old in [f for f in point_logger.filters if isinstance(f, RateLimitFilter)]:
+        point_logger.removeFilter(old)
+    point_logger.addFilter(RateLimitFilter(point_interval))
+
+    _listener = logging.handlers.QueueListener(records, handler, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+
+@atexit.register
+def _stop_listener():
+    """Flush records still in the queue when the program exits"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def add_logging_arguments(parser):
+    """Add --log-level, --log-json, --log-file and --log-points to an argparse parser"""
+    parser.add_argument("--log-level", default="INFO", help="DEBUG, INFO, WARNING or ERROR")
+    parser.add_argument("--log-json", action="store_true", help="Write log records as JSON lines")
+    parser.add_argument("--log-file", help="Write the log to this file instead of stderr")
+    parser.add_argument("--log-points", action="store_true", help="Log every measured point (rate limited)")
+
+
+def configure_from_arguments(args):
+    """configure_logging() from arguments added by add_logging_arguments()"""
+    return configure_logging(args.log_level.upper(), args.log_json, args.log_file, args.log_points)
@@ -1,8 +1,10 @@
 import tkinter as tk
 from tkinter import messagebox
 from gui import KeithleyMemristorGUI
+from logs import configure_logging
 
 def main():
+    configure_logging()
     root = tk.Tk()
     root.title("Keithley Memristor GUI")
     
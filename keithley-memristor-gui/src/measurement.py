@@ -1,17 +1,147 @@
+import logging
+import threading
 import time
 import numpy as np
 import pyvisa
+from buffers import AcquisitionBuffer, FLAG_COMPLIANCE
+from pipeline import PipelinedAcquisition
+from recipe import RecipeCache
+from checkpoint import ResumableSweep
+from logs import get_logger, point_logger
+
+log = get_logger("measurement")
 
 class Measurement:
-    def __init__(self, instrument):
+    def __init__(self, instrument, stream=None):
         self.instrument = instrument
-        self.voltages = []
-        self.currents = []
+        self.buffer = AcquisitionBuffer(0)
+        # Optional stream.StreamServer that receives acquired data
+        self.stream = stream
+        self._stop = threading.Event()
+        self._script_running = False
+
+    def stop(self):
+        """
+        Stop a voltage_sweep / run_recipe / waveform_sweep / run_resumable run from another thread
+
+        Host-side sweeps stop after the current point. An instrument-side list sweep is
+        aborted and a compiled recipe is interrupted with a device clear; the readings
+        the instrument took before that are fetched into the buffer (run_recipe then
+        re-raises the error of the interrupted call).
+        """
+        self._stop.set()
+        if self._script_running:
+            self.instrument.abort()
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    @property
+    def voltages(self):
+        return self.buffer.voltages
+
+    @property
+    def currents(self):
+        return self.buffer.currents
+
+    @property
+    def timestamps(self):
+        return self.buffer.timestamps
+
+    @property
+    def flags(self):
+        return self.buffer.flags
+
+    @property
+    def cycles(self):
+        return self.buffer.cycles
+
+    @property
+    def segments(self):
+        return self.buffer.segments
+
+    def point_flags(self, current):
+        """Return the per-point status flags for a measured current"""
+        limit = getattr(self.instrument, 'compliance_limit', None)
+        if limit and abs(current) >= 0.999 * limit:
+            return FLAG_COMPLIANCE
+        return 0
+
+    @staticmethod
+    def sweep_points(start_voltage, stop_voltage, step_voltage):
+        """Return the voltage points of a start -> stop sweep"""
+        if step_voltage == 0:
+            # Just a single point measurement if step is 0
+            step_count = 1
+        else:
+            step_count = abs(int((stop_voltage - start_voltage) / step_voltage)) + 1
+
+        # Generate evenly spaced voltage points
+        return np.linspace(start_voltage, stop_voltage, step_count)
+
+    def list_sweep(self, voltage_points, source_delay=0.0, nplc=1.0, on_points=None, poll=0.02):
+        """
+        Run the points as one instrument-timed list sweep (combined measure.iv into reading buffers)
+        
+        Measured voltages, currents and instrument timestamps are read in one transfer when
+        the sweep completes, or block by block as they arrive when on_points is given (for
+        live display). stop() aborts the sweep and keeps the readings already taken.
+        
+        Args:
+            voltage_points (array-like): Source voltages in sweep order
+            source_delay (float): Delay after each source step in seconds
+            nplc (float): Configured integration time, used to bound the wait
+            on_points (callable, optional): Called as on_points(first, timestamps, voltages, currents)
+                for every block of new points (first is the 0-based index of the block)
+            poll (float): Buffer polling interval in seconds
+            
+        Returns:
+            tuple: numpy arrays (timestamps from 0, measured voltages, currents)
+            
+        Raises:
+            ConnectionError: If the buffer stops filling for twice the expected sweep time plus 10 s
+        """
+        count = len(voltage_points)
+        self.instrument.configure_list_sweep(voltage_points, source_delay=source_delay)
+        self.instrument.start_list_sweep()
+        deadline = time.perf_counter() + count * (nplc / 50.0 + source_delay) * 2 + 10
+        blocks = []
+        fetched = 0
+        first_timestamp = None
+        try:
+            while fetched < count:
+                stopped = self._stop.wait(poll)
+                if stopped:
+                    # Stop the sweep but keep the readings already taken
+                    self.instrument.finish_buffered_acquisition()
+                available = min(self.instrument.buffered_count(iv=True), count)
+                if available > fetched and (on_points is not None or stopped or available == count):
+                    timestamps, voltages, currents = self.instrument.read_buffer_iv(fetched + 1, available)
+                    if first_timestamp is None:
+                        first_timestamp = timestamps[0]
+                    blocks.append((timestamps - first_timestamp, voltages, currents))
+                    if on_points is not None:
+                        on_points(fetched, *blocks[-1])
+                    fetched = available
+                if stopped:
+                    break
+                if fetched < count and time.perf_counter() > deadline:
+                    raise ConnectionError(f"List sweep stalled at {available} of {count} readings")
+        finally:
+            self.instrument.finish_buffered_acquisition()
+        if not blocks:
+            return tuple(np.empty(0) for _ in range(3))
+        return tuple(np.concatenate(column) for column in zip(*blocks))
 
     def voltage_sweep(self, start_voltage, stop_voltage, step_voltage, delay):
         """
         Execute a voltage sweep and measure current at each step
         
+        With a connected instrument the sweep runs on the instrument as a list sweep and
+        the points carry instrument timestamps; in simulation mode the points are measured
+        on the host.
+        
         Args:
             start_voltage (float): Starting voltage
             stop_voltage (float): Ending voltage
@@ -19,43 +149,46 @@ class Measurement:
             delay (float): Delay between measurements
             
         Returns:
-            tuple: Lists of voltages and corresponding currents
+            tuple: Arrays of measured voltages and corresponding currents
         """
-        # Initialize data lists
-        self.voltages = []
-        self.currents = []
+        # Generate evenly spaced voltage points and preallocate storage for them
+        voltage_points = self.sweep_points(start_voltage, stop_voltage, step_voltage)
+        self.buffer = AcquisitionBuffer(len(voltage_points))
+        self._stop.clear()
         
         try:
             # First ramp safely to start voltage
             self.instrument.ramp_voltage(start_voltage)
             
-            # Calculate step count for proper np.linspace
-            if step_voltage == 0:
-                # Just a single point measurement if step is 0
-                step_count = 1
-            else:
-                step_count = abs(int((stop_voltage - start_voltage) / step_voltage)) + 1
-                
-            # Generate evenly spaced voltage points
-            voltage_points = np.linspace(start_voltage, stop_voltage, step_count)
+            if self.instrument.supports_buffered_acquisition:
+                timestamps, voltages, currents = self.list_sweep(voltage_points, delay)
+                self.buffer.extend(voltages, currents, timestamps, [self.point_flags(c) for c in currents])
+                self.instrument.ramp_voltage(0)
+                return self.voltages, self.currents
+            
+            start_time = time.perf_counter()
             
             # Perform the sweep
             for voltage in voltage_points:
+                if self._stop.is_set():
+                    break
+                
                 # Set voltage (without ramping within the sweep)
                 self.instrument.set_voltage(voltage)
                 
                 # Wait for device settling
                 time.sleep(delay)
                 
-                # Measure current
-                current = self.instrument.measure_current()
+                # Measure current and the voltage actually applied in one reading
+                current, measured_voltage = self.instrument.measure_iv()
                 
                 # Store results
-                self.voltages.append(voltage)
-                self.currents.append(current)
+                self.buffer.append(measured_voltage, current, time.perf_counter() - start_time,
+                                   self.point_flags(current))
                 
-                # Print feedback
-                print(f"V = {voltage:.6f} V, I = {current:.6e} A")
+                # Per-point feedback (off by default, see logs.configure_logging)
+                if point_logger.isEnabledFor(logging.DEBUG):
+                    point_logger.debug("V = %.6f V, I = %.6e A", measured_voltage, current)
             
             # Safety: ramp back to 0V after measurement
             self.instrument.ramp_voltage(0)
@@ -64,10 +197,161 @@ class Measurement:
             
         except Exception as e:
             # Ensure safe state on error
-            print("Error during sweep, shutting down safely")
+            log.error("Error during sweep, shutting down safely")
+            self.instrument.safe_shutdown()
+            raise e
+
+    def run_recipe(self, recipe, cache=None):
+        """
+        Execute a sweep recipe, reusing its compiled instrument-side program when cached
+        
+        On the instrument a repeated recipe costs one function call and one bulk transfer
+        of measured voltages, currents and timestamps; in simulation mode the points are
+        measured on the host.
+        
+        Args:
+            recipe (SweepRecipe): Sweep definition
+            cache (RecipeCache, optional): Cache shared between runs
+            
+        Returns:
+            tuple: Arrays of voltages and corresponding currents
+        """
+        cache = cache if cache is not None else RecipeCache()
+        compiled = cache.prepare(self.instrument, recipe)
+        points = compiled.voltage_points
+        limits = recipe.point_compliance
+        cycles = recipe.cycle_index if recipe.cycle_index is not None else np.zeros(len(points), dtype=int)
+        segments = recipe.segment_index if recipe.segment_index is not None else np.zeros(len(points), dtype=int)
+        self.buffer = AcquisitionBuffer(len(points))
+        self._stop.clear()
+        
+        try:
+            # First ramp safely to start voltage
+            self.instrument.ramp_voltage(points[0])
+            
+            if self.instrument.supports_buffered_acquisition:
+                # The recipe program configures the compliance itself
+                self.instrument.compliance_limit = limits[-1]
+                self._script_running = True
+                try:
+                    timestamps, voltages, currents = self.instrument.run_script_sweep(
+                        compiled.function, len(points), recipe.estimated_duration())
+                except Exception:
+                    if self._stop.is_set():
+                        self._fetch_partial(limits, cycles, segments)
+                    raise
+                finally:
+                    self._script_running = False
+                flags = np.where(np.abs(currents) >= 0.999 * limits, FLAG_COMPLIANCE, 0)
+                self.buffer.extend(voltages, currents, timestamps, flags, cycles, segments)
+            else:
+                start_time = time.perf_counter()
+                for first, stop, compliance in recipe.compliance_runs():
+                    # Compliance changes once per run of points, not per point
+                    self.instrument.set_current_compliance(compliance)
+                    for k in range(first, stop):
+                        if self._stop.is_set():
+                            break
+                        self.instrument.set_voltage(points[k])
+                        time.sleep(recipe.source_delay)
+                        current, voltage = self.instrument.measure_iv()
+                        self.buffer.append(voltage, current, time.perf_counter() - start_time,
+                                           self.point_flags(current), cycles[k], segments[k])
+            
+            # Safety: ramp back to 0V after measurement
+            self.instrument.ramp_voltage(0)
+            
+            if self.stream is not None:
+                self.stream.publish_chunk("sweep", self.voltages, self.currents, self.timestamps,
+                                          cycles=self.cycles, segments=self.segments)
+            return self.voltages, self.currents
+            
+        except Exception as e:
+            # Ensure safe state on error
+            log.error("Error during sweep, shutting down safely")
             self.instrument.safe_shutdown()
             raise e
 
+    def _fetch_partial(self, limits, cycles, segments):
+        """Keep the readings an interrupted recipe program took before it was aborted"""
+        try:
+            count = min(self.instrument.buffered_count(iv=True), len(limits))
+            timestamps, voltages, currents = self.instrument.read_buffer_iv(1, count)
+        except Exception as e:
+            log.warning("Could not fetch the readings of the aborted sweep: %s", e)
+            return
+        flags = np.where(np.abs(currents) >= 0.999 * limits[:count], FLAG_COMPLIANCE, 0)
+        self.buffer.extend(voltages, currents, timestamps, flags, cycles[:count], segments[:count])
+        log.info("Kept %d readings of the aborted sweep", count)
+
+    def waveform_sweep(self, waveform, delay=0.0, cache=None, statistics=None, **settings):
+        """
+        Run a multi-segment waveform, all cycles included, as one continuous sweep
+        
+        The instrument ramps to the first point once and back to 0 V once; segments with
+        different compliance follow each other without host round trips. The cycle and
+        segment index of every point are available as self.cycles and self.segments.
+        
+        Args:
+            waveform (Waveform): Waveform definition
+            delay (float): Delay after each source step in seconds
+            cache (RecipeCache, optional): Cache shared between runs
+            statistics (CampaignStatistics, optional): Updated with the metrics of every cycle
+                when the points arrive (in one transfer, at the end of the sweep); its snapshot
+                is published to the stream
+            **settings: Further SweepRecipe settings (nplc, ranges)
+            
+        Returns:
+            tuple: Arrays of voltages and corresponding currents
+        """
+        self.run_recipe(waveform.to_recipe(source_delay=delay, **settings), cache)
+        if statistics is not None:
+            statistics.add_cycles(self.voltages, self.currents, self.cycles)
+            if self.stream is not None:
+                self.stream.publish("statistics", source="waveform", **statistics.snapshot())
+        return self.voltages, self.currents
+
+    def run_resumable(self, recipe, checkpoint_path, **options):
+        """
+        Execute a recipe with on-disk checkpoints, reconnecting and resuming after a link loss
+        
+        If checkpoint_path holds progress of the same recipe (e.g. after a crash), the run
+        continues from the last committed point instead of starting over.
+        
+        Args:
+            recipe (SweepRecipe): Sweep or waveform definition
+            checkpoint_path (str): Checkpoint file
+            **options: ResumableSweep options (chunk_size, reconnect_attempts, ...)
+            
+        Returns:
+            tuple: Arrays of voltages and corresponding currents
+        """
+        options.setdefault("stream", self.stream)
+        self._stop.clear()
+        options["stop_event"] = self._stop
+        self.buffer = ResumableSweep(self.instrument, recipe, checkpoint_path, **options).run()
+        return self.voltages, self.currents
+
+    def cycling_sweep(self, voltage_points, cycles, on_cycle=None, statistics=None):
+        """
+        Repeat a sweep for several cycles with overlapped acquisition and readout
+        
+        Args:
+            voltage_points (array-like): Source voltages of one cycle
+            cycles (int): Number of cycles
+            on_cycle (callable, optional): Called as on_cycle(cycle, voltages, currents, timestamps)
+                from a background thread as each cycle arrives
+            statistics (CampaignStatistics, optional): Updated with the metrics of every cycle
+                as it arrives (see PipelinedAcquisition)
+            
+        Returns:
+            tuple: Arrays of voltages and corresponding currents for all cycles
+        """
+        acquisition = PipelinedAcquisition(self.instrument, voltage_points, cycles, on_cycle, stream=self.stream,
+                                           statistics=statistics)
+        self.buffer = acquisition.run()
+        return self.voltages, self.currents
+
     def validate_parameters(self, start_voltage, stop_voltage, step_voltage, delay):
         if not all(isinstance(param, (int, float)) for param in [start_voltage, stop_voltage, step_voltage, delay]):
             raise ValueError("All parameters must be numeric values.")
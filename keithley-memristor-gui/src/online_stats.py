@@ -0,0 +1,293 @@
+import math
+import threading
+import numpy as np
+
+
+class RunningStats:
+    """
+    Count, mean, variance, min and max of a stream (Welford's update)
+
+    O(1) time and memory per value; two instances can be merged (e.g. from
+    separate runs) without revisiting the data.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def add(self, value):
+        value = float(value)
+        if not math.isfinite(value):
+            return
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (value - self.mean)
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def merge(self, other):
+        """Combine with another RunningStats (Chan et al.)"""
+        if other.count == 0:
+            return
+        total = self.count + other.count
+        delta = other.mean - self.mean
+        self._m2 += other._m2 + delta * delta * self.count * other.count / total
+        self.mean += delta * other.count / total
+        self.count = total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    @property
+    def variance(self):
+        """Sample variance (nan for fewer than two values)"""
+        return self._m2 / (self.count - 1) if self.count > 1 else math.nan
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance) if self.count > 1 else math.nan
+
+
+class P2Quantile:
+    """
+    Streaming estimate of one quantile with five markers (P-square algorithm, Jain & Chlamtac)
+
+    O(1) time and memory per value, no samples are stored.
+
+    Args:
+        p (float): Quantile between 0 and 1
+    """
+
+    def __init__(self, p):
+        if not 0 < p < 1:
+            raise ValueError("Quantile must be between 0 and 1.")
+        self.p = p
+        self._initial = []
+        self.q = None
+
+    def add(self, value):
+        value = float(value)
+        if not math.isfinite(value):
+            return
+        if self.q is None:
+            self._initial.append(value)
+            if len(self._initial) == 5:
+                p = self.p
+                self.q = sorted(self._initial)
+                self.n = [0, 1, 2, 3, 4]
+                self.desired = [0, 2 * p, 4 * p, 2 + 2 * p, 4]
+                self.increment = [0, p / 2, p, (1 + p) / 2, 1]
+            return
+
+        q, n = self.q, self.n
+        if value < q[0]:
+            q[0] = value
+            k = 0
+        elif value >= q[4]:
+            q[4] = value
+            k = 3
+        else:
+            k = next(i for i in range(4) if q[i] <= value < q[i + 1])
+        for i in range(k + 1, 5):
+            n[i] += 1
+        for i in range(5):
+            self.desired[i] += self.increment[i]
+
+        # Move the middle markers towards their desired positions
+        for i in (1, 2, 3):
+            d = self.desired[i] - n[i]
+            if (d >= 1 and n[i + 1] - n[i] > 1) or (d <= -1 and n[i - 1] - n[i] < -1):
+                d = 1 if d > 0 else -1
+                height = q[i] + d / (n[i + 1] - n[i - 1]) * (
+                    (n[i] - n[i - 1] + d) * (q[i + 1] - q[i]) / (n[i + 1] - n[i])
+                    + (n[i + 1] - n[i] - d) * (q[i] - q[i - 1]) / (n[i] - n[i - 1]))
+                if not q[i - 1] < height < q[i + 1]:
+                    height = q[i] + d * (q[i + d] - q[i]) / (n[i + d] - n[i])
+                q[i] = height
+                n[i] += d
+
+    @property
+    def value(self):
+        if self.q is not None:
+            return self.q[2]
+        if not self._initial:
+            return math.nan
+        return float(np.quantile(self._initial, self.p))
+
+
+class MetricSummary:
+    """
+    Running statistics plus streaming quantiles of one per-cycle metric
+
+    Non-finite values (metric not found, open circuit) are skipped.
+
+    Args:
+        quantiles (sequence): Quantiles tracked, e.g. (0.05, 0.5, 0.95)
+    """
+
+    def __init__(self, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        self.stats = RunningStats()
+        self.quantiles = {p: P2Quantile(p) for p in quantiles}
+
+    def add(self, value):
+        self.stats.add(value)
+        for sketch in self.quantiles.values():
+            sketch.add(value)
+
+    def to_dict(self):
+        s = self.stats
+        return {"count": s.count, "mean": s.mean if s.count else math.nan, "std": s.std,
+                "min": s.min if s.count else math.nan, "max": s.max if s.count else math.nan,
+                "quantiles": {f"{p:g}": sketch.value for p, sketch in self.quantiles.items()}}
+
+
+def cycle_metrics(voltages, currents, read_voltage=0.1, min_jump=0.05):
+    """
+    HRS, LRS and switching voltages of one bipolar I-V cycle
+
+    HRS and LRS are the highest and lowest V/I of the positive points closest to
+    read_voltage (one on each branch of the loop). The SET voltage is where the
+    conductance I/V rises most between two points of increasing positive voltage, the
+    RESET voltage where it falls most between two points of increasing negative
+    voltage; steps smaller than min_jump decades count as no switching (nan).
+
+    Returns:
+        dict: hrs, lrs (ohms), v_set, v_reset (volts)
+    """
+    v = np.asarray(voltages, dtype=float)
+    i = np.asarray(currents, dtype=float)
+    metrics = {"hrs": math.nan, "lrs": math.nan, "v_set": math.nan, "v_reset": math.nan}
+    positive = np.flatnonzero((v > 0) & (i != 0))
+    if len(positive):
+        distance = np.abs(v[positive] - read_voltage)
+        nearest = positive[distance <= distance.min() + 1e-9]
+        resistance = v[nearest] / np.abs(i[nearest])
+        metrics["hrs"], metrics["lrs"] = float(resistance.max()), float(resistance.min())
+    if len(v) > 1:
+        # Points at 0 V carry no conductance information and are left out of the steps
+        with np.errstate(divide='ignore', invalid='ignore'):
+            log_g = np.log10(np.abs(i / v) + 1e-30)
+        step, dv = np.diff(log_g), np.diff(v)
+        valid = (v[:-1] * v[1:]) > 0
+        rising = np.where(valid & (v[1:] > 0) & (dv > 0), step, -np.inf)
+        falling = np.where(valid & (v[1:] < 0) & (dv < 0), step, np.inf)
+        k = int(np.argmax(rising))
+        if rising[k] >= min_jump:
+            metrics["v_set"] = float(v[k + 1])
+        k = int(np.argmin(falling))
+        if falling[k] <= -min_jump:
+            metrics["v_reset"] = float(v[k + 1])
+    return metrics
+
+
+class CampaignStatistics:
+    """
+    Online statistics of per-cycle metrics over a whole campaign
+
+    Every cycle updates the running mean/variance and quantile sketches of HRS,
+    LRS, on/off ratio and SET/RESET voltages, plus the yield counter, in O(1) time;
+    memory does not grow with the number of cycles. A cycle passes when both
+    switching voltages were found and HRS/LRS reaches min_ratio. Safe to feed from
+    an acquisition thread while the GUI reads snapshots.
+
+    Args:
+        read_voltage (float): Read voltage for HRS/LRS of raw cycles (add_cycle)
+        min_ratio (float): Minimum HRS/LRS ratio of a passing cycle
+        quantiles (sequence): Quantiles tracked per metric
+    """
+
+    METRICS = ("hrs", "lrs", "ratio", "v_set", "v_reset")
+    UNITS = {"hrs": "ohm", "lrs": "ohm", "ratio": "", "v_set": "V", "v_reset": "V"}
+
+    def __init__(self, read_voltage=0.1, min_ratio=10.0, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95)):
+        self.read_voltage = read_voltage
+        self.min_ratio = min_ratio
+        self.metrics = {name: MetricSummary(quantiles) for name in self.METRICS}
+        self.cycles = 0
+        self.passed = 0
+        self.lock = threading.Lock()
+
+    def add_metrics(self, hrs, lrs, v_set=math.nan, v_reset=math.nan):
+        """Add the metrics of one cycle"""
+        ratio = hrs / lrs if lrs and not math.isnan(lrs) and not math.isnan(hrs) else math.nan
+        with self.lock:
+            for name, value in (("hrs", hrs), ("lrs", lrs), ("ratio", ratio), ("v_set", v_set),
+                                ("v_reset", v_reset)):
+                self.metrics[name].add(value)
+            self.cycles += 1
+            if ratio >= self.min_ratio and not math.isnan(v_set) and not math.isnan(v_reset):
+                self.passed += 1
+
+    def add_cycle(self, voltages, currents):
+        """Add one raw I-V cycle (e.g. from a PipelinedAcquisition on_chunk)"""
+        m = cycle_metrics(voltages, currents, self.read_voltage)
+        self.add_metrics(m["hrs"], m["lrs"], m["v_set"], m["v_reset"])
+
+    def add_cycles(self, voltages, currents, cycles):
+        """Add every cycle of a waveform run (Measurement arrays with cycle index)"""
+        bounds = np.flatnonzero(np.diff(cycles)) + 1
+        for v, i in zip(np.split(voltages, bounds), np.split(currents, bounds)):
+            self.add_cycle(v, i)
+
+    def add_summary(self, summary, read_voltages, hrs="hrs", lrs="lrs", v_set="set", v_reset="reset"):
+        """
+        Add a reduction.CycleSummary
+
+        Args:
+            read_voltages (dict): Voltage per read point name (ReducedCycling.read_voltages)
+            hrs, lrs (str): Names of the HRS / LRS read points
+            v_set, v_reset (str): Names of the SET / RESET threshold detectors
+        """
+        resistance = lambda name: (summary.resistance(name, read_voltages[name])
+                                   if name in summary.reads else math.nan)
+        self.add_metrics(resistance(hrs), resistance(lrs), summary.thresholds.get(v_set, math.nan),
+                         summary.thresholds.get(v_reset, math.nan))
+
+    @property
+    def yield_fraction(self):
+        return self.passed / self.cycles if self.cycles else math.nan
+
+    def snapshot(self):
+        """
+        Current statistics as a plain dict (JSON-serializable apart from nan)
+
+        Returns:
+            dict: cycles, passed, yield and one entry per metric with count, mean,
+                std, min, max and quantiles
+        """
+        with self.lock:
+            result = {"cycles": self.cycles, "passed": self.passed, "yield": self.yield_fraction}
+            result.update({name: summary.to_dict() for name, summary in self.metrics.items()})
+        return result
+
+    def format(self):
+        """Multi-line text summary for display"""
+        s = self.snapshot()
+        lines = [f"Cycles: {s['cycles']}   Yield: {s['yield'] * 100:.1f}% ({s['passed']} passed)"
+                 if s["cycles"] else "Cycles: 0"]
+        for name in self.METRICS:
+            m = s[name]
+            q = m["quantiles"]
+            lines.append(f"{name.upper():8} mean {m['mean']:.4g} {self.UNITS[name]}  std {m['std']:.3g}  "
+                         f"median {q.get('0.5', math.nan):.4g}  "
+                         f"[{q.get('0.05', math.nan):.4g}, {q.get('0.95', math.nan):.4g}]  n={m['count']}")
+        return "\n".join(lines)
+
+    def summary(self):
+        """
+        Flat summary for file metadata: cycles, yield and the mean, std and median of every metric
+
+        Returns:
+            dict: Entry name (with unit) -> value
+        """
+        s = self.snapshot()
+        result = {"Cycles": s["cycles"], "Yield (%)": s["yield"] * 100}
+        for name in self.METRICS:
+            m = s[name]
+            unit = f" ({self.UNITS[name]})" if self.UNITS[name] else ""
+            result.update({f"{name.upper()} mean{unit}": m["mean"], f"{name.upper()} std{unit}": m["std"],
+                           f"{name.upper()} median{unit}": m["quantiles"].get("0.5", math.nan)})
+        return result
@@ -0,0 +1,322 @@
+"""
+Export of measurements to partitioned Parquet datasets for columnar analytics.
+
+An export root holds two tables, both partitioned Hive-style by run date, wafer and
+device (root/<table>/date=2024-05-01/wafer=W3/device=D12/...):
+
+    points      one row per measured point: run, kind, cycle, segment, voltage,
+                current, timestamp, flags
+    metadata    one row per run metadata entry: run, key, value (plus the start and
+                end time and the point and cycle counts of the run)
+
+Text columns (run, kind, key, value) are dictionary encoded, so the repeated run IDs
+and metadata cost a few bytes per row group, and the files are compressed (zstd by
+default). Query engines read only the partitions and columns they need, e.g.
+
+    import pyarrow.dataset as ds
+    points = ds.dataset("export/points", partitioning="hive")
+    table = points.to_table(filter=ds.field("device") == "D12", columns=["cycle", "current"])
+    frame = table.to_pandas()
+
+ParquetExporter appends incrementally: write_cycle() matches the on_chunk callback of
+PipelinedAcquisition and DatasetWriter, write() the one of ResumableSweep, points are
+written in row groups as they arrive, and long runs are split into several files. A file in progress is hidden (its name starts with a
+dot, which readers skip) and becomes visible when it is complete.
+"""
+
+import argparse
+import datetime
+import itertools
+import os
+import time
+import uuid
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from logs import get_logger
+from utils import read_csv_header
+
+log = get_logger("parquet_export")
+
+TEXT = pa.dictionary(pa.int32(), pa.string())
+
+POINTS_SCHEMA = pa.schema([
+    ("run", TEXT),
+    ("kind", TEXT),
+    ("cycle", pa.int64()),
+    ("segment", pa.int32()),
+    ("voltage", pa.float64()),
+    ("current", pa.float64()),
+    ("timestamp", pa.float64()),
+    ("flags", pa.uint8()),
+])
+
+METADATA_SCHEMA = pa.schema([("run", TEXT), ("key", TEXT), ("value", TEXT)])
+
+
+def partition_value(value):
+    """Path-safe partition value ("unknown" when empty)"""
+    value = "".join(c if c.isalnum() or c in "-_." else "_" for c in str(value))
+    return value or "unknown"
+
+
+def _text(values, n):
+    """Dictionary-encoded text column from a list of n strings or one string repeated n times"""
+    if isinstance(values, str):
+        return pa.DictionaryArray.from_arrays(pa.array(np.zeros(n, dtype=np.int32)), pa.array([values], pa.string()))
+    return pa.array(values, pa.string()).dictionary_encode()
+
+
+class ParquetExporter:
+    """
+    Incremental writer of one run into a partitioned export
+
+    Args:
+        root (str): Export root directory (created if needed)
+        device (str): Device label (partition)
+        wafer (str): Wafer label (partition)
+        metadata (dict, optional): Run metadata written to the metadata table
+        kind (str): Measurement kind stored with every point (e.g. "sweep", "bipolar")
+        run_id (str, optional): Run identifier; a new one is generated if omitted
+        date (datetime.date, optional): Date partition; default is today
+        compression (str): Parquet compression codec ("zstd", "snappy", "gzip", "none", ...)
+        row_group_rows (int): Points buffered before a row group is written
+        file_rows (int): Points per file; a full file is closed and a new one started
+    """
+
+    def __init__(self, root, device="", wafer="", metadata=None, kind="", run_id=None, date=None,
+                 compression="zstd", row_group_rows=100000, file_rows=5000000):
+        if row_group_rows < 1 or file_rows < 1:
+            raise ValueError("Row group and file sizes must be at least 1.")
+        self.root = root
+        self.run_id = run_id or uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.metadata = dict(metadata or {})
+        self.compression = compression
+        self.row_group_rows = row_group_rows
+        self.file_rows = file_rows
+        self.started = time.time()
+        date = date or datetime.date.today()
+        self.partition = os.path.join(f"date={date.isoformat()}", f"wafer={partition_value(wafer)}",
+                                      f"device={partition_value(device)}")
+        self.points = 0
+        self.cycles = 0
+        self._cycle = None
+        self.files = []
+        self._batches = []
+        self._buffered = 0
+        self._writer = None
+        self._file_points = 0
+        self._closed = False
+
+    def _directory(self, table):
+        path = os.path.join(self.root, table, self.partition)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def write_cycle(self, cycle, voltages, currents, timestamps=None, flags=None, segments=None):
+        """
+        Append the points of one cycle
+
+        Args:
+            cycle (int): Cycle number
+            voltages, currents (array-like): Points of the cycle
+            timestamps, flags, segments (array-like or scalar, optional): Further columns
+        """
+        n = len(voltages)
+        column = lambda value, default, dtype: np.broadcast_to(
+            np.asarray(default if value is None else value, dtype=dtype), (n,))
+        batch = pa.RecordBatch.from_arrays([
+            _text(self.run_id, n),
+            _text(self.kind, n),
+            pa.array(column(cycle, 0, np.int64)),
+            pa.array(column(segments, 0, np.int32)),
+            pa.array(column(voltages, np.nan, np.float64)),
+            pa.array(column(currents, np.nan, np.float64)),
+            pa.array(column(timestamps, np.nan, np.float64)),
+            pa.array(column(flags, 0, np.uint8)),
+        ], schema=POINTS_SCHEMA)
+        self._batches.append(batch)
+        self._buffered += n
+        self.points += n
+        if cycle != self._cycle:
+            # A cycle may arrive in several pieces (chunked exports)
+            self.cycles += 1
+            self._cycle = cycle
+        if self._buffered >= self.row_group_rows:
+            self.flush()
+
+    def write(self, voltages, currents, cycles=None, timestamps=None, flags=None, segments=None):
+        """Append points of several cycles (e.g. a Measurement); cycles holds the cycle of every point"""
+        if cycles is None or len(cycles) == 0:
+            self.write_cycle(0, voltages, currents, timestamps, flags, segments)
+            return
+        cycles = np.asarray(cycles)
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(cycles)) + 1, [len(cycles)]))
+        column = lambda value, s: value[s] if np.ndim(value) else value
+        for start, stop in zip(bounds[:-1], bounds[1:]):
+            s = slice(start, stop)
+            self.write_cycle(int(cycles[start]), voltages[s], currents[s], column(timestamps, s),
+                             column(flags, s), column(segments, s))
+
+    def flush(self):
+        """Write the buffered points as a row group"""
+        if not self._batches:
+            return
+        table = pa.Table.from_batches(self._batches, POINTS_SCHEMA)
+        self._batches = []
+        self._buffered = 0
+        offset = 0
+        while offset < len(table):
+            if self._writer is None:
+                self._open_file()
+            part = table.slice(offset, self.file_rows - self._file_points)
+            self._writer.write_table(part, row_group_size=self.row_group_rows)
+            self._file_points += len(part)
+            offset += len(part)
+            if self._file_points >= self.file_rows:
+                self._close_file()
+
+    def _open_file(self):
+        name = f"{self.run_id}-{len(self.files):04d}.parquet"
+        self._path = os.path.join(self._directory("points"), name)
+        self._hidden = os.path.join(os.path.dirname(self._path), "." + name)
+        self._writer = pq.ParquetWriter(self._hidden, POINTS_SCHEMA, compression=self.compression)
+        self._file_points = 0
+
+    def _close_file(self):
+        self._writer.close()
+        os.replace(self._hidden, self._path)
+        self.files.append(self._path)
+        self._writer = None
+
+    def _write_metadata(self):
+        entries = {"started": datetime.datetime.fromtimestamp(self.started).isoformat(),
+                   "finished": datetime.datetime.now().isoformat(),
+                   "points": self.points, "cycles": self.cycles, "kind": self.kind}
+        entries.update(self.metadata)
+        n = len(entries)
+        table = pa.Table.from_arrays([_text(self.run_id, n), _text([str(k) for k in entries], n),
+                                      _text([str(v) for v in entries.values()], n)], schema=METADATA_SCHEMA)
+        path = os.path.join(self._directory("metadata"), f"{self.run_id}.parquet")
+        hidden = os.path.join(os.path.dirname(path), f".{self.run_id}.parquet")
+        pq.write_table(table, hidden, compression=self.compression)
+        os.replace(hidden, path)
+
+    def close(self):
+        """Write the remaining points and the run metadata"""
+        if self._closed:
+            return
+        self.flush()
+        if self._writer is not None:
+            self._close_file()
+        self._write_metadata()
+        self._closed = True
+        log.info("Exported run %s: %d points in %d file(s) to %s", self.run_id, self.points, len(self.files),
+                 os.path.join(self.root, "points", self.partition))
+
+    def discard(self):
+        """Remove the files written so far (e.g. for a failed run); nothing becomes visible"""
+        if self._closed:
+            return
+        self._batches = []
+        if self._writer is not None:
+            self._writer.close()
+            os.remove(self._hidden)
+            self._writer = None
+        for path in self.files:
+            os.remove(path)
+        self.files = []
+        self._closed = True
+        log.info("Discarded export of run %s", self.run_id)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def export_csv(filename, root, device=None, wafer="", chunk=1000000, **settings):
+    """
+    Export a measurement CSV file without loading it whole
+
+    Files with a Cycle column keep their cycles; other files become one cycle. The
+    header metadata becomes the run metadata; its Device entry is the default device
+    label and its Date entry the default date partition.
+
+    Args:
+        filename (str): CSV file written by save_data_to_csv or a retention run
+        root (str): Export root directory
+        device (str, optional): Device label; default is the Device entry of the header
+        wafer (str): Wafer label
+        chunk (int): Rows read at a time
+        **settings: Further ParquetExporter arguments (kind, run_id, date, compression, ...)
+
+    Returns:
+        ParquetExporter: The closed exporter (run_id, points, files)
+    """
+    with open(filename, newline='') as file:
+        names, header = read_csv_header(file)
+        header["Source file"] = os.path.basename(filename)
+        column = {name: k for k, name in enumerate(names)}
+        get = lambda rows, name: rows[:, column[name]] if name in column else None
+        device = header.get("Device", "") if device is None else device
+        if "date" not in settings and "Date" in header:
+            settings["date"] = datetime.datetime.strptime(header["Date"], "%Y-%m-%d %H:%M:%S").date()
+        with ParquetExporter(root, device, wafer, header, **settings) as exporter:
+            while True:
+                lines = list(itertools.islice(file, chunk))
+                if not lines:
+                    break
+                rows = np.loadtxt(lines, delimiter=',', ndmin=2)
+                # Cycles may continue across chunks; write() only splits on changes within a chunk
+                exporter.write(get(rows, "Voltage (V)"), get(rows, "Current (A)"), get(rows, "Cycle"),
+                               get(rows, "Time (s)"), segments=get(rows, "Segment"))
+    return exporter
+
+
+def export_dataset(dataset, root, device=None, wafer="", points=1000000, **settings):
+    """
+    Export a memory-mapped Dataset (dataset.py) block by block
+
+    Args:
+        dataset (Dataset): Dataset to export
+        root (str): Export root directory
+        device (str, optional): Device label; default is the "device" entry of its metadata
+        wafer (str): Wafer label
+        points (int): Points read at a time
+        **settings: Further ParquetExporter arguments
+
+    Returns:
+        ParquetExporter: The closed exporter
+    """
+    device = dataset.metadata.get("device", "") if device is None else device
+    with ParquetExporter(root, device, wafer, dataset.metadata, **settings) as exporter:
+        for first, voltages, currents, timestamps in dataset.iter_blocks(points):
+            start = int(dataset.offsets[first])
+            s = slice(start, start + len(voltages))
+            end = int(np.searchsorted(dataset.offsets, s.stop))
+            cycles = np.repeat(dataset.cycle_numbers[first:end], np.diff(dataset.offsets[first:end + 1]))
+            exporter.write(voltages, currents, cycles, timestamps, dataset.flags[s], dataset.segments[s])
+    return exporter
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export measurement CSV files to a partitioned Parquet dataset")
+    parser.add_argument("files", nargs="+", help="Measurement CSV files")
+    parser.add_argument("--root", required=True, help="Export root directory")
+    parser.add_argument("--wafer", default="", help="Wafer label")
+    parser.add_argument("--device", help="Device label (default: the Device entry of each file)")
+    parser.add_argument("--kind", default="", help="Measurement kind stored with the points")
+    parser.add_argument("--compression", default="zstd", help="Parquet compression codec")
+    args = parser.parse_args()
+
+    for filename in args.files:
+        exporter = export_csv(filename, args.root, args.device, args.wafer, kind=args.kind,
+                              compression=args.compression)
+        print(f"{filename}: {exporter.points} points -> run {exporter.run_id}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+import queue
+import threading
+import time
+import numpy as np
+from buffers import AcquisitionBuffer
+from logs import get_logger
+
+log = get_logger("pipeline")
+
+
+class PipelinedAcquisition:
+    """
+    Double-buffered, overlapped sweep acquisition for continuous cycling
+
+    The sweep is loaded into the instrument's trigger model once and run repeatedly,
+    alternating between smua.nvbuffer1 and smua.nvbuffer2. As soon as sweep N has
+    finished, sweep N+1 is started into the other buffer and a background reader
+    thread transfers and decodes sweep N while the instrument is already measuring.
+    Bus transfer and instrument-side measurement therefore overlap. Current and voltage
+    are measured together, so the delivered voltages are the measured ones.
+
+    Without buffered acquisition (simulation mode) the cycles are measured point by
+    point on the host.
+
+    Args:
+        instrument (Instrument): Connected and configured instrument
+        voltage_points (array-like): Source voltages of one cycle
+        cycles (int, optional): Number of cycles; None runs until stop()
+        on_chunk (callable, optional): Called from the reader thread as
+            on_chunk(cycle, voltages, currents, timestamps) for every cycle
+        capacity (int): Points kept in memory when running until stopped (ring buffer)
+        stream (StreamServer, optional): Server receiving every cycle as a chunk
+        statistics (CampaignStatistics, optional): Updated with the metrics of every cycle;
+            its snapshot is also published to the stream
+    """
+
+    BUFFERS = ("smua.nvbuffer1", "smua.nvbuffer2")
+
+    def __init__(self, instrument, voltage_points, cycles=None, on_chunk=None, capacity=1000000, stream=None,
+                 statistics=None):
+        self.instrument = instrument
+        self.stream = stream
+        self.statistics = statistics
+        self.voltage_points = np.asarray(voltage_points, dtype=float)
+        if len(self.voltage_points) == 0:
+            raise ValueError("Sweep must contain at least one voltage point.")
+        if cycles is not None and cycles < 1:
+            raise ValueError("Number of cycles must be at least 1.")
+        self.cycles = cycles
+        self.on_chunk = on_chunk
+        points = len(self.voltage_points)
+        if cycles is None:
+            self.buffer = AcquisitionBuffer(capacity, ring=True)
+        else:
+            self.buffer = AcquisitionBuffer(points * cycles)
+        self.cycles_completed = 0
+        self.running = False
+        self._stop = threading.Event()
+        self._error = None
+
+    def stop(self):
+        """Request the acquisition to stop after the cycle in progress"""
+        self._stop.set()
+
+    def _more_cycles(self, cycle):
+        return not self._stop.is_set() and (self.cycles is None or cycle < self.cycles)
+
+    def _deliver(self, cycle, voltages, currents, timestamps):
+        self.buffer.extend(voltages, currents, timestamps)
+        self.cycles_completed = cycle + 1
+        if self.statistics is not None:
+            self.statistics.add_cycle(voltages, currents)
+        if self.stream is not None:
+            self.stream.publish_chunk("cycling", voltages, currents, timestamps, cycle=cycle)
+            if self.statistics is not None:
+                self.stream.publish("statistics", source="cycling", **self.statistics.snapshot())
+        if self.on_chunk:
+            self.on_chunk(cycle, voltages, currents, timestamps)
+
+    def run(self):
+        """
+        Execute the acquisition (blocking)
+
+        Returns:
+            AcquisitionBuffer: All acquired points (most recent points when unbounded)
+        """
+        self._stop.clear()
+        self.running = True
+        if self.stream is not None:
+            self.stream.publish_status("running", source="cycling", points=len(self.voltage_points),
+                                       cycles=self.cycles)
+        try:
+            self.instrument.ramp_voltage(self.voltage_points[0])
+            if self.instrument.supports_buffered_acquisition:
+                self._run_pipelined()
+            else:
+                self._run_host()
+            self.instrument.ramp_voltage(0)
+            if self.stream is not None:
+                self.stream.publish_status("done", source="cycling", cycles=self.cycles_completed)
+            return self.buffer
+        except Exception as e:
+            if self.stream is not None:
+                self.stream.publish_status("error", source="cycling", error=str(e))
+            log.error("Error during pipelined acquisition, shutting down safely")
+            self.instrument.safe_shutdown()
+            raise e
+        finally:
+            self.running = False
+
+    def _run_host(self):
+        cycle = 0
+        start = time.perf_counter()
+        while self._more_cycles(cycle):
+            voltages = np.empty(len(self.voltage_points))
+            currents = np.empty(len(self.voltage_points))
+            timestamps = np.empty(len(self.voltage_points))
+            for k, voltage in enumerate(self.voltage_points):
+                self.instrument.set_voltage(voltage)
+                currents[k], voltages[k] = self.instrument.measure_iv()
+                timestamps[k] = time.perf_counter() - start
+            self._deliver(cycle, voltages, currents, timestamps)
+            cycle += 1
+
+    def _reader(self, chunks, free):
+        """Transfer and decode finished buffers while the instrument measures the next one"""
+        points = len(self.voltage_points)
+        while True:
+            item = chunks.get()
+            if item is None:
+                return
+            cycle, index = item
+            try:
+                timestamps, voltages, currents = self.instrument.read_buffer_iv(1, points, self.BUFFERS[index])
+                free[index].set()
+                self._deliver(cycle, voltages, currents, timestamps)
+            except Exception as e:
+                self._error = e
+                self._stop.set()
+                free[index].set()
+
+    def _run_pipelined(self):
+        points = len(self.voltage_points)
+        # Completion polling interval; adapted to the measured sweep time so that polling
+        # does not flood the bus
+        poll = 0.001
+        free = [threading.Event(), threading.Event()]
+        chunks = queue.Queue()
+        reader = threading.Thread(target=self._reader, args=(chunks, free), daemon=True)
+
+        self.instrument.configure_list_sweep(self.voltage_points)
+        reader.start()
+        try:
+            cycle = 0
+            self.instrument.start_list_sweep(self.BUFFERS[0])
+            sweep_start = time.perf_counter()
+            free[1].set()
+            while True:
+                index = cycle % 2
+                # Wait for the running sweep to finish
+                while self.instrument.buffered_count(self.BUFFERS[index], iv=True) < points:
+                    if self._stop.is_set():
+                        return
+                    time.sleep(poll)
+                now = time.perf_counter()
+                poll = min(max((now - sweep_start) / 20, 0.001), 0.1)
+                sweep_start = now
+
+                # Start the next sweep into the other buffer before reading this one
+                if self._more_cycles(cycle + 1):
+                    free[1 - index].wait()
+                    if self._error is None:
+                        free[1 - index].clear()
+                        self.instrument.start_list_sweep(self.BUFFERS[1 - index])
+                chunks.put((cycle, index))
+                cycle += 1
+                if not self._more_cycles(cycle):
+                    return
+        finally:
+            chunks.put(None)
+            reader.join()
+            self.instrument.finish_buffered_acquisition()
+            if self._error is not None:
+                raise self._error
@@ -0,0 +1,192 @@
+"""
+Performance counters and opt-in profiling for the GUI and measurement code.
+
+PerformanceMonitor collects cheap live counters (points per second, plot frame time,
+bus time per point, Tk main-loop latency and any registered queue depths); recording
+a value is one deque append, so the counters stay on all the time. Profiler runs
+measurement functions under cProfile when enabled and accumulates the statistics,
+which can be shown as text or exported (.prof, readable with pstats or snakeviz).
+TkLoopMonitor measures how long the Tk event loop is blocked by other callbacks.
+"""
+
+import collections
+import contextlib
+import cProfile
+import io
+import pstats
+import threading
+import time
+
+
+class PerformanceMonitor:
+    """
+    Live performance counters over a sliding window
+
+    Args:
+        window (float): Time span of the points-per-second rate in seconds
+        samples (int): Recent durations kept per timing (frame, bus, loop)
+    """
+
+    TIMINGS = ("frame", "bus", "loop")
+
+    def __init__(self, window=2.0, samples=200):
+        self.window = window
+        self.lock = threading.Lock()
+        self._points = collections.deque()
+        self.total_points = 0
+        self._timings = {name: collections.deque(maxlen=samples) for name in self.TIMINGS}
+        self.gauges = {}
+
+    def add_points(self, count=1):
+        now = time.perf_counter()
+        with self.lock:
+            self._points.append((now, count))
+            self.total_points += count
+            while self._points and now - self._points[0][0] > self.window:
+                self._points.popleft()
+
+    def record(self, timing, seconds):
+        """Record one duration of "frame", "bus" or "loop" in seconds"""
+        self._timings[timing].append(seconds)
+
+    @contextlib.contextmanager
+    def timed(self, timing):
+        """Context manager recording the duration of its block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(timing, time.perf_counter() - start)
+
+    def add_gauge(self, name, value):
+        """Register a callable returning a current value, e.g. a queue depth"""
+        self.gauges[name] = value
+
+    def points_per_second(self):
+        now = time.perf_counter()
+        with self.lock:
+            recent = [(t, n) for t, n in self._points if now - t <= self.window]
+        if not recent:
+            return 0.0
+        return sum(n for _, n in recent) / self.window
+
+    def snapshot(self):
+        """
+        Current counters
+
+        Returns:
+            dict: points_per_second, total_points, <timing>_mean/<timing>_max in
+                seconds for frame, bus and loop, and one entry per gauge
+        """
+        result = {"points_per_second": self.points_per_second(), "total_points": self.total_points}
+        for name, samples in self._timings.items():
+            values = list(samples)
+            result[f"{name}_mean"] = sum(values) / len(values) if values else None
+            result[f"{name}_max"] = max(values) if values else None
+        for name, value in self.gauges.items():
+            try:
+                result[name] = value()
+            except Exception as e:
+                result[name] = f"error: {e}"
+        return result
+
+    def format(self):
+        """Multi-line text summary for display"""
+        s = self.snapshot()
+        ms = lambda value: "-" if value is None else f"{value * 1e3:.2f} ms"
+        lines = [f"Points/s:           {s['points_per_second']:.1f}  (total {s['total_points']})",
+                 f"Bus time/point:     {ms(s['bus_mean'])}  (max {ms(s['bus_max'])})",
+                 f"Plot frame time:    {ms(s['frame_mean'])}  (max {ms(s['frame_max'])})",
+                 f"Main loop latency:  {ms(s['loop_mean'])}  (max {ms(s['loop_max'])})"]
+        lines += [f"{name + ':':20}{s[name]}" for name in self.gauges]
+        return "\n".join(lines)
+
+
+class Profiler:
+    """
+    Opt-in cProfile of measurement runs, accumulated across runs
+
+    call() runs the function directly while profiling is disabled, so it can wrap
+    every measurement thread unconditionally.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stats = None
+        self.runs = 0
+        self.lock = threading.Lock()
+
+    def call(self, function, *args, **kwargs):
+        if not self.enabled:
+            return function(*args, **kwargs)
+        profile = cProfile.Profile()
+        try:
+            return profile.runcall(function, *args, **kwargs)
+        finally:
+            with self.lock:
+                if self.stats is None:
+                    self.stats = pstats.Stats(profile)
+                else:
+                    self.stats.add(profile)
+                self.runs += 1
+
+    def reset(self):
+        with self.lock:
+            self.stats = None
+            self.runs = 0
+
+    def summary(self, limit=30, sort="cumulative"):
+        """Text report of the most expensive functions"""
+        with self.lock:
+            if self.stats is None:
+                return "No profile recorded. Enable profiling and run a measurement."
+            out = io.StringIO()
+            self.stats.stream = out
+            self.stats.sort_stats(sort).print_stats(limit)
+        return f"{self.runs} profiled run(s)\n{out.getvalue()}"
+
+    def export(self, filename):
+        """Write the accumulated statistics in pstats format"""
+        with self.lock:
+            if self.stats is None:
+                raise ValueError("No profile recorded.")
+            self.stats.dump_stats(filename)
+
+
+class TkLoopMonitor:
+    """
+    Tk main-loop latency: a periodic after() callback records how late it runs
+
+    The delay beyond the requested interval is the time the event loop spent in
+    other callbacks (plot updates, update() calls, event handlers) before it could
+    run this one.
+
+    Args:
+        master (tkinter.Misc): Any widget of the application
+        monitor (PerformanceMonitor): Receives the latencies as "loop" timings
+        interval (int): Probe interval in milliseconds
+    """
+
+    def __init__(self, master, monitor, interval=50):
+        self.master = master
+        self.monitor = monitor
+        self.interval = interval
+        self._job = None
+        self._expected = None
+
+    def start(self):
+        if self._job is None:
+            self._schedule()
+
+    def stop(self):
+        if self._job is not None:
+            self.master.after_cancel(self._job)
+            self._job = None
+
+    def _schedule(self):
+        self._expected = time.perf_counter() + self.interval / 1000.0
+        self._job = self.master.after(self.interval, self._tick)
+
+    def _tick(self):
+        self.monitor.record("loop", max(time.perf_counter() - self._expected, 0.0))
+        self._schedule()
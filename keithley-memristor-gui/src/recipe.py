@@ -0,0 +1,213 @@
+import hashlib
+import json
+from collections import OrderedDict
+import numpy as np
+from instrument import Instrument
+
+
+class SweepRecipe:
+    """
+    Complete definition of a sweep: voltage list plus all source/measure settings
+
+    Two recipes with the same parameters have the same key, which is used to cache
+    the compiled TSP program in memory and on the instrument.
+
+    Args:
+        voltage_points (array-like): Source voltages in sweep order
+        nplc (float): Integration time in power line cycles
+        compliance (float or array-like): Current limit in amperes, or one limit per point
+        source_delay (float): Delay after each source step in seconds
+        current_range (float, optional): Fixed current measure range; None for autorange
+        voltage_range (float, optional): Fixed voltage source range; None for autorange
+        cycle_index (array-like, optional): Cycle number of every point (not part of the key)
+        segment_index (array-like, optional): Waveform segment of every point (not part of the key)
+    """
+
+    def __init__(self, voltage_points, nplc=1.0, compliance=0.1, source_delay=0.0,
+                 current_range=None, voltage_range=None, cycle_index=None, segment_index=None):
+        self.voltage_points = np.asarray(voltage_points, dtype=float)
+        if len(self.voltage_points) == 0:
+            raise ValueError("Recipe must contain at least one voltage point.")
+        if nplc <= 0:
+            raise ValueError("NPLC must be positive.")
+        point_compliance = np.broadcast_to(np.asarray(compliance, dtype=float), self.voltage_points.shape)
+        if np.any(point_compliance <= 0):
+            raise ValueError("Current compliance must be positive.")
+        if source_delay < 0:
+            raise ValueError("Delay time cannot be negative.")
+        self.nplc = float(nplc)
+        self.point_compliance = point_compliance
+        # Highest limit of the recipe; equal to the compliance for uniform recipes
+        self.compliance = float(point_compliance.max())
+        self.cycle_index = cycle_index
+        self.segment_index = segment_index
+        self.source_delay = float(source_delay)
+        self.current_range = current_range
+        self.voltage_range = voltage_range
+        self._key = None
+
+    @classmethod
+    def linear(cls, start_voltage, stop_voltage, step_voltage, **settings):
+        """Create a recipe for a start -> stop sweep with the given step"""
+        from measurement import Measurement
+        return cls(Measurement.sweep_points(start_voltage, stop_voltage, step_voltage), **settings)
+
+    def key(self):
+        """Hash of all parameters; identical sweeps share a key"""
+        if self._key is None:
+            parameters = {
+                "points": [float(f"{v:.10g}") for v in self.voltage_points],
+                "nplc": self.nplc,
+                "compliance": self.compliance if self.uniform_compliance
+                else [float(f"{c:.10g}") for c in self.point_compliance],
+                "source_delay": self.source_delay,
+                "current_range": self.current_range,
+                "voltage_range": self.voltage_range,
+            }
+            digest = hashlib.sha1(json.dumps(parameters, sort_keys=True).encode()).hexdigest()
+            self._key = digest[:12]
+        return self._key
+
+    @property
+    def uniform_compliance(self):
+        return bool(np.all(self.point_compliance == self.compliance))
+
+    def compliance_runs(self):
+        """
+        Split the points into consecutive runs sharing one current limit
+
+        Returns:
+            list: (first index, stop index, compliance) per run
+        """
+        limits = self.point_compliance
+        bounds = np.concatenate(([0], np.flatnonzero(np.diff(limits)) + 1, [len(limits)]))
+        return [(int(a), int(b), float(limits[a])) for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def estimated_duration(self, linefreq=50.0):
+        """Rough run time of the sweep on the instrument in seconds"""
+        return len(self.voltage_points) * (self.nplc / linefreq + self.source_delay)
+
+
+class CompiledRecipe:
+    """TSP program for a SweepRecipe, loaded on the instrument as a named script"""
+
+    def __init__(self, recipe):
+        self.recipe = recipe
+        self.key = recipe.key()
+        self.name = f"MemristorRecipe_{self.key}"
+        self.function = f"{self.name}_run"
+        self.voltage_points = recipe.voltage_points
+        self.script = self._compile()
+
+    def _compile(self, values_per_line=200):
+        recipe = self.recipe
+        points = recipe.voltage_points
+        runs = recipe.compliance_runs()
+        # One source list per run of equal compliance; the runs are executed back to back
+        # without returning to the host, so the sweep stays continuous
+        lines = [f"{self.name}_points = {{"]
+        for first, stop, _ in runs:
+            lines.append("{")
+            for k in range(first, stop, values_per_line):
+                lines.append(",".join(f"{v:.10g}" for v in points[k:min(k + values_per_line, stop)]) + ",")
+            lines.append("},")
+        lines.append("}")
+        lines.append(f"{self.name}_limits = {{{','.join(f'{c:.10g}' for _, _, c in runs)}}}")
+        lines.append(f"{self.name}_counts = {{{','.join(str(b - a) for a, b, _ in runs)}}}")
+
+        lines += [
+            # Currents go to buffer; with vbuffer the measured voltages are stored alongside
+            f"function {self.function}(buffer, vbuffer)",
+            "smua.source.func = smua.OUTPUT_DCVOLTS",
+            *Instrument.measure_settings_commands(recipe.nplc, recipe.current_range, recipe.voltage_range),
+            "smua.measure.autozero = smua.AUTOZERO_ONCE",
+            f"smua.source.delay = {recipe.source_delay}",
+            "smua.trigger.source.action = smua.ENABLE",
+            "smua.trigger.measure.action = smua.ENABLE",
+            "smua.trigger.arm.count = 1",
+            "smua.trigger.endsweep.action = smua.SOURCE_HOLD",
+            "buffer.clear() buffer.appendmode = 1 buffer.collecttimestamps = 1 buffer.collectsourcevalues = 1",
+            "if vbuffer == nil then",
+            "smua.trigger.measure.i(buffer)",
+            "else",
+            "vbuffer.clear() vbuffer.appendmode = 1 vbuffer.collecttimestamps = 1 vbuffer.collectsourcevalues = 1",
+            "smua.trigger.measure.iv(buffer, vbuffer)",
+            "end",
+            f"for k = 1, {len(runs)} do",
+            f"smua.source.limiti = {self.name}_limits[k]",
+            f"smua.trigger.source.listv({self.name}_points[k])",
+            f"smua.trigger.count = {self.name}_counts[k]",
+            "smua.source.output = smua.OUTPUT_ON",
+            "smua.trigger.initiate()",
+            "waitcomplete()",
+            "end",
+            "end",
+        ]
+        return "\n".join(lines)
+
+
+class RecipeCache:
+    """
+    LRU cache of compiled recipes, mirrored as named scripts on the instrument
+
+    The first run of a recipe compiles it and uploads the script; repeated runs of
+    the same recipe only call the script's function. When an entry is evicted its
+    script is also removed from the instrument.
+
+    Args:
+        max_entries (int): Maximum number of recipes kept
+    """
+
+    def __init__(self, max_entries=16):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, recipe):
+        return recipe.key() in self._entries
+
+    def get(self, recipe, instrument=None):
+        """
+        Return the compiled recipe, compiling it on a miss
+
+        Args:
+            recipe (SweepRecipe): Recipe to look up
+            instrument (Instrument, optional): Instrument whose scripts are removed on eviction
+        """
+        key = recipe.key()
+        compiled = self._entries.get(key)
+        if compiled is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return compiled
+
+        self.misses += 1
+        compiled = CompiledRecipe(recipe)
+        self._entries[key] = compiled
+        while len(self._entries) > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            if instrument is not None:
+                instrument.delete_script(evicted.name)
+        return compiled
+
+    def prepare(self, instrument, recipe):
+        """
+        Make sure the compiled recipe is loaded on the instrument
+
+        Returns:
+            CompiledRecipe: The compiled recipe
+        """
+        compiled = self.get(recipe, instrument)
+        if instrument.supports_buffered_acquisition and not instrument.script_loaded(compiled.name):
+            instrument.load_script(compiled.name, compiled.script)
+        return compiled
+
+    def clear(self, instrument=None):
+        if instrument is not None:
+            for compiled in self._entries.values():
+                instrument.delete_script(compiled.name)
+        self._entries.clear()
@@ -0,0 +1,306 @@
+import copy
+import numpy as np
+from logs import get_logger
+from measurement import Measurement
+from recipe import RecipeCache
+
+log = get_logger("reduction")
+
+# Readings kept per batch; the 2602 reading buffers hold somewhat more than this
+BUFFER_CAPACITY = 100000
+
+# TSP library computing per-cycle statistics next to the reading buffer. Written for
+# the instrument's Lua 5.0 (no # operator): table lengths are passed explicitly.
+REDUCTION_SCRIPT = "MemristorReduce"
+REDUCTION_LIBRARY = """
+function MemristorReduce_cycles(buffer, ncycles, n, first, reads, nreads, detectors, ndetectors)
+local readings = buffer.readings
+local out = {}
+for c = 1, ncycles do
+local start = 1
+local shift = 0
+if c > 1 then
+start = 1 + n + (c - 2) * (n - first)
+shift = first
+end
+local lo = readings[start]
+local hi = lo
+for k = start + 1, start + n - 1 - shift do
+local i = readings[k]
+if i < lo then lo = i end
+if i > hi then hi = i end
+end
+table.insert(out, string.format("%.6e", lo))
+table.insert(out, string.format("%.6e", hi))
+for r = 1, nreads do
+table.insert(out, string.format("%.6e", readings[start + reads[r] - shift]))
+end
+for d = 0, ndetectors - 1 do
+local from = detectors[4 * d + 1]
+local to = detectors[4 * d + 2]
+local threshold = detectors[4 * d + 3]
+local rising = detectors[4 * d + 4]
+local found = -1
+local armed = 0
+if from < shift then from = shift end
+for w = from, to do
+local i = math.abs(readings[start + w - shift])
+if rising == 1 then
+if i >= threshold then found = w break end
+elseif i > threshold then
+armed = 1
+elseif armed == 1 then
+found = w break
+end
+end
+table.insert(out, found)
+end
+end
+print(table.concat(out, ","))
+end
+function MemristorReduce_decimate(buffer, first, last, factor)
+local readings = buffer.readings
+local out = {}
+local k = first
+while k <= last do
+local stop = k + factor - 1
+if stop > last then stop = last end
+local lo = readings[k]
+local hi = lo
+for j = k + 1, stop do
+local i = readings[j]
+if i < lo then lo = i end
+if i > hi then hi = i end
+end
+table.insert(out, string.format("%.6e", lo))
+table.insert(out, string.format("%.6e", hi))
+k = stop + 1
+end
+print(table.concat(out, ","))
+end
+"""
+
+
+def _lua_table(values):
+    return "{" + ",".join(f"{v:.10g}" if isinstance(v, float) else str(int(v)) for v in values) + "}"
+
+
+class CycleSummary:
+    """
+    Reduced result of one waveform cycle
+
+    Attributes:
+        cycle (int): Cycle number (0-based)
+        minimum, maximum (float): Lowest and highest current of the cycle
+        reads (dict): Read current per named read point
+        thresholds (dict): Switching voltage per named detector (nan if not crossed)
+    """
+
+    def __init__(self, cycle, minimum, maximum, reads, thresholds):
+        self.cycle = cycle
+        self.minimum = minimum
+        self.maximum = maximum
+        self.reads = reads
+        self.thresholds = thresholds
+
+    def resistance(self, name, voltage):
+        """Read resistance of read point `name` measured at `voltage`"""
+        current = self.reads[name]
+        return voltage / current if current else float('inf')
+
+    def __repr__(self):
+        return (f"<CycleSummary {self.cycle}: I = [{self.minimum:.4e}, {self.maximum:.4e}] A, "
+                f"reads = {self.reads}, thresholds = {self.thresholds}>")
+
+
+class ReducedCycling:
+    """
+    Long waveform cycling with the data reduced on the instrument
+
+    The waveform is run in batches of as many cycles as fit in the reading buffer.
+    After each batch a TSP function computes, per cycle, the current extremes, the
+    currents at the named read points and the voltages at which the named threshold
+    detectors fire; only these few numbers per cycle cross the bus. The raw readings
+    of the last batch stay in the instrument buffer and can be fetched on demand,
+    optionally decimated on the instrument (min/max per bin).
+
+    In simulation mode the cycles are measured on the host and reduced the same way.
+
+    Args:
+        instrument (Instrument): Connected and configured instrument
+        waveform (Waveform): Waveform of one cycle; its repetitions give the cycle count
+        reads (dict): Read points, name -> (segment, voltage)
+        thresholds (dict): Detectors, name -> (segment, threshold current, rising); a rising
+            detector fires at the first point with |I| >= threshold, a falling one at the
+            first point with |I| <= threshold after the current exceeded it
+        delay (float): Delay after each source step in seconds
+        capacity (int): Readings per batch
+        cache (RecipeCache, optional): Cache shared between runs
+        statistics (CampaignStatistics, optional): Updated with every cycle summary; uses
+            the read points "hrs"/"lrs" and the detectors "set"/"reset"
+        **settings: Further SweepRecipe settings (nplc, ranges)
+    """
+
+    def __init__(self, instrument, waveform, reads=None, thresholds=None, delay=0.0,
+                 capacity=BUFFER_CAPACITY, cache=None, statistics=None, **settings):
+        self.instrument = instrument
+        self.statistics = statistics
+        self.waveform = waveform
+        self.delay = delay
+        self.settings = settings
+        self.cache = cache if cache is not None else RecipeCache()
+        self.voltages, _, self.segments, self.first = waveform.cycle()
+        n = len(self.voltages)
+        self.reads = {name: waveform.point_index(segment, voltage)
+                      for name, (segment, voltage) in (reads or {}).items()}
+        self.read_voltages = {name: float(self.voltages[index]) for name, index in self.reads.items()}
+        self.detectors = {}
+        for name, (segment, threshold, rising) in (thresholds or {}).items():
+            if threshold <= 0:
+                raise ValueError("Threshold current must be positive.")
+            start, stop = waveform.segment_range(segment)
+            self.detectors[name] = (start, stop, float(threshold), 1 if rising else 0)
+        self.batch_cycles = max((capacity - self.first) // (n - self.first), 1) if n > self.first else 1
+        self.summaries = []
+        self.last_batch = None  # (first cycle, cycle count) of the batch still in the buffer
+        self._raw = None
+        self.bytes_transferred = 0
+
+    def _batch_waveform(self, cycles):
+        batch = copy.copy(self.waveform)
+        batch.repetitions = cycles
+        return batch
+
+    def run(self, on_batch=None):
+        """
+        Execute all cycles (blocking)
+
+        Args:
+            on_batch (callable, optional): Called with the list of new CycleSummary per batch
+
+        Returns:
+            list: One CycleSummary per cycle
+        """
+        if self.instrument.supports_buffered_acquisition and \
+                not self.instrument.script_loaded(REDUCTION_SCRIPT):
+            self.instrument.load_script(REDUCTION_SCRIPT, REDUCTION_LIBRARY)
+        self.summaries = []
+        total = self.waveform.repetitions
+        for first_cycle in range(0, total, self.batch_cycles):
+            cycles = min(self.batch_cycles, total - first_cycle)
+            summaries = self._run_batch(first_cycle, cycles)
+            self.summaries.extend(summaries)
+            if self.statistics is not None:
+                for summary in summaries:
+                    self.statistics.add_summary(summary, self.read_voltages)
+            if on_batch is not None:
+                on_batch(summaries)
+        return self.summaries
+
+    def _run_batch(self, first_cycle, cycles, buffer="smua.nvbuffer1"):
+        recipe = self._batch_waveform(cycles).to_recipe(source_delay=self.delay, **self.settings)
+        if not self.instrument.supports_buffered_acquisition:
+            measurement = Measurement(self.instrument)
+            _, currents = measurement.run_recipe(recipe, self.cache)
+            self._raw = currents
+            self.last_batch = (first_cycle, cycles)
+            return self._summaries(first_cycle, self.reduce(currents, cycles))
+
+        compiled = self.cache.prepare(self.instrument, recipe)
+        limits = recipe.point_compliance
+        try:
+            self.instrument.ramp_voltage(recipe.voltage_points[0])
+            self.instrument.compliance_limit = limits[-1]
+            self.instrument.query_script(f"{compiled.function}({buffer}) waitcomplete() print({buffer}.n)",
+                                         recipe.estimated_duration())
+            response = self.instrument.query_script(
+                f"MemristorReduce_cycles({buffer}, {cycles}, {len(self.voltages)}, {self.first}, "
+                f"{_lua_table(self.reads.values())}, {len(self.reads)}, "
+                f"{_lua_table([v for d in self.detectors.values() for v in d])}, {len(self.detectors)})")
+            self.instrument.ramp_voltage(0)
+        except Exception as e:
+            log.error("Error during cycling, shutting down safely")
+            self.instrument.safe_shutdown()
+            raise e
+        self.bytes_transferred += len(response)
+        self.last_batch = (first_cycle, cycles)
+        values = np.array(response.split(','), dtype=float).reshape(cycles, -1)
+        return self._summaries(first_cycle, values)
+
+    def reduce(self, currents, cycles):
+        """
+        Host-side reduction identical to the instrument one
+
+        Args:
+            currents (numpy.ndarray): Readings of `cycles` consecutive cycles of one batch
+
+        Returns:
+            numpy.ndarray: (cycles, 2 + reads + detectors) array, detector columns as point index or -1
+        """
+        n = len(self.voltages)
+        columns = []
+        for c in range(cycles):
+            shift = self.first if c else 0
+            start = 0 if c == 0 else n + (c - 1) * (n - self.first)
+            cycle = currents[start:start + n - shift]
+            row = [cycle.min(), cycle.max()]
+            row += [currents[start + w - shift] for w in self.reads.values()]
+            for begin, stop, threshold, rising in self.detectors.values():
+                begin = max(begin, shift)
+                magnitude = np.abs(currents[start + begin - shift:start + stop - shift + 1])
+                if rising:
+                    hits = np.flatnonzero(magnitude >= threshold)
+                else:
+                    # Falling: first point back at or below the threshold after exceeding it
+                    above = np.flatnonzero(magnitude > threshold)
+                    hits = above[0] + np.flatnonzero(magnitude[above[0]:] <= threshold) if len(above) else above
+                row.append(begin + hits[0] if len(hits) else -1)
+            columns.append(row)
+        return np.array(columns, dtype=float)
+
+    def _summaries(self, first_cycle, values):
+        names = list(self.reads)
+        detectors = list(self.detectors)
+        summaries = []
+        for c, row in enumerate(values):
+            reads = {name: float(row[2 + k]) for k, name in enumerate(names)}
+            thresholds = {}
+            for k, name in enumerate(detectors):
+                index = int(row[2 + len(names) + k])
+                thresholds[name] = float(self.voltages[index]) if index >= 0 else float('nan')
+            summaries.append(CycleSummary(first_cycle + c, float(row[0]), float(row[1]), reads, thresholds))
+        return summaries
+
+    def raw(self, cycle, decimate=1, buffer="smua.nvbuffer1"):
+        """
+        Fetch the raw readings of one cycle of the last batch
+
+        Args:
+            cycle (int): Cycle number; must belong to the last batch
+            decimate (int): Bin size; > 1 returns the min and max of every bin (decimated
+                on the instrument), interleaved
+
+        Returns:
+            numpy.ndarray: Currents of the cycle (or the decimated min/max pairs)
+        """
+        if self.last_batch is None or not \
+                self.last_batch[0] <= cycle < self.last_batch[0] + self.last_batch[1]:
+            raise ValueError(f"Raw data of cycle {cycle} is no longer in the reading buffer.")
+        n = len(self.voltages)
+        c = cycle - self.last_batch[0]
+        shift = self.first if c else 0
+        start = 0 if c == 0 else n + (c - 1) * (n - self.first)
+        stop = start + n - shift
+        decimate = max(int(decimate), 1)
+        if not self.instrument.supports_buffered_acquisition:
+            currents = self._raw[start:stop]
+            if decimate == 1:
+                return currents
+            bins = [currents[k:k + decimate] for k in range(0, len(currents), decimate)]
+            return np.array([f(b) for b in bins for f in (np.min, np.max)])
+        if decimate == 1:
+            (currents,) = self.instrument.read_buffer_columns(start + 1, stop, (f"{buffer}.readings",))
+            return currents
+        response = self.instrument.query_script(
+            f"MemristorReduce_decimate({buffer}, {start + 1}, {stop}, {decimate})")
+        return np.array(response.split(','), dtype=float)
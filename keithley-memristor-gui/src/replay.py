@@ -0,0 +1,162 @@
+"""
+Replay of recorded measurements through the instrument interface.
+
+A ReplayModel takes the place of the device model of the simulated 2602 (see
+simulator.py) and answers every reading with the next recorded current. Because the
+simulated instrument runs the same TSP commands as the real one, everything built on
+Instrument - point-by-point sweeps, instrument-side sweeps, buffered fetches, the
+pipelined acquisition, streaming, plotting, storage and analysis - runs unchanged on
+real data shapes.
+
+Playback speed follows the recorded timestamps (or the modelled reading time when the
+file has none): speed=1 is real time, speed=10 ten times faster, None as fast as
+possible.
+
+Usage:
+    python scheduler.py job_queue.json run --replay run.csv --replay-speed 10
+"""
+
+import time
+import numpy as np
+from instrument import Instrument
+from logs import get_logger
+from simulator import SimulatedKeithley2602, SimulatedResourceManager
+from utils import load_data_from_csv
+
+log = get_logger("replay")
+
+
+class Recording:
+    """
+    Recorded points to replay
+
+    Args:
+        voltages, currents (array-like): Recorded points in measurement order
+        timestamps (array-like, optional): Time of every point in seconds
+        metadata (dict, optional): Header of the recording
+    """
+
+    def __init__(self, voltages, currents, timestamps=None, metadata=None):
+        self.voltages = np.asarray(voltages, dtype=float)
+        self.currents = np.asarray(currents, dtype=float)
+        if len(self.voltages) != len(self.currents):
+            raise ValueError("Recording needs one voltage per current.")
+        if len(self.currents) == 0:
+            raise ValueError("Recording contains no points.")
+        self.timestamps = None if timestamps is None else np.asarray(timestamps, dtype=float)
+        self.metadata = metadata or {}
+
+    @classmethod
+    def load(cls, filename):
+        """Read a CSV file written by save_data_to_csv or a retention run"""
+        columns, metadata = load_data_from_csv(filename)
+        if "Current (A)" not in columns:
+            raise ValueError(f"{filename} has no 'Current (A)' column")
+        voltages = columns.get("Voltage (V)", np.zeros(len(columns["Current (A)"])))
+        return cls(voltages, columns["Current (A)"], columns.get("Time (s)"), metadata)
+
+    def __len__(self):
+        return len(self.currents)
+
+
+class ReplayModel:
+    """
+    Device model answering every reading with the next recorded current
+
+    Implements current(voltage, dt) like simulator.MemristorModel. The programmed
+    voltage is not used to compute anything; readings whose voltage differs from the
+    recorded one by more than tolerance are counted in `mismatches` so a replay that
+    drifted out of step with the recording can be noticed.
+
+    Args:
+        recording (Recording): Points to replay
+        speed (float, optional): Playback speed relative to the recording; None as fast as possible
+        loop (bool): Start over at the end of the recording (else replay 0 A)
+        tolerance (float): Voltage difference counted as a mismatch in volts
+    """
+
+    def __init__(self, recording, speed=None, loop=True, tolerance=1e-3):
+        if speed is not None and speed <= 0:
+            raise ValueError("Playback speed must be positive.")
+        self.recording = recording
+        self.speed = speed
+        self.loop = loop
+        self.tolerance = tolerance
+        self.index = 0
+        self.replayed = 0
+        self.mismatches = 0
+        self.state = 0.0
+        self._elapsed = 0.0
+        self._start = None
+
+    def resistance(self):
+        k = max(self.index - 1, 0) % len(self.recording)
+        current = self.recording.currents[k]
+        return self.recording.voltages[k] / current if current else float('inf')
+
+    def _pace(self, dt):
+        """Sleep until the wall clock reaches the recorded time of the current point"""
+        if self.speed is None:
+            return
+        if self._start is None:
+            self._start = time.perf_counter()
+        timestamps = self.recording.timestamps
+        if timestamps is not None:
+            # Recorded time since the first point, continued across loops
+            k = self.index
+            self._elapsed = (timestamps[k] - timestamps[0]) + self._loops * (timestamps[-1] - timestamps[0])
+        else:
+            self._elapsed += dt
+        delay = self._start + self._elapsed / self.speed - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+    @property
+    def _loops(self):
+        return self.replayed // len(self.recording)
+
+    def current(self, voltage, dt):
+        if self.index >= len(self.recording):
+            if not self.loop:
+                return 0.0
+            self.index = 0
+        self._pace(dt)
+        k = self.index
+        if abs(voltage - self.recording.voltages[k]) > self.tolerance:
+            self.mismatches += 1
+        self.index += 1
+        self.replayed += 1
+        return float(self.recording.currents[k])
+
+    def rewind(self):
+        self.index = 0
+        self.replayed = 0
+        self.mismatches = 0
+        self._elapsed = 0.0
+        self._start = None
+
+
+def connect_replay(recording, speed=None, loop=True, latency=0.0):
+    """
+    Create a connected Instrument that replays a recording
+
+    Args:
+        recording (Recording or str): Recording or path of a measurement CSV file
+        speed (float, optional): Playback speed; 1 = real time, None = as fast as possible
+        loop (bool): Start over at the end of the recording
+        latency (float): Simulated bus latency per transaction in seconds
+
+    Returns:
+        tuple: (Instrument, ReplayModel)
+    """
+    if not isinstance(recording, Recording):
+        recording = Recording.load(recording)
+    model = ReplayModel(recording, speed, loop)
+    device = SimulatedKeithley2602(model_a=model)
+    instrument = Instrument(resource_manager=SimulatedResourceManager(device, latency=latency))
+    instrument.connect("GPIB0::26::INSTR")
+    # Connecting resets the instrument and may take readings; replay from the first point
+    model.rewind()
+    log.info("Replaying %d recorded points at %s", len(recording),
+             "full speed" if speed is None else f"{speed:g}x")
+    return instrument, model
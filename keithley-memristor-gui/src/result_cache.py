@@ -0,0 +1,189 @@
+"""
+Cross-run cache of measurement results.
+
+Regression flows often repeat the same read or check sweep on devices whose state
+has not changed. Before such a sweep the scheduler takes a short probe read of the
+device; the result of an earlier run is reused when the device, the recipe hash and
+the quantized probe resistance (the state fingerprint) all match and the entry is
+younger than its time to live. The probe costs a few readings instead of the whole
+sweep. Entries are kept in least-recently-used order and the oldest are evicted
+above the size limit; the cache is persisted atomically to a JSON file, so it is
+shared by later runs.
+"""
+
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from logs import get_logger
+
+log = get_logger("result_cache")
+
+
+def probe_state(instrument, voltage=0.1, readings=3):
+    """
+    Read the device resistance at a small, non-switching voltage
+
+    Args:
+        instrument (Instrument): Connected instrument in voltage source mode
+        voltage (float): Probe voltage in volts
+        readings (int): Number of readings; the median is returned
+
+    Returns:
+        float: Resistance in ohms (inf when no current flows)
+    """
+    instrument.ramp_voltage(voltage)
+    try:
+        values = []
+        for _ in range(readings):
+            current, measured = instrument.measure_iv()
+            values.append(abs(measured / current) if current else float('inf'))
+    finally:
+        instrument.ramp_voltage(0)
+    return float(np.median(values))
+
+
+def state_fingerprint(resistance, resolution=0.05):
+    """
+    Quantized device state: log10 of the resistance rounded to `resolution` decades
+
+    Readings that differ by less than the resolution usually share a fingerprint;
+    a reading close to a bin edge may not, which only costs a cache miss.
+    """
+    if not np.isfinite(resistance) or resistance <= 0:
+        return "open"
+    return f"{round(np.log10(resistance) / resolution) * resolution:.3f}"
+
+
+class ResultCache:
+    """
+    Results of earlier runs keyed by device ID, recipe hash and state fingerprint
+
+    Args:
+        path (str, optional): JSON file the cache is loaded from and saved to; None keeps it in memory
+        ttl (float): Default time to live of an entry in seconds
+        max_entries (int): Maximum number of entries kept (least recently used are evicted)
+    """
+
+    def __init__(self, path=None, ttl=3600.0, max_entries=256):
+        if ttl <= 0:
+            raise ValueError("Time to live must be positive.")
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load()
+
+    @staticmethod
+    def key(device, recipe_key, fingerprint):
+        return f"{device}|{recipe_key}|{fingerprint}"
+
+    def __len__(self):
+        return len(self._entries)
+
+    def load(self):
+        with open(self.path) as file:
+            data = json.load(file)
+        with self.lock:
+            # Stored in least- to most-recently-used order
+            self._entries = OrderedDict((self.key(e["device"], e["recipe"], e["fingerprint"]), e)
+                                        for e in data.get("entries", []))
+            self._prune(time.time())
+
+    def _save(self):
+        if self.path is None:
+            return
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as file:
+            json.dump({"entries": list(self._entries.values())}, file, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
+
+    def _prune(self, now):
+        expired = [key for key, entry in self._entries.items() if now >= entry["expires"]]
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return len(expired)
+
+    def lookup(self, device, recipe_key, fingerprint, max_age=None):
+        """
+        Return a valid entry or None
+
+        An entry is valid while it has not expired, is at most max_age seconds old
+        (when given) and its output file still exists.
+
+        Returns:
+            dict: Entry (device, recipe, fingerprint, output, job, created, expires, hits, info)
+        """
+        key = self.key(device, recipe_key, fingerprint)
+        now = time.time()
+        with self.lock:
+            entry = self._entries.get(key)
+            valid = (entry is not None and now < entry["expires"]
+                     and (max_age is None or now - entry["created"] <= max_age)
+                     and (entry["output"] is None or os.path.exists(entry["output"])))
+            if not valid:
+                self.misses += 1
+                if entry is not None and now >= entry["expires"]:
+                    del self._entries[key]
+                    self._save()
+                return None
+            self.hits += 1
+            entry["hits"] += 1
+            entry["used"] = now
+            self._entries.move_to_end(key)
+            self._save()
+            return dict(entry)
+
+    def store(self, device, recipe_key, fingerprint, output, job=None, ttl=None, **info):
+        """
+        Add or replace the result of a run
+
+        Args:
+            device (str): Device ID
+            recipe_key (str): Hash of the recipe (SweepRecipe.key())
+            fingerprint (str): State fingerprint taken before the run
+            output (str): Result file of the run
+            job (str, optional): ID of the job that produced it
+            ttl (float, optional): Time to live in seconds; default is the cache's ttl
+            **info: Further values kept with the entry (e.g. the probe resistance)
+        """
+        now = time.time()
+        entry = {"device": device, "recipe": recipe_key, "fingerprint": fingerprint, "output": output,
+                 "job": job, "created": now, "used": now, "expires": now + (ttl or self.ttl),
+                 "hits": 0, "info": info}
+        key = self.key(device, recipe_key, fingerprint)
+        with self.lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            self._prune(now)
+            self._save()
+        return entry
+
+    def invalidate(self, device=None):
+        """Drop all entries of a device (e.g. after it was switched), or all entries"""
+        with self.lock:
+            for key in [k for k, e in self._entries.items() if device is None or e["device"] == device]:
+                del self._entries[key]
+            self._save()
+
+    def prune(self):
+        """Drop expired entries; returns how many were dropped"""
+        with self.lock:
+            dropped = self._prune(time.time())
+            self._save()
+        return dropped
+
+    def entries(self):
+        """Entries from least to most recently used"""
+        with self.lock:
+            return [dict(entry) for entry in self._entries.values()]
@@ -0,0 +1,280 @@
+import csv
+import threading
+import time
+import numpy as np
+from logs import get_logger
+from utils import write_csv_header
+
+log = get_logger("retention")
+
+
+class _SummaryLevel:
+    """Fixed-capacity ring of (time, min, max, mean, count) bins for one resolution"""
+
+    def __init__(self, samples_per_bin, capacity):
+        self.samples_per_bin = samples_per_bin
+        self.capacity = capacity
+        self.time = np.empty(capacity)
+        self.min = np.empty(capacity)
+        self.max = np.empty(capacity)
+        self.mean = np.empty(capacity)
+        self.count = np.empty(capacity)
+        self.head = 0
+        self.size = 0
+        self.total = 0
+
+    def push(self, t, lo, hi, mean, count):
+        n = len(t)
+        if n > self.capacity:
+            t, lo, hi, mean, count = (a[-self.capacity:] for a in (t, lo, hi, mean, count))
+        k = len(t)
+        index = (self.head + np.arange(k)) % self.capacity
+        self.time[index] = t
+        self.min[index] = lo
+        self.max[index] = hi
+        self.mean[index] = mean
+        self.count[index] = count
+        self.head = (self.head + k) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+        self.total += n
+
+    def ordered(self):
+        index = (self.head - self.size + np.arange(self.size)) % self.capacity
+        return self.time[index], self.min[index], self.max[index], self.mean[index]
+
+
+class MultiResolutionSummary:
+    """
+    Downsampled min/max/mean summaries of a time series at several resolutions
+
+    Level 0 combines `factor` raw samples per bin, level 1 combines `factor` level-0
+    bins and so on. Every level is a fixed-capacity ring, so memory is bounded no
+    matter how long the run is, while the coarse levels still cover the whole run.
+
+    Args:
+        factor (int): Number of samples (or bins) combined into one bin of the next level
+        levels (int): Number of resolution levels
+        capacity (int): Bins kept per level
+    """
+
+    def __init__(self, factor=10, levels=5, capacity=4096):
+        if factor < 2:
+            raise ValueError("Downsampling factor must be at least 2.")
+        self.factor = factor
+        self.levels = [_SummaryLevel(factor ** (k + 1), capacity) for k in range(levels)]
+        # Incomplete bins carried over to the next call, per level: (t, min, max, sum, count)
+        self._pending = [tuple(np.empty(0) for _ in range(5)) for _ in range(levels)]
+        self.samples = 0
+        self.lock = threading.Lock()
+
+    def add(self, times, values):
+        """Add a block of raw samples (vectorized)"""
+        times = np.asarray(times, dtype=float)
+        values = np.asarray(values, dtype=float)
+        with self.lock:
+            self.samples += len(values)
+            ones = np.ones(len(values))
+            self._combine(0, times, values, values, values, ones)
+
+    def _combine(self, level, t, lo, hi, total, count):
+        if level >= len(self.levels) or len(t) == 0:
+            return
+        pending = self._pending[level]
+        t, lo, hi, total, count = (np.concatenate((p, a)) for p, a in zip(pending, (t, lo, hi, total, count)))
+        full = len(t) // self.factor * self.factor
+        self._pending[level] = (t[full:], lo[full:], hi[full:], total[full:], count[full:])
+        if full == 0:
+            return
+
+        shape = (-1, self.factor)
+        bin_count = count[:full].reshape(shape).sum(axis=1)
+        bin_total = total[:full].reshape(shape).sum(axis=1)
+        bin_t = (t[:full] * count[:full]).reshape(shape).sum(axis=1) / bin_count
+        bin_lo = lo[:full].reshape(shape).min(axis=1)
+        bin_hi = hi[:full].reshape(shape).max(axis=1)
+
+        self.levels[level].push(bin_t, bin_lo, bin_hi, bin_total / bin_count, bin_count)
+        self._combine(level + 1, bin_t, bin_lo, bin_hi, bin_total, bin_count)
+
+    def series(self, max_points=2000):
+        """
+        Return the finest summary that covers the whole run in at most max_points bins
+
+        Returns:
+            tuple: numpy arrays (time, min, max, mean)
+        """
+        with self.lock:
+            chosen = self.levels[-1]
+            for level in self.levels:
+                if level.total == level.size and level.size <= max_points:
+                    chosen = level
+                    break
+            return chosen.ordered()
+
+
+class RetentionMeasurement:
+    """
+    Retention / time-series monitoring at a constant bias
+
+    Samples the current at a fixed voltage and sampling interval for a given duration
+    (or until stopped). With a connected instrument the readings are timed by the
+    instrument and fetched in chunks from a reading buffer; in simulation mode the
+    host times the readings. Full-rate data is streamed to a CSV file while a
+    MultiResolutionSummary keeps bounded, downsampled data in memory for display.
+
+    Args:
+        instrument (Instrument): Connected and configured instrument
+        voltage (float): Bias voltage in volts
+        interval (float): Sampling interval in seconds
+        duration (float, optional): Run time in seconds; None runs until stop()
+        filename (str, optional): CSV file receiving the full-rate data
+        chunk_size (int): Readings acquired per instrument buffer fill
+        metadata (dict, optional): Metadata written to the CSV header
+        stream (StreamServer, optional): Server receiving every stored block as a chunk
+        on_chunk (callable, optional): Called as on_chunk(timestamps, currents) for every stored block
+    """
+
+    def __init__(self, instrument, voltage, interval, duration=None, filename=None,
+                 chunk_size=1000, metadata=None, stream=None, on_chunk=None):
+        if interval <= 0:
+            raise ValueError("Sampling interval must be positive.")
+        if duration is not None and duration <= 0:
+            raise ValueError("Duration must be positive.")
+        self.instrument = instrument
+        self.voltage = voltage
+        self.interval = interval
+        self.duration = duration
+        self.filename = filename
+        self.chunk_size = chunk_size
+        self.metadata = metadata
+        self.stream = stream
+        self.on_chunk = on_chunk
+        self.summary = MultiResolutionSummary()
+        self.samples = 0
+        self.running = False
+        self._stop = threading.Event()
+        self._file = None
+        self._writer = None
+
+    def stop(self):
+        """Request the run to stop after the current chunk"""
+        self._stop.set()
+
+    def _open_file(self):
+        if not self.filename:
+            return
+        self._file = open(self.filename, mode='w', newline='')
+        self._writer = csv.writer(self._file)
+        metadata = {"Bias Voltage (V)": self.voltage, "Sample Interval (s)": self.interval}
+        metadata.update(self.metadata or {})
+        write_csv_header(self._writer, ['Time (s)', 'Voltage (V)', 'Current (A)'], metadata)
+
+    def _store(self, times, currents):
+        if len(times) == 0:
+            return
+        if self._writer is not None:
+            self._writer.writerows([f"{t:.6f}", f"{self.voltage:.8e}", f"{c:.8e}"]
+                                   for t, c in zip(times, currents))
+            self._file.flush()
+        self.summary.add(times, currents)
+        self.samples += len(times)
+        if self.stream is not None:
+            self.stream.publish_chunk("retention", np.full(len(times), self.voltage), currents, times)
+        if self.on_chunk is not None:
+            self.on_chunk(times, currents)
+
+    def _target_samples(self):
+        """Total number of samples for the run, or None when running until stopped"""
+        if self.duration is None:
+            return None
+        return int(round(self.duration / self.interval))
+
+    def run(self):
+        """
+        Execute the retention measurement (blocking)
+
+        Returns:
+            MultiResolutionSummary: The downsampled data
+        """
+        self._stop.clear()
+        self.running = True
+        self._open_file()
+        if self.stream is not None:
+            self.stream.publish_status("running", source="retention", voltage=self.voltage,
+                                       interval=self.interval, duration=self.duration)
+        try:
+            self.instrument.ramp_voltage(self.voltage)
+            if self.instrument.supports_buffered_acquisition:
+                self._run_buffered()
+            else:
+                self._run_host_timed()
+            self.instrument.ramp_voltage(0)
+            if self.stream is not None:
+                self.stream.publish_status("done", source="retention", samples=self.samples)
+            return self.summary
+        except Exception as e:
+            if self.stream is not None:
+                self.stream.publish_status("error", source="retention", error=str(e))
+            log.error("Error during retention measurement, shutting down safely")
+            self.instrument.safe_shutdown()
+            raise e
+        finally:
+            self.running = False
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._writer = None
+
+    def _run_host_timed(self):
+        target = self._target_samples()
+        start = time.perf_counter()
+        last_flush = start
+        times, currents = [], []
+        while not self._stop.is_set():
+            taken = self.samples + len(times)
+            if target is not None and taken >= target:
+                break
+            # Wait for the next sample slot (responds to stop() immediately)
+            if self._stop.wait(max(start + taken * self.interval - time.perf_counter(), 0)):
+                break
+            now = time.perf_counter()
+            times.append(now - start)
+            currents.append(self.instrument.measure_current())
+            # Flush to disk and summary about once per second
+            if now - last_flush >= 1.0 or len(times) >= self.chunk_size:
+                self._store(np.array(times), np.array(currents))
+                times, currents = [], []
+                last_flush = now
+        self._store(np.array(times), np.array(currents))
+
+    def _run_buffered(self):
+        target = self._target_samples()
+        start = time.perf_counter()
+        # Poll often enough to keep the display live without flooding the bus
+        poll = min(max(self.interval * self.chunk_size / 10, 0.05), 1.0)
+        try:
+            while not self._stop.is_set():
+                count = self.chunk_size if target is None else min(self.chunk_size, target - self.samples)
+                if count <= 0:
+                    break
+
+                chunk_start = time.perf_counter() - start
+                self.instrument.start_buffered_current(count, self.interval)
+                fetched = 0
+                first_timestamp = None
+                while fetched < count:
+                    if self._stop.wait(poll):
+                        # Stop the acquisition but keep the readings already taken
+                        self.instrument.finish_buffered_acquisition()
+                    available = self.instrument.buffered_count()
+                    if available > fetched:
+                        timestamps, currents = self.instrument.read_buffer(fetched + 1, available)
+                        if first_timestamp is None:
+                            first_timestamp = timestamps[0]
+                        # Instrument time within the chunk, anchored to host time at chunk start
+                        self._store(chunk_start + timestamps - first_timestamp, currents)
+                        fetched = available
+                    if self._stop.is_set():
+                        break
+        finally:
+            self.instrument.finish_buffered_acquisition()
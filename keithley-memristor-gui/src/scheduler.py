@@ -0,0 +1,556 @@
+import argparse
+import json
+import os
+import threading
+import time
+import uuid
+import numpy as np
+from instrument import is_connection_error
+from logs import get_logger, add_logging_arguments, configure_from_arguments
+from measurement import Measurement
+from online_stats import CampaignStatistics
+from recipe import SweepRecipe, RecipeCache
+from result_cache import ResultCache, probe_state, state_fingerprint
+from retention import RetentionMeasurement
+from stream import StreamServer
+from utils import save_data_to_csv
+from waveform import Waveform
+
+log = get_logger("scheduler")
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Parameters each job kind needs (optional ones have defaults in the runner)
+JOB_KINDS = {
+    "sweep": ("start", "stop", "step"),
+    "bipolar": ("set_voltage", "reset_voltage", "step"),
+    "retention": ("voltage", "interval", "duration"),
+}
+
+
+def build_recipe(kind, p):
+    """
+    SweepRecipe of a "sweep" or "bipolar" job from its parameters
+
+    Optional parameters and their defaults: compliance (0.01 A), delay (0 s), nplc (1),
+    cycles (1), set_compliance (0.001 A), reset_compliance (0.01 A).
+    With a result cache, sweep jobs also accept cache (0 to always measure), max_age
+    (oldest reusable result in seconds), ttl (lifetime of the new entry in seconds)
+    and probe_voltage.
+    """
+    if kind == "sweep":
+        return SweepRecipe.linear(p["start"], p["stop"], p["step"], compliance=p.get("compliance", 0.01),
+                                  source_delay=p.get("delay", 0.0), nplc=p.get("nplc", 1.0))
+    if kind == "bipolar":
+        waveform = Waveform.bipolar(p["set_voltage"], p["reset_voltage"], p["step"], p.get("cycles", 1),
+                                    p.get("set_compliance", 0.001), p.get("reset_compliance", 0.01))
+        return waveform.to_recipe(source_delay=p.get("delay", 0.0), nplc=p.get("nplc", 1.0))
+    raise ValueError(f"Job kind '{kind}' is not a sweep.")
+
+
+class MeasurementJob:
+    """
+    One queued measurement
+
+    Args:
+        kind (str): "sweep", "bipolar" or "retention"
+        parameters (dict): Measurement parameters for the job kind
+        priority (int): Jobs with higher priority run first; equal priorities run in submission order
+        device (str): Label of the device under test (used in metadata and file names)
+    """
+
+    def __init__(self, kind, parameters, priority=0, device=""):
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind '{kind}'. Choose from: {', '.join(JOB_KINDS)}")
+        missing = [name for name in JOB_KINDS[kind] if name not in parameters]
+        if missing:
+            raise ValueError(f"Missing parameters for {kind} job: {', '.join(missing)}")
+        self.job_id = uuid.uuid4().hex[:8]
+        self.kind = kind
+        self.parameters = dict(parameters)
+        self.priority = int(priority)
+        self.device = device
+        self.status = QUEUED
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.attempts = 0
+        self.output = None
+        self.error = None
+        self.cache = None
+        self.statistics = None
+
+    def to_dict(self):
+        return dict(self.__dict__)
+
+    @classmethod
+    def from_dict(cls, data):
+        job = cls.__new__(cls)
+        job.__dict__.update(data)
+        return job
+
+    def __repr__(self):
+        return f"<MeasurementJob {self.job_id} {self.kind} {self.device or '-'} p={self.priority} {self.status}>"
+
+
+class JobQueue:
+    """
+    Prioritized job queue persisted to a JSON file
+
+    Every change is written to disk immediately (atomically, via a temporary file),
+    so the queue survives crashes. Jobs found in the running state when the file is
+    loaded were interrupted and are queued again.
+
+    Args:
+        path (str): Queue file; created if it does not exist
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.jobs = []
+        self.changed = threading.Condition()
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        with open(self.path) as file:
+            data = json.load(file)
+        with self.changed:
+            self.jobs = [MeasurementJob.from_dict(item) for item in data.get("jobs", [])]
+            for job in self.jobs:
+                if job.status == RUNNING:
+                    job.status = QUEUED
+            self._save()
+
+    def _save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as file:
+            json.dump({"jobs": [job.to_dict() for job in self.jobs]}, file, indent=1)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp, self.path)
+
+    def add(self, job):
+        """Queue a job and wake up a waiting scheduler"""
+        with self.changed:
+            self.jobs.append(job)
+            self._save()
+            self.changed.notify_all()
+        return job
+
+    def remove(self, job_id):
+        """Remove a job that is not running"""
+        with self.changed:
+            self.jobs = [job for job in self.jobs if job.job_id != job_id or job.status == RUNNING]
+            self._save()
+
+    def update(self, job, **fields):
+        """Change job fields and persist the queue"""
+        with self.changed:
+            job.__dict__.update(fields)
+            self._save()
+            self.changed.notify_all()
+
+    def pending(self):
+        """Queued jobs in execution order"""
+        with self.changed:
+            queued = [job for job in self.jobs if job.status == QUEUED]
+        return sorted(queued, key=lambda job: (-job.priority, job.submitted))
+
+    def next_job(self, timeout=None):
+        """
+        Return the next job to run, waiting up to timeout seconds for one to be queued
+
+        Returns:
+            MeasurementJob: The job, or None if none became available
+        """
+        with self.changed:
+            if not self.pending():
+                self.changed.wait(timeout)
+            pending = self.pending()
+            return pending[0] if pending else None
+
+
+class JobExport:
+    """
+    Parquet export of one job, fed with its points while it runs
+
+    The CSV file is the primary record: an export that fails is logged and
+    discarded instead of failing the job. A job that fails discards its export.
+    Used as a context manager; without an export root every call does nothing.
+
+    Args:
+        root (str, optional): Export root (see parquet_export.py); None disables the export
+        job (MeasurementJob): Job whose points are exported (device, kind and run ID)
+        wafer (str): Wafer label
+        metadata (dict): Job metadata; entries added while the job runs are exported too
+    """
+
+    def __init__(self, root, job, wafer="", metadata=None):
+        self.job_id = job.job_id
+        self.metadata = metadata if metadata is not None else {}
+        self.exporter = None
+        if root is None:
+            return
+        try:
+            from parquet_export import ParquetExporter
+            self.exporter = ParquetExporter(root, job.device, wafer, self.metadata, kind=job.kind, run_id=job.job_id)
+        except Exception as e:
+            self._failed(e)
+
+    def _failed(self, error):
+        log.error("Parquet export of job %s failed: %s", self.job_id, error)
+        self.discard()
+
+    def write(self, voltages, currents, cycles=None, timestamps=None, flags=None, segments=None):
+        """Append points (the signature of ParquetExporter.write and the ResumableSweep on_chunk)"""
+        if self.exporter is None:
+            return
+        try:
+            self.exporter.write(voltages, currents, cycles, timestamps, flags, segments)
+        except Exception as e:
+            self._failed(e)
+
+    def close(self):
+        if self.exporter is None:
+            return
+        try:
+            self.exporter.metadata.update(self.metadata)
+            self.exporter.close()
+        except Exception as e:
+            self._failed(e)
+        self.exporter = None
+
+    def discard(self):
+        if self.exporter is None:
+            return
+        exporter, self.exporter = self.exporter, None
+        try:
+            exporter.discard()
+        except Exception as e:
+            log.warning("Could not remove the partial export of job %s: %s", self.job_id, e)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, error_type, error, traceback):
+        if error_type is None:
+            self.close()
+        else:
+            self.discard()
+
+
+class JobScheduler:
+    """
+    Runs queued jobs back to back on one instrument
+
+    Each job configures the instrument, runs, and writes its data to a CSV file in
+    the output directory before the next job is taken. Compiled sweeps are cached
+    across jobs, so repeated recipes skip the upload. Long sweep and bipolar jobs
+    are checkpointed in the output directory and reconnect with backoff when the
+    link drops. A job that still fails because of the connection is returned to the queue
+    and the scheduler stops; the next run resumes it from its checkpoint. Other
+    failures mark the job failed and the queue continues.
+
+    Args:
+        instrument (Instrument): Connected instrument
+        queue (JobQueue): Job queue
+        output_dir (str): Directory receiving one CSV file per job
+        on_update (callable, optional): Called as on_update(job) whenever a job changes state
+        checkpoint_after (float): Sweeps estimated to run longer than this (seconds) are checkpointed
+        stream (StreamServer, optional): Server receiving job status and measured data
+        result_cache (ResultCache, optional): Results of earlier runs; sweep jobs of a device
+            whose probed state, recipe and ID match a valid entry reuse its output instead
+            of measuring (see result_cache.py)
+        probe_voltage (float): Voltage of the state probe taken before cacheable sweeps
+        parquet (str, optional): Export root; the points of every measured job are also appended
+            to this partitioned Parquet export as they are acquired (see parquet_export.py)
+        wafer (str): Wafer label of the Parquet partitions
+    """
+
+    def __init__(self, instrument, queue, output_dir=".", on_update=None, checkpoint_after=60.0, stream=None,
+                 result_cache=None, probe_voltage=0.1, parquet=None, wafer=""):
+        self.instrument = instrument
+        self.parquet = parquet
+        self.wafer = wafer
+        self.result_cache = result_cache
+        self.probe_voltage = probe_voltage
+        self.stream = stream
+        self.checkpoint_after = checkpoint_after
+        self.queue = queue
+        self.output_dir = output_dir
+        self.on_update = on_update
+        self.recipe_cache = RecipeCache()
+        self.current = None
+        self.running = False
+        self._stop = threading.Event()
+        self._retention = None
+
+    def stop(self):
+        """Stop after the running job (retention jobs are stopped immediately)"""
+        self._stop.set()
+        if self._retention is not None:
+            self._retention.stop()
+        with self.queue.changed:
+            self.queue.changed.notify_all()
+
+    def run(self, wait=False):
+        """
+        Execute queued jobs (blocking)
+
+        Args:
+            wait (bool): Keep waiting for new jobs when the queue is empty instead of returning
+        """
+        self._stop.clear()
+        self.running = True
+        os.makedirs(self.output_dir, exist_ok=True)
+        try:
+            while not self._stop.is_set():
+                job = self.queue.next_job(timeout=1.0 if wait else 0)
+                if job is None:
+                    if wait:
+                        continue
+                    break
+                self._execute(job)
+        finally:
+            self.running = False
+            self.current = None
+
+    def start(self, wait=True):
+        """Run the scheduler in a background thread"""
+        # Mark the scheduler running before the thread starts, so callers checking it see no gap
+        self.running = True
+        thread = threading.Thread(target=self.run, args=(wait,), daemon=True)
+        thread.start()
+        return thread
+
+    def _set(self, job, **fields):
+        self.queue.update(job, **fields)
+        if self.stream is not None:
+            self.stream.publish("job", job_id=job.job_id, kind=job.kind, device=job.device,
+                                status=job.status, output=job.output, error=job.error)
+        if self.on_update:
+            self.on_update(job)
+
+    def _execute(self, job):
+        self.current = job
+        self._set(job, status=RUNNING, started=time.time(), attempts=job.attempts + 1, error=None)
+        try:
+            output = self.run_job(job)
+            self._set(job, status=DONE, finished=time.time(), output=output)
+        except Exception as e:
+            if is_connection_error(e):
+                # Lost the instrument: keep the job (and its checkpoint) for the next run
+                self._set(job, status=QUEUED, error=str(e))
+                self._stop.set()
+                log.error("Job %s interrupted by a connection error, scheduler stopped: %s", job.job_id, e)
+            else:
+                self._set(job, status=FAILED, finished=time.time(), error=str(e))
+                log.error("Job %s failed: %s", job.job_id, e)
+        finally:
+            self.current = None
+
+    def _filename(self, job):
+        device = "".join(c if c.isalnum() or c in "-_" else "_" for c in job.device)
+        name = f"{job.job_id}_{job.kind}" + (f"_{device}" if device else "") + ".csv"
+        return os.path.join(self.output_dir, name)
+
+    def run_job(self, job):
+        """
+        Run a single job and save its data
+
+        Returns:
+            str: Path of the CSV file written
+        """
+        p = job.parameters
+        filename = self._filename(job)
+        metadata = {"Job": job.job_id, "Device": job.device, "Priority": job.priority}
+        metadata.update({key: value for key, value in p.items()})
+
+        self.instrument.set_voltage_source_mode()
+        self.instrument.set_current_measurement_mode()
+
+        if job.kind == "retention":
+            self.instrument.set_current_compliance(p.get("compliance", 0.01))
+            with JobExport(self.parquet, job, self.wafer, metadata) as export:
+                self._retention = RetentionMeasurement(
+                    self.instrument, p["voltage"], p["interval"], duration=p["duration"], filename=filename,
+                    metadata=metadata, stream=self.stream,
+                    on_chunk=lambda times, currents: export.write(np.full(len(times), p["voltage"]), currents,
+                                                                  timestamps=times))
+                try:
+                    self._retention.run()
+                finally:
+                    self._retention = None
+            return filename
+
+        recipe = build_recipe(job.kind, p)
+        state = None
+        if self._cacheable(job):
+            state, cached = self._lookup(job, recipe)
+            if cached is not None:
+                return cached
+            metadata.update({"Recipe": recipe.key(), "State fingerprint": state["fingerprint"],
+                             "Probe resistance (Ohm)": state["resistance"]})
+
+        measurement = Measurement(self.instrument, self.stream)
+        checkpoint = os.path.join(self.output_dir, f"{job.job_id}.checkpoint")
+        with JobExport(self.parquet, job, self.wafer, metadata) as export:
+            self._run_recipe(measurement, recipe, checkpoint, export)
+            if job.kind == "bipolar":
+                # Per-cycle HRS/LRS, switching voltage and yield statistics, kept with the job and the file
+                statistics = CampaignStatistics()
+                statistics.add_cycles(measurement.voltages, measurement.currents, measurement.cycles)
+                metadata.update(statistics.summary())
+                self._set(job, statistics=statistics.snapshot())
+                if self.stream is not None:
+                    self.stream.publish("statistics", source="job", job_id=job.job_id, **job.statistics)
+            if job.kind == "sweep":
+                saved = save_data_to_csv(filename, measurement.voltages, measurement.currents, metadata,
+                                         timestamps=measurement.timestamps)
+            else:
+                saved = save_data_to_csv(filename, measurement.voltages, measurement.currents, metadata,
+                                         measurement.cycles, measurement.segments, measurement.timestamps)
+            if not saved:
+                raise RuntimeError(f"Failed to save data to {filename}")
+        if state is not None:
+            self.result_cache.store(job.device, recipe.key(), state["fingerprint"], filename, job=job.job_id,
+                                    ttl=p.get("ttl"), resistance=state["resistance"])
+        return filename
+
+    def _cacheable(self, job):
+        # Only sweeps are read-like; bipolar jobs switch the device and retention is time dependent.
+        # Jobs opt out with cache=0 and need a device ID to be keyed
+        return (self.result_cache is not None and job.kind == "sweep" and bool(job.device)
+                and bool(job.parameters.get("cache", 1)))
+
+    def _lookup(self, job, recipe):
+        """Probe the device state and return (state, cached output or None); records the result in job.cache"""
+        p = job.parameters
+        self.instrument.set_current_compliance(p.get("compliance", 0.01))
+        resistance = probe_state(self.instrument, p.get("probe_voltage", self.probe_voltage))
+        state = {"fingerprint": state_fingerprint(resistance), "resistance": resistance}
+        entry = self.result_cache.lookup(job.device, recipe.key(), state["fingerprint"], p.get("max_age"))
+        if entry is None:
+            self._set(job, cache={"hit": False, "recipe": recipe.key(), **state})
+            return state, None
+        self._set(job, cache={"hit": True, "recipe": recipe.key(), **state, "source_job": entry["job"],
+                              "age": time.time() - entry["created"]})
+        log.info("Job %s: %s unchanged (R = %.4g Ohm), reusing the result of job %s",
+                 job.job_id, job.device, resistance, entry["job"])
+        return state, entry["output"]
+
+    def _run_recipe(self, measurement, recipe, checkpoint, export):
+        # Short runs go through the cached instrument-side program and arrive in one transfer;
+        # long ones are checkpointed so a dropped link or crash does not lose the progress, and
+        # every committed chunk goes to the export
+        if recipe.estimated_duration() < self.checkpoint_after and not os.path.exists(checkpoint):
+            measurement.run_recipe(recipe, self.recipe_cache)
+            export.write(measurement.voltages, measurement.currents, measurement.cycles, measurement.timestamps,
+                         measurement.flags, measurement.segments)
+        else:
+            measurement.run_resumable(recipe, checkpoint, on_chunk=export.write)
+
+
+def parse_parameters(items):
+    """Parse key=value pairs into a parameter dictionary with numeric values"""
+    parameters = {}
+    for item in items:
+        key, _, value = item.partition("=")
+        if not value:
+            raise ValueError(f"Parameter '{item}' must have the form key=value")
+        parameters[key] = float(value)
+        if key == "cycles":
+            parameters[key] = int(parameters[key])
+    return parameters
+
+
+def main():
+    from instrument import Instrument
+
+    parser = argparse.ArgumentParser(description="Persistent measurement job queue (headless)")
+    parser.add_argument("queue", help="Queue file (JSON)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    add = commands.add_parser("add", help="Queue a job")
+    add.add_argument("kind", choices=sorted(JOB_KINDS))
+    add.add_argument("parameters", nargs="*", help="key=value pairs, e.g. start=0 stop=1 step=0.1")
+    add.add_argument("--priority", type=int, default=0, help="Higher priority runs first")
+    add.add_argument("--device", default="", help="Device under test")
+
+    commands.add_parser("list", help="Show all jobs")
+    remove = commands.add_parser("remove", help="Remove a queued job")
+    remove.add_argument("job_id")
+
+    run = commands.add_parser("run", help="Execute queued jobs")
+    run.add_argument("--resource", default="GPIB::26::INSTR", help="VISA resource name")
+    run.add_argument("--backend", default="@py", help="PyVISA backend")
+    run.add_argument("--simulate", action="store_true", help="Use the simulation mode instrument")
+    run.add_argument("--replay", help="Replay this measurement CSV file instead of using an instrument")
+    run.add_argument("--replay-speed", type=float, default=0,
+                     help="Replay speed: 1 = real time, 10 = 10x, 0 = as fast as possible")
+    run.add_argument("--output", default=".", help="Directory for the CSV files")
+    run.add_argument("--wait", action="store_true", help="Keep waiting for new jobs when the queue is empty")
+    run.add_argument("--stream-port", type=int, help="Publish live data on this localhost port (see stream.py)")
+    run.add_argument("--result-cache", help="Reuse results of unchanged devices from this cache file (JSON)")
+    run.add_argument("--cache-ttl", type=float, default=3600.0, help="Lifetime of cached results in seconds")
+    run.add_argument("--cache-size", type=int, default=256, help="Maximum number of cached results")
+    run.add_argument("--parquet", help="Also append the data of every job to this partitioned Parquet export")
+    run.add_argument("--wafer", default="", help="Wafer label of the Parquet partitions")
+    add_logging_arguments(run)
+    args = parser.parse_args()
+
+    queue = JobQueue(args.queue)
+    if args.command == "add":
+        try:
+            job = queue.add(MeasurementJob(args.kind, parse_parameters(args.parameters), args.priority, args.device))
+        except ValueError as e:
+            parser.error(str(e))
+        print(f"Queued {job}")
+    elif args.command == "list":
+        for job in sorted(queue.jobs, key=lambda job: job.submitted):
+            cache = getattr(job, "cache", None)
+            notes = f" (cached from {cache['source_job']})" if cache and cache["hit"] else ""
+            statistics = getattr(job, "statistics", None)
+            if statistics and statistics["cycles"]:
+                notes += f" (yield {statistics['yield'] * 100:.1f}% of {statistics['cycles']} cycles)"
+            print(f"{job.job_id}  {job.status:8}  p={job.priority:<3} {job.kind:10} {job.device or '-':12} "
+                  f"{job.output or job.error or ''}{notes}")
+    elif args.command == "remove":
+        queue.remove(args.job_id)
+    else:
+        configure_from_arguments(args)
+        if args.replay:
+            from replay import connect_replay
+            instrument, _ = connect_replay(args.replay, args.replay_speed or None)
+        else:
+            instrument = Instrument(simulation_mode=args.simulate, backend=args.backend)
+            instrument.connect(args.resource)
+        stream = None
+        if args.stream_port is not None:
+            stream = StreamServer(("127.0.0.1", args.stream_port))
+            stream.start()
+        result_cache = None
+        if args.result_cache:
+            result_cache = ResultCache(args.result_cache, args.cache_ttl, args.cache_size)
+        scheduler = JobScheduler(instrument, queue, args.output,
+                                 on_update=lambda job: log.info("%s: %s", job.job_id, job.status), stream=stream,
+                                 result_cache=result_cache, parquet=args.parquet, wafer=args.wafer)
+        try:
+            scheduler.run(wait=args.wait)
+        except KeyboardInterrupt:
+            scheduler.stop()
+        finally:
+            instrument.safe_shutdown()
+            if stream is not None:
+                stream.stop()
+            if result_cache is not None:
+                log.info("Result cache: %d hits, %d misses", result_cache.hits, result_cache.misses)
+
+
+if __name__ == "__main__":
+    main()
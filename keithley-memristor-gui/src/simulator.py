@@ -0,0 +1,658 @@
+"""
+Simulated Keithley 2602 for benchmarking and testing without hardware.
+
+The simulator executes the TSP commands sent by `Instrument` in an embedded Lua
+runtime (lupa) against Python models of the SMU channels, so the same code paths
+used with a real instrument can run on any machine. A PyVISA-like resource and
+resource manager wrap the simulator and add configurable per-transaction latency
+and transaction counters.
+"""
+
+import math
+import random
+import threading
+import time
+
+# Pin Lua 5.4: closest to the instrument's TSP dialect and stable with lupa's object wrappers
+from lupa.lua54 import LuaRuntime, LuaError
+from pyvisa import constants
+from pyvisa.errors import VisaIOError
+
+
+class MemristorModel:
+    """
+    Simple bipolar memristor model with a linear-drift state variable
+
+    The state w (0 = high resistance, 1 = low resistance) drifts towards 1 above
+    the SET threshold and towards 0 below the RESET threshold.
+
+    Args:
+        r_on (float): Low resistance state in ohms
+        r_off (float): High resistance state in ohms
+        v_set (float): SET threshold voltage in volts
+        v_reset (float): RESET threshold voltage in volts
+        rate (float): State drift rate in 1/(V*s)
+        noise (float): Relative current noise (standard deviation)
+        state (float): Initial state between 0 and 1
+        seed (int, optional): Seed for the noise generator
+    """
+
+    def __init__(self, r_on=1e3, r_off=1e5, v_set=1.0, v_reset=-1.0,
+                 rate=50.0, noise=0.01, state=0.0, seed=None):
+        self.r_on = r_on
+        self.r_off = r_off
+        self.v_set = v_set
+        self.v_reset = v_reset
+        self.rate = rate
+        self.noise = noise
+        self.state = state
+        self.random = random.Random(seed)
+
+    def resistance(self):
+        return self.r_on * self.state + self.r_off * (1.0 - self.state)
+
+    def current(self, voltage, dt):
+        """
+        Advance the device state by dt seconds at the given bias and return the current
+
+        Args:
+            voltage (float): Applied voltage in volts
+            dt (float): Time spent at this voltage in seconds
+        """
+        if voltage > self.v_set:
+            self.state += self.rate * (voltage - self.v_set) * dt * (1.0 - self.state)
+        elif voltage < self.v_reset:
+            self.state -= self.rate * (self.v_reset - voltage) * dt * self.state
+        self.state = min(max(self.state, 0.0), 1.0)
+
+        current = voltage / self.resistance()
+        if self.noise:
+            current *= 1.0 + self.random.gauss(0.0, self.noise)
+        return current
+
+
+class _BufferColumn:
+    """1-based, read-only view of one column of a reading buffer (TSP indexing)"""
+
+    def __init__(self, values):
+        self._values = values
+
+    def __getitem__(self, index):
+        return self._values[int(index) - 1]
+
+    def __len__(self):
+        return len(self._values)
+
+
+class ReadingBuffer:
+    """Simulated SMU reading buffer (smuX.nvbuffer1 / smuX.nvbuffer2 or from smuX.makebuffer)"""
+
+    def __init__(self, capacity=100000):
+        self.capacity = int(capacity)
+        self.appendmode = 0
+        self.collecttimestamps = 0
+        self.collectsourcevalues = 0
+        self.fillmode = 0
+        self._readings = []
+        self._sourcevalues = []
+        self._timestamps = []
+        self._lock = threading.Lock()
+
+    @property
+    def n(self):
+        return len(self._readings)
+
+    @property
+    def readings(self):
+        return _BufferColumn(self._readings)
+
+    @property
+    def sourcevalues(self):
+        return _BufferColumn(self._sourcevalues)
+
+    @property
+    def timestamps(self):
+        return _BufferColumn(self._timestamps)
+
+    def clear(self):
+        with self._lock:
+            self._readings = []
+            self._sourcevalues = []
+            self._timestamps = []
+
+    def begin(self):
+        """Start a new measurement; buffers without appendmode are overwritten"""
+        if not self.appendmode:
+            self.clear()
+
+    def append(self, reading, sourcevalue, timestamp):
+        with self._lock:
+            self._readings.append(reading)
+            self._sourcevalues.append(sourcevalue)
+            self._timestamps.append(timestamp)
+
+    def __getitem__(self, index):
+        # Lua does not distinguish buffer[i] from buffer.attribute
+        if isinstance(index, str):
+            return getattr(self, index)
+        return self._readings[int(index) - 1]
+
+    def __setitem__(self, name, value):
+        setattr(self, name, value)
+
+
+class _Attributes:
+    """Plain attribute holder; TSP attributes that have no effect are simply stored"""
+
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class SourceSettings(_Attributes):
+    def __init__(self):
+        super().__init__(func=1, levelv=0.0, leveli=0.0, limiti=0.1, limitv=20.0,
+                         rangev=20.0, rangei=0.1, autorangev=1, autorangei=1,
+                         output=0, delay=0.0, compliance=False,
+                         highc=0, offmode=0, settling=0, sink=0)
+
+
+class TriggerSource(_Attributes):
+    def __init__(self):
+        super().__init__(action=0, stimulus=0, limiti=float('inf'), limitv=float('inf'))
+        self.values = []
+
+    def listv(self, values):
+        self.values = [float(v) for v in values.values()]
+
+    def linearv(self, start, stop, points):
+        points = int(points)
+        if points <= 1:
+            self.values = [float(start)]
+        else:
+            step = (stop - start) / (points - 1)
+            self.values = [start + step * k for k in range(points)]
+
+
+class TriggerMeasure(_Attributes):
+    def __init__(self):
+        super().__init__(action=0, stimulus=0)
+        self.buffers = None
+        self.function = 'i'
+
+    def i(self, ibuffer):
+        self.function, self.buffers = 'i', (ibuffer,)
+
+    def v(self, vbuffer):
+        self.function, self.buffers = 'v', (vbuffer,)
+
+    def iv(self, ibuffer, vbuffer):
+        self.function, self.buffers = 'iv', (ibuffer, vbuffer)
+
+
+class TriggerModel(_Attributes):
+    def __init__(self, channel):
+        super().__init__(count=1, stimulus=0)
+        self.arm = _Attributes(count=1, stimulus=0)
+        self.source = TriggerSource()
+        self.measure = TriggerMeasure()
+        self.endpulse = _Attributes(action=1, stimulus=0)
+        self.endsweep = _Attributes(action=0)
+        self._channel = channel
+
+    def initiate(self):
+        self._channel.run_trigger_model()
+
+    def abort(self):
+        self._channel.abort()
+
+    def clear(self):
+        pass
+
+
+class MeasureSettings(_Attributes):
+    def __init__(self, channel):
+        super().__init__(nplc=1.0, autorangei=1, autorangev=1, rangei=0.1,
+                         rangev=20.0, autozero=2, delay=0.0, count=1,
+                         interval=0.0, filter=_Attributes(enable=0, count=1, type=0))
+        self._channel = channel
+
+    def i(self, buffer=None):
+        return self._channel.take_readings('i', (buffer,))
+
+    def v(self, buffer=None):
+        return self._channel.take_readings('v', (buffer,))
+
+    def r(self, buffer=None):
+        return self._channel.take_readings('r', (buffer,))
+
+    def iv(self, ibuffer=None, vbuffer=None):
+        return self._channel.take_readings('iv', (ibuffer, vbuffer))
+
+    def overlappedi(self, buffer):
+        self._channel.measure_overlapped('i', (buffer,))
+
+    def overlappediv(self, ibuffer, vbuffer):
+        self._channel.measure_overlapped('iv', (ibuffer, vbuffer))
+
+
+class SMUChannel:
+    """
+    Simulated 2602 SMU channel (smua / smub) driving a device model
+
+    Readings advance a virtual instrument clock by the integration time
+    (nplc / line frequency) plus the measure delay; in realtime mode the
+    simulator also sleeps for that time.
+    """
+
+    OUTPUT_OFF = 0
+    OUTPUT_ON = 1
+    OUTPUT_DCAMPS = 0
+    OUTPUT_DCVOLTS = 1
+    AUTORANGE_OFF = 0
+    AUTORANGE_ON = 1
+    AUTOZERO_OFF = 0
+    AUTOZERO_ONCE = 1
+    AUTOZERO_AUTO = 2
+    DISABLE = 0
+    ENABLE = 1
+    SOURCE_IDLE = 0
+    SOURCE_HOLD = 1
+    ASYNC = 0
+    SYNC = 1
+
+    def __init__(self, node, model=None):
+        self._node = node
+        self.model = model or MemristorModel()
+        self.reset()
+
+    def reset(self):
+        self.source = SourceSettings()
+        self.measure = MeasureSettings(self)
+        self.trigger = TriggerModel(self)
+        self.nvbuffer1 = ReadingBuffer()
+        self.nvbuffer2 = ReadingBuffer()
+        self.selftest = _Attributes(run=lambda: 0)
+        self._overlapped = None
+        self._aborted = False
+
+    def makebuffer(self, size):
+        """Create a dynamic reading buffer"""
+        return ReadingBuffer(size)
+
+    def abort(self):
+        self._aborted = True
+        if self._overlapped is not None:
+            self._overlapped.join()
+            self._overlapped = None
+
+    def _reading_time(self):
+        return self.measure.nplc / self._node.linefreq + self.measure.delay
+
+    def _read(self):
+        """Take one reading and return (current, voltage, timestamp)"""
+        dt = self._reading_time()
+        self._node.advance(dt)
+        if not self.source.output:
+            return 0.0, 0.0, self._node.clock
+
+        voltage = float(self.source.levelv)
+        current = self.model.current(voltage, dt)
+        limit = abs(float(self.source.limiti))
+        self.source.compliance = abs(current) >= limit
+        if self.source.compliance:
+            current = math.copysign(limit, current)
+        return current, voltage, self._node.clock
+
+    def _store(self, function, buffers, current, voltage, timestamp):
+        if function == 'iv':
+            values = (current, voltage)
+        elif function == 'v':
+            values = (voltage,)
+        elif function == 'r':
+            values = (voltage / current if current else float('inf'),)
+        else:
+            values = (current,)
+        for buffer, value in zip(buffers, values):
+            if buffer is not None:
+                buffer.append(value, voltage, timestamp)
+        return values
+
+    def _begin(self, buffers):
+        for buffer in buffers:
+            if buffer is not None:
+                buffer.begin()
+
+    def take_readings(self, function, buffers):
+        self._begin(buffers)
+        values = None
+        for _ in range(max(int(self.measure.count), 1)):
+            values = self._store(function, buffers, *self._read())
+        return values[0] if len(values) == 1 else tuple(values)
+
+    def measure_overlapped(self, function, buffers):
+        self.wait()
+        self._aborted = False
+        self._begin(buffers)
+
+        def run():
+            for _ in range(max(int(self.measure.count), 1)):
+                if self._aborted:
+                    break
+                self._store(function, buffers, *self._read())
+                if self.measure.interval > self._reading_time():
+                    self._node.advance(self.measure.interval - self._reading_time())
+
+        self._overlapped = threading.Thread(target=run, daemon=True)
+        self._overlapped.start()
+
+    def run_trigger_model(self):
+        """Start a source-measure sweep over the configured source list (runs in the background)"""
+        self.wait()
+        self._aborted = False
+        points = self.trigger.source.values or [self.source.levelv]
+        count = int(self.trigger.count) if self.trigger.count else len(points)
+        arm_count = max(int(self.trigger.arm.count), 1)
+        sweep_source = self.trigger.source.action
+        measure = self.trigger.measure.action
+        function = self.trigger.measure.function
+        buffers = self.trigger.measure.buffers or ()
+        idle_level = self.source.levelv
+        self._begin(buffers)
+
+        def run():
+            for _ in range(arm_count):
+                for k in range(count):
+                    if self._aborted:
+                        return
+                    if sweep_source:
+                        self.source.levelv = points[k % len(points)]
+                    if self.source.delay:
+                        self._node.advance(self.source.delay)
+                    if measure:
+                        self._store(function, buffers, *self._read())
+            if self.trigger.endsweep.action == self.SOURCE_IDLE:
+                self.source.levelv = idle_level
+
+        self._overlapped = threading.Thread(target=run, daemon=True)
+        self._overlapped.start()
+
+    def wait(self):
+        if self._overlapped is not None:
+            self._overlapped.join()
+            self._overlapped = None
+
+
+class SimulatedKeithley2602:
+    """
+    TSP command interpreter for a simulated Keithley 2602
+
+    Commands are executed as Lua chunks. `loadscript`/`endscript` blocks are
+    collected and turned into named, callable script objects as on the real
+    instrument. Output produced by print() and printbuffer() is queued and
+    returned line by line.
+
+    Args:
+        model_a (MemristorModel, optional): Device model attached to smua
+        model_b (MemristorModel, optional): Device model attached to smub
+        realtime (bool): Sleep for the modelled measurement time of each reading
+        linefreq (float): Power line frequency used for NPLC timing
+    """
+
+    def __init__(self, model_a=None, model_b=None, realtime=False, linefreq=60.0):
+        self.realtime = realtime
+        self.linefreq = linefreq
+        self.clock = 0.0
+        self.output = []
+        self.errors = []
+        self._script_name = None
+        self._script_lines = []
+        self._autorun = False
+        self.lock = threading.RLock()
+
+        self.smua = SMUChannel(self, model_a)
+        self.smub = SMUChannel(self, model_b)
+        self.lua = LuaRuntime(unpack_returned_tuples=True)
+        self._install_globals()
+
+    def advance(self, seconds):
+        """Advance the instrument clock, sleeping in realtime mode"""
+        if seconds <= 0:
+            return
+        self.clock += seconds
+        if self.realtime:
+            time.sleep(seconds)
+
+    def _install_globals(self):
+        g = self.lua.globals()
+        self.format = _Attributes(asciiprecision=6, data=1, ASCII=1, REAL32=2, REAL64=3)
+        g.smua = self.smua
+        g.smub = self.smub
+        g.format = self.format
+        g.localnode = _Attributes(linefreq=self.linefreq, prompts=0, showerrors=0,
+                                  model="2602", serialno="1398687", revision="3.0.0")
+        g.errorqueue = _Attributes(clear=self.errors.clear,
+                                   next=self._next_error,
+                                   count=0)
+        g.display = _Attributes(clear=lambda: None, screen=0, SMUA=0, SMUB=1, SMUA_SMUB=2)
+        g.beeper = _Attributes(enable=0, beep=lambda *args: None)
+        g.timer = _Attributes(reset=self._reset_timer,
+                              measure=_Attributes(t=lambda: self.clock - self._timer_start))
+        self._timer_start = 0.0
+        g.print = self._print
+        g.printbuffer = self._printbuffer
+        g.reset = self.reset
+        g.waitcomplete = self.waitcomplete
+        g.delay = self.advance
+        # Named scripts are kept in script.user.scripts until script.delete() removes them
+        self.lua.execute("""
+            script = {user = {scripts = {}}}
+            function script.delete(name)
+                script.user.scripts[name] = nil
+            end
+            function _make_script(name, body)
+                local chunk = assert(load(body, name))
+                local loaded = {name = name, source = body}
+                loaded.run = function() return chunk() end
+                setmetatable(loaded, {__call = function() return chunk() end})
+                _G[name] = loaded
+                script.user.scripts[name] = loaded
+            end
+        """)
+
+    def _reset_timer(self):
+        self._timer_start = self.clock
+
+    def _next_error(self):
+        if self.errors:
+            return self.errors.pop(0)
+        return 0, "Queue Is Empty", 0, 0
+
+    def _format_value(self, value):
+        if isinstance(value, bool):
+            return "true" if value else "false"
+        if isinstance(value, (int, float)):
+            return f"{float(value):.{int(self.format.asciiprecision) - 1}e}"
+        if value is None:
+            return "nil"
+        return str(value)
+
+    def _print(self, *args):
+        self.output.append("\t".join(self._format_value(a) for a in args))
+
+    def _printbuffer(self, start, end, *buffers):
+        columns = [b if isinstance(b, _BufferColumn) else b.readings for b in buffers]
+        values = []
+        for index in range(int(start), int(end) + 1):
+            for column in columns:
+                values.append(self._format_value(column[index]))
+        self.output.append(", ".join(values))
+
+    def reset(self):
+        self.waitcomplete()
+        self.smua.reset()
+        self.smub.reset()
+        self.format.asciiprecision = 6
+        self.format.data = 1
+
+    def waitcomplete(self, *args):
+        self.smua.wait()
+        self.smub.wait()
+
+    def execute(self, message):
+        """
+        Execute one TSP message (which may contain several lines)
+
+        Returns:
+            list: Output lines produced by the message
+        """
+        with self.lock:
+            for line in message.split('\n'):
+                self._execute_line(line.strip())
+            output, self.output = self.output, []
+            return output
+
+    def _execute_line(self, line):
+        if self._script_name is not None:
+            if line == "endscript":
+                self._load_script(self._script_name, "\n".join(self._script_lines))
+                self._script_name = None
+                self._script_lines = []
+            else:
+                self._script_lines.append(line)
+            return
+
+        if line.startswith("loadscript ") or line.startswith("loadandrunscript "):
+            keyword, _, name = line.partition(" ")
+            self._script_name = name.strip()
+            self._autorun = keyword == "loadandrunscript"
+            return
+        if not line:
+            return
+        if line.startswith("*"):
+            self._execute_common_command(line.upper())
+            return
+
+        try:
+            self.lua.execute(line)
+        except (LuaError, TypeError, ValueError, IndexError) as e:
+            self._record_error(str(e))
+
+    def _execute_common_command(self, command):
+        """IEEE-488.2 common commands accepted alongside TSP"""
+        if command == "*IDN?":
+            self.output.append("Keithley Instruments Inc., Model 2602, 1398687, 3.0.0")
+        elif command == "*RST":
+            self.reset()
+        elif command == "*CLS":
+            self.errors.clear()
+        elif command == "*OPC?":
+            self.waitcomplete()
+            self.output.append("1")
+        elif command == "*WAI":
+            self.waitcomplete()
+        else:
+            self._record_error(f"Undefined header: {command}")
+
+    def _load_script(self, name, body):
+        try:
+            self.lua.globals()._make_script(name, body)
+            if self._autorun:
+                self.lua.globals()[name].run()
+        except (LuaError, TypeError, ValueError, IndexError) as e:
+            self._record_error(str(e))
+
+    def _record_error(self, message):
+        self.errors.append((-285, message, 0, 0))
+        self.lua.globals().errorqueue.count = len(self.errors)
+
+
+class SimulatedResource:
+    """
+    PyVISA-like message based resource backed by a SimulatedKeithley2602
+
+    Args:
+        device (SimulatedKeithley2602): Simulated instrument
+        latency (float): Seconds added to every bus transaction (write or read)
+        bandwidth (float, optional): Bus throughput in bytes per second; None means unlimited
+    """
+
+    def __init__(self, device, latency=0.0, bandwidth=None):
+        self.device = device
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.timeout = 10000
+        self.write_termination = '\n'
+        self.read_termination = '\n'
+        self._pending = []
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.writes = 0
+        self.reads = 0
+        self.bytes_written = 0
+        self.bytes_read = 0
+
+    @property
+    def transactions(self):
+        return self.writes + self.reads
+
+    def _wait(self, nbytes):
+        seconds = self.latency
+        if self.bandwidth:
+            seconds += nbytes / self.bandwidth
+        if seconds:
+            time.sleep(seconds)
+
+    def write(self, message):
+        self._wait(len(message) + len(self.write_termination))
+        self.writes += 1
+        self.bytes_written += len(message) + len(self.write_termination)
+        self._pending.extend(self.device.execute(message))
+        return len(message)
+
+    def read(self):
+        self.reads += 1
+        if not self._pending:
+            self._wait(0)
+            raise VisaIOError(constants.StatusCode.error_timeout)
+        line = self._pending.pop(0)
+        self._wait(len(line) + len(self.read_termination))
+        self.bytes_read += len(line) + len(self.read_termination)
+        return line
+
+    def query(self, message):
+        self.write(message)
+        return self.read()
+
+    def clear(self):
+        self._pending = []
+
+    def close(self):
+        self._pending = []
+
+
+class SimulatedResourceManager:
+    """
+    Minimal stand-in for pyvisa.ResourceManager that opens SimulatedResources
+
+    Args:
+        device (SimulatedKeithley2602, optional): Shared simulated instrument
+        latency (float): Per-transaction latency passed to opened resources
+        bandwidth (float, optional): Bus throughput in bytes per second passed to opened resources
+    """
+
+    visalib = "simulated"
+
+    def __init__(self, device=None, latency=0.0, bandwidth=None):
+        self.device = device or SimulatedKeithley2602()
+        self.latency = latency
+        self.bandwidth = bandwidth
+        self.resources = []
+
+    def list_resources(self):
+        return ("GPIB0::26::INSTR",)
+
+    def open_resource(self, resource_name):
+        resource = SimulatedResource(self.device, self.latency, self.bandwidth)
+        self.resources.append(resource)
+        return resource
@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Live Data Streaming Server
+Publishes measurement chunks and status messages to any number of local subscribers
+over plain TCP, one JSON object per line:
+
+    {"type": "chunk", "seq": 12, "time": 1700000000.1, "source": "cycling", "cycle": 3,
+     "voltages": [...], "currents": [...], "timestamps": [...]}
+    {"type": "status", "seq": 13, "time": 1700000000.2, "state": "running", ...}
+
+Subscribers may send "subscribe chunk status" (or any list of message types) to
+filter what they receive. Publishing only copies the data into a bounded queue;
+a dispatcher thread encodes each message once and hands it to the subscribers,
+each of which has its own bounded queue and writer thread, so the acquisition is
+never blocked by encoding or by slow clients. When a subscriber falls behind,
+its oldest messages are dropped and the next message it receives carries the
+number of dropped messages in "dropped".
+
+To watch a running stream from a terminal:
+
+    python stream.py --connect 127.0.0.1:5556
+"""
+
+import argparse
+import collections
+import json
+import socket
+import socketserver
+import threading
+import time
+import numpy as np
+
+
+def _encode(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot stream value of type {type(value).__name__}")
+
+
+class _Subscriber:
+    """Bounded, drop-oldest message queue for one client"""
+
+    def __init__(self, max_queue):
+        self.messages = collections.deque(maxlen=max_queue)
+        self.ready = threading.Condition()
+        self.types = None   # None: all message types
+        self.dropped = 0
+        self.closed = False
+
+    def put(self, kind, data):
+        if self.types is not None and kind not in self.types:
+            return
+        with self.ready:
+            if len(self.messages) == self.messages.maxlen:
+                self.dropped += 1
+            self.messages.append(data)
+            self.ready.notify()
+
+    def get(self):
+        """Wait for the next message; returns (data, dropped) or None when closed"""
+        with self.ready:
+            while not self.messages and not self.closed:
+                self.ready.wait()
+            if self.closed:
+                return None
+            dropped, self.dropped = self.dropped, 0
+            return self.messages.popleft(), dropped
+
+    def close(self):
+        with self.ready:
+            self.closed = True
+            self.ready.notify()
+
+
+class StreamRequestHandler(socketserver.StreamRequestHandler):
+    """Serves one subscriber: a writer thread sends messages while commands are read"""
+
+    def _write(self, subscriber):
+        try:
+            while True:
+                item = subscriber.get()
+                if item is None:
+                    return
+                data, dropped = item
+                if dropped:
+                    # Tell the client how much it missed; inserted into the message itself
+                    data = data[:-2] + f', "dropped": {dropped}}}\n'.encode()
+                self.wfile.write(data)
+                self.wfile.flush()
+        except OSError:
+            pass
+        finally:
+            subscriber.close()
+
+    def handle(self):
+        subscriber = _Subscriber(self.server.max_queue)
+        writer = threading.Thread(target=self._write, args=(subscriber,), daemon=True)
+        writer.start()
+        self.server.add_subscriber(subscriber)
+        try:
+            for raw in self.rfile:
+                command = raw.decode('ascii', errors='replace').split()
+                if command and command[0] == "subscribe":
+                    subscriber.types = set(command[1:]) or None
+        except OSError:
+            pass
+        finally:
+            self.server.remove_subscriber(subscriber)
+            subscriber.close()
+            writer.join()
+
+
+class StreamServer(socketserver.ThreadingTCPServer):
+    """
+    Publish/subscribe server for live measurement data
+
+    Args:
+        address (tuple): (host, port) to listen on; port 0 picks a free port
+        max_queue (int): Messages buffered per subscriber before the oldest are dropped
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 5556), max_queue=256):
+        super().__init__(address, StreamRequestHandler)
+        self.max_queue = max_queue
+        self.seq = 0
+        self.published = 0
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._thread = None
+        # Messages waiting to be encoded; drop-oldest queue in front of the subscribers
+        self._outbox = _Subscriber(max_queue)
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+
+    @property
+    def subscribers(self):
+        return len(self._subscribers)
+
+    @property
+    def pending(self):
+        """Messages published but not yet dispatched to the clients"""
+        return len(self._outbox.messages)
+
+    def add_subscriber(self, subscriber):
+        with self._lock:
+            self._subscribers = self._subscribers + [subscriber]
+
+    def remove_subscriber(self, subscriber):
+        with self._lock:
+            self._subscribers = [s for s in self._subscribers if s is not subscriber]
+
+    def publish(self, kind, **fields):
+        """
+        Send a message to all subscribers without blocking
+
+        Args:
+            kind (str): Message type ("chunk", "status", ...)
+            **fields: Message content; numpy arrays are sent as lists
+        """
+        with self._lock:
+            self.seq += 1
+            seq = self.seq
+        if not self._subscribers:
+            return
+        message = {"type": kind, "seq": seq, "time": time.time()}
+        message.update(fields)
+        self._outbox.put(kind, message)
+
+    def _dispatch(self):
+        while True:
+            item = self._outbox.get()
+            if item is None:
+                return
+            message, dropped = item
+            # Encoded once, shared by all subscriber queues
+            data = (json.dumps(message, default=_encode) + "\n").encode()
+            for subscriber in self._subscribers:
+                if dropped:
+                    with subscriber.ready:
+                        subscriber.dropped += dropped
+                subscriber.put(message["type"], data)
+            self.published += 1
+
+    def publish_chunk(self, source, voltages, currents, timestamps=None, **fields):
+        """Publish a block of measured points (copied, so callers may reuse their arrays)"""
+        if not self._subscribers:
+            return
+        self.publish("chunk", source=source, voltages=np.array(voltages), currents=np.array(currents),
+                     timestamps=None if timestamps is None else np.array(timestamps), **fields)
+
+    def publish_status(self, state, **fields):
+        """Publish a measurement state change (e.g. "running", "done", "error")"""
+        self.publish("status", state=state, **fields)
+
+    def start(self):
+        """Serve in a background thread and return the (host, port) address"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.server_address[:2]
+
+    def stop(self):
+        self.shutdown()
+        self._outbox.close()
+        for subscriber in self._subscribers:
+            subscriber.close()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+class StreamClient:
+    """
+    Subscriber for a StreamServer
+
+    Args:
+        host (str): Server address
+        port (int): Server port
+        types (list, optional): Message types to receive; None for all
+    """
+
+    def __init__(self, host="127.0.0.1", port=5556, types=None):
+        self.socket = socket.create_connection((host, port))
+        if types:
+            self.socket.sendall(("subscribe " + " ".join(types) + "\n").encode())
+        self._file = self.socket.makefile("rb")
+
+    def __iter__(self):
+        """Yield messages as dictionaries until the server closes the connection"""
+        for line in self._file:
+            yield json.loads(line)
+
+    def close(self):
+        self._file.close()
+        self.socket.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Print messages from a live measurement stream")
+    parser.add_argument("--connect", default="127.0.0.1:5556", help="host:port of the stream server")
+    parser.add_argument("--types", nargs="*", help="Message types to receive (default: all)")
+    args = parser.parse_args()
+
+    host, _, port = args.connect.rpartition(":")
+    client = StreamClient(host or "127.0.0.1", int(port), args.types)
+    try:
+        for message in client:
+            if message["type"] == "chunk":
+                print(f"#{message['seq']} chunk from {message['source']}: {len(message['currents'])} points"
+                      + (f", {message['dropped']} messages dropped" if message.get("dropped") else ""))
+            else:
+                print(f"#{message['seq']} {message['type']}: {message}")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
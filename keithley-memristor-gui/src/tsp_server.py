@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Fake Keithley 2602 TSP Server
+Serves the simulated Keithley 2602 (see simulator.py) over a raw TCP socket so the
+real VISA code paths of the application can be exercised end to end without hardware:
+
+    python tsp_server.py --port 5025 --latency 0.001
+
+and then in the GUI or a script:
+
+    Instrument().connect("TCPIP::127.0.0.1::5025::SOCKET")
+
+Every newline-terminated message is executed as TSP (smua/smub attributes, measure
+functions, nvbuffers, printbuffer, the trigger model and loadscript/endscript blocks)
+and each line of output is sent back newline-terminated. All clients share one
+simulated instrument, as they would share a real one.
+"""
+
+import argparse
+import socketserver
+import threading
+import time
+
+from simulator import SimulatedKeithley2602, MemristorModel
+
+
+class TSPRequestHandler(socketserver.StreamRequestHandler):
+    """Handles one client connection: one TSP message per line"""
+
+    def handle(self):
+        server = self.server
+        server.connections += 1
+        try:
+            for raw in self.rfile:
+                message = raw.decode('ascii', errors='replace').rstrip('\r\n')
+                if server.latency:
+                    time.sleep(server.latency)
+                server.messages += 1
+                output = server.device.execute(message)
+                if output:
+                    self.wfile.write("".join(line + "\n" for line in output).encode('ascii'))
+                    self.wfile.flush()
+        except ConnectionError:
+            pass
+        finally:
+            server.connections -= 1
+
+
+class TSPServer(socketserver.ThreadingTCPServer):
+    """
+    Threaded TCP server exposing a SimulatedKeithley2602
+
+    Args:
+        address (tuple): (host, port) to listen on; port 0 picks a free port
+        device (SimulatedKeithley2602, optional): Simulated instrument to serve
+        latency (float): Delay added before executing every received message
+    """
+
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, address=("127.0.0.1", 5025), device=None, latency=0.0):
+        super().__init__(address, TSPRequestHandler)
+        self.device = device or SimulatedKeithley2602()
+        self.latency = latency
+        self.connections = 0
+        self.messages = 0
+        self._thread = None
+
+    @property
+    def resource_name(self):
+        host, port = self.server_address[:2]
+        return f"TCPIP::{host}::{port}::SOCKET"
+
+    def start(self):
+        """Serve in a background thread and return the VISA resource name"""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self.resource_name
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Keithley 2602 TSP server for testing without hardware")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=5025, help="TCP port (5025 is the usual raw socket port)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Delay per received message in seconds")
+    parser.add_argument("--realtime", action="store_true", help="Sleep for the modelled NPLC/delay time of each reading")
+    parser.add_argument("--r-on", type=float, default=1e3, help="Device low resistance state (ohms)")
+    parser.add_argument("--r-off", type=float, default=1e5, help="Device high resistance state (ohms)")
+    parser.add_argument("--v-set", type=float, default=1.0, help="Device SET threshold (V)")
+    parser.add_argument("--v-reset", type=float, default=-1.0, help="Device RESET threshold (V)")
+    parser.add_argument("--noise", type=float, default=0.01, help="Relative current noise")
+    parser.add_argument("--seed", type=int, help="Seed for the noise generator")
+    args = parser.parse_args()
+
+    model = MemristorModel(r_on=args.r_on, r_off=args.r_off, v_set=args.v_set,
+                           v_reset=args.v_reset, noise=args.noise, seed=args.seed)
+    device = SimulatedKeithley2602(model_a=model, realtime=args.realtime)
+    server = TSPServer((args.host, args.port), device, args.latency)
+
+    print(f"Fake Keithley 2602 listening on {server.resource_name}")
+    print("Press Ctrl+C to stop")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping server")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,9 @@
-def save_data_to_csv(filename, voltages, currents, metadata=None):
+from logs import get_logger
+
+log = get_logger("utils")
+
+
+def save_data_to_csv(filename, voltages, currents, metadata=None, cycles=None, segments=None, timestamps=None):
     """
     Save voltage and current data to a CSV file with metadata
     
@@ -7,35 +12,107 @@ def save_data_to_csv(filename, voltages, currents, metadata=None):
         voltages (list): List of voltage values
         currents (list): List of current values
         metadata (dict, optional): Dictionary of metadata to include in the file header
+        cycles (list, optional): Cycle index of each point (waveform sweeps)
+        segments (list, optional): Waveform segment index of each point
+        timestamps (list, optional): Time of each point in seconds, written as a last "Time (s)" column
     """
     import csv
-    import datetime
+    import itertools
 
     try:
         with open(filename, mode='w', newline='') as file:
             writer = csv.writer(file)
+            if timestamps is not None:
+                time_column = ['Time (s)']
+                times = ([f"{t:.6f}"] for t in timestamps)
+            else:
+                time_column = []
+                times = itertools.repeat([])
             
-            # Add header with metadata
-            writer.writerow(['# Keithley 2602 Memristor Measurement'])
-            writer.writerow([f'# Date: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'])
+            if cycles is not None and segments is not None:
+                write_csv_header(writer, ['Cycle', 'Segment', 'Voltage (V)', 'Current (A)'] + time_column, metadata)
+                for n, k, v, c, t in zip(cycles, segments, voltages, currents, times):
+                    writer.writerow([n, k, f"{v:.8e}", f"{c:.8e}"] + t)
+                return True
             
-            # Add custom metadata if provided
-            if metadata:
-                for key, value in metadata.items():
-                    writer.writerow([f'# {key}: {value}'])
-                    
-            writer.writerow(['# '])  # Empty line to separate metadata from data
-            writer.writerow(['Voltage (V)', 'Current (A)'])
+            write_csv_header(writer, ['Voltage (V)', 'Current (A)'] + time_column, metadata)
             
             # Write data points with scientific notation for precision
-            for v, c in zip(voltages, currents):
-                writer.writerow([f"{v:.8e}", f"{c:.8e}"])
+            for v, c, t in zip(voltages, currents, times):
+                writer.writerow([f"{v:.8e}", f"{c:.8e}"] + t)
                 
         return True
     except Exception as e:
-        print(f"Error saving data: {e}")
+        log.error("Error saving data: %s", e)
         return False
 
+def write_csv_header(writer, columns, metadata=None):
+    """
+    Write the metadata header and column names used by all measurement CSV files
+    
+    Args:
+        writer (csv.writer): Writer for the open file
+        columns (list): Column names
+        metadata (dict, optional): Dictionary of metadata to include in the file header
+    """
+    import datetime
+
+    writer.writerow(['# Keithley 2602 Memristor Measurement'])
+    writer.writerow([f'# Date: {datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}'])
+    
+    # Add custom metadata if provided
+    if metadata:
+        for key, value in metadata.items():
+            writer.writerow([f'# {key}: {value}'])
+            
+    writer.writerow(['# '])  # Empty line to separate metadata from data
+    writer.writerow(columns)
+
+def read_csv_header(file):
+    """
+    Read the metadata header and column names of a measurement CSV file
+
+    Args:
+        file: Open text file; left positioned at the first data row
+
+    Returns:
+        tuple: (column names, metadata dict of strings)
+    """
+    import csv
+
+    metadata = {}
+    for line in file:
+        # csv.writer quotes metadata values containing commas, so parse every line as CSV
+        row = next(csv.reader([line]), [])
+        if row and row[0].startswith('#'):
+            key, separator, value = ','.join(row)[1:].strip().partition(': ')
+            if separator:
+                metadata[key] = value
+            continue
+        if any(field.strip() for field in row):
+            return [field.strip() for field in row], metadata
+    raise ValueError(f"No data columns found in {getattr(file, 'name', 'file')}")
+
+def load_data_from_csv(filename):
+    """
+    Read a measurement CSV file written by save_data_to_csv (or a retention run)
+
+    Args:
+        filename (str): Path of the file
+
+    Returns:
+        tuple: (columns, metadata): one numpy array per column name, e.g. "Voltage (V)",
+            "Current (A)", "Cycle", "Time (s)", and the header metadata as strings
+    """
+    import numpy as np
+
+    with open(filename, newline='') as f:
+        names, metadata = read_csv_header(f)
+        data = np.loadtxt(f, delimiter=',', ndmin=2)
+    if data.size == 0:
+        data = np.empty((0, len(names)))
+    return {name: data[:, k] for k, name in enumerate(names)}, metadata
+
 def validate_numerical_input(value):
     """
     Validates if the input string is a valid numerical value (including negative numbers).
@@ -0,0 +1,151 @@
+import numpy as np
+from recipe import SweepRecipe
+
+
+class WaveformSegment:
+    """
+    One linear ramp of a waveform
+
+    Args:
+        start (float): Start voltage in volts
+        stop (float): Stop voltage in volts
+        step (float): Step size in volts; the sign is taken from the start -> stop direction
+        compliance (float, optional): Current limit for this segment; None uses the waveform default
+    """
+
+    def __init__(self, start, stop, step, compliance=None):
+        if step == 0 and start != stop:
+            raise ValueError("Step voltage cannot be zero.")
+        if compliance is not None and compliance <= 0:
+            raise ValueError("Current compliance must be positive.")
+        self.start = float(start)
+        self.stop = float(stop)
+        self.step = abs(float(step))
+        self.compliance = compliance
+
+    def points(self):
+        """Return the voltage points of the segment, including both end points"""
+        from measurement import Measurement
+        step = self.step if self.stop >= self.start else -self.step
+        return Measurement.sweep_points(self.start, self.stop, step)
+
+
+class Waveform:
+    """
+    Arbitrary multi-segment voltage waveform, repeated for a number of cycles
+
+    Segments are joined end to end; where a segment starts at the voltage the
+    previous one stopped at, the shared point is measured only once. The whole
+    waveform is flattened into one list so it runs as a single continuous sweep,
+    with the cycle and segment index of every point kept alongside.
+
+    Args:
+        repetitions (int): Number of cycles
+        compliance (float): Default current limit in amperes for segments without their own
+    """
+
+    def __init__(self, repetitions=1, compliance=0.1):
+        if repetitions < 1:
+            raise ValueError("Number of cycles must be at least 1.")
+        if compliance <= 0:
+            raise ValueError("Current compliance must be positive.")
+        self.repetitions = int(repetitions)
+        self.compliance = float(compliance)
+        self.segments = []
+
+    def add_segment(self, start, stop, step, compliance=None):
+        """Append a start -> stop ramp; returns the waveform so calls can be chained"""
+        self.segments.append(WaveformSegment(start, stop, step, compliance))
+        return self
+
+    @classmethod
+    def bipolar(cls, set_voltage, reset_voltage, step, repetitions=1,
+                set_compliance=0.001, reset_compliance=0.01):
+        """
+        Standard bipolar switching loop: 0 -> SET -> 0 -> RESET -> 0
+
+        Args:
+            set_voltage (float): Positive SET voltage in volts
+            reset_voltage (float): Negative RESET voltage in volts
+            step (float): Step size in volts
+            repetitions (int): Number of cycles
+            set_compliance (float): Current limit during the SET half (A)
+            reset_compliance (float): Current limit during the RESET half (A)
+        """
+        if set_voltage <= 0 or reset_voltage >= 0:
+            raise ValueError("SET voltage must be positive and RESET voltage negative.")
+        waveform = cls(repetitions, compliance=max(set_compliance, reset_compliance))
+        waveform.add_segment(0, set_voltage, step, set_compliance)
+        waveform.add_segment(set_voltage, 0, step, set_compliance)
+        waveform.add_segment(0, reset_voltage, step, reset_compliance)
+        waveform.add_segment(reset_voltage, 0, step, reset_compliance)
+        return waveform
+
+    def cycle(self):
+        """
+        Points of one full cycle
+
+        Returns:
+            tuple: numpy arrays (voltages, compliance, segment index) of the first cycle and
+            the number of leading points that later cycles omit because they repeat the
+            end of the previous cycle
+        """
+        if not self.segments:
+            raise ValueError("Waveform must contain at least one segment.")
+
+        voltages, limits, segment_index = [], [], []
+        last = None
+        for k, segment in enumerate(self.segments):
+            points = segment.points()
+            if last is not None and np.isclose(points[0], last):
+                points = points[1:]
+            if len(points):
+                last = points[-1]
+            voltages.append(points)
+            limits.append(np.full(len(points), segment.compliance or self.compliance))
+            segment_index.append(np.full(len(points), k, dtype=np.int32))
+        voltages = np.concatenate(voltages)
+        first = 1 if np.isclose(voltages[0], voltages[-1]) and len(voltages) > 1 else 0
+        return voltages, np.concatenate(limits), np.concatenate(segment_index), first
+
+    def point_index(self, segment, voltage):
+        """Index within a cycle of the point of `segment` closest to `voltage`"""
+        voltages, _, segments, _ = self.cycle()
+        candidates = np.flatnonzero(segments == segment)
+        if len(candidates) == 0:
+            raise ValueError(f"Waveform has no segment {segment}.")
+        return int(candidates[np.argmin(np.abs(voltages[candidates] - voltage))])
+
+    def segment_range(self, segment):
+        """First and last index within a cycle of the points of `segment`"""
+        _, _, segments, _ = self.cycle()
+        candidates = np.flatnonzero(segments == segment)
+        if len(candidates) == 0:
+            raise ValueError(f"Waveform has no segment {segment}.")
+        return int(candidates[0]), int(candidates[-1])
+
+    def build(self):
+        """
+        Flatten the waveform into per-point arrays
+
+        Returns:
+            tuple: numpy arrays (voltages, compliance, cycle index, segment index)
+        """
+        voltages, limits, segment_index, first = self.cycle()
+        # Later cycles drop their first point if it repeats the end of the previous cycle
+        n = len(voltages)
+        index = np.concatenate([np.arange(n)] + [np.arange(first, n)] * (self.repetitions - 1))
+        cycle_index = np.repeat(np.arange(self.repetitions, dtype=np.int32),
+                                [n] + [n - first] * (self.repetitions - 1))
+        return voltages[index], limits[index], cycle_index, segment_index[index]
+
+    def to_recipe(self, **settings):
+        """
+        Create the sweep recipe running the whole waveform as one list
+
+        Args:
+            **settings: Further SweepRecipe settings (nplc, source_delay, ranges)
+        """
+        voltages, limits, cycles, segments = self.build()
+        return SweepRecipe(voltages, compliance=limits, cycle_index=cycles,
+                           segment_index=segments, **settings)
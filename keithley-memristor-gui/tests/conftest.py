@@ -0,0 +1,26 @@
+"""
+Tests run against the simulated Keithley 2602 (src/simulator.py), so no hardware is needed.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import pytest
+from benchmark import create_instrument
+
+
+@pytest.fixture
+def instrument():
+    """Connected simulated instrument in voltage source / current measurement mode"""
+    instrument, _ = create_instrument()
+    instrument.set_voltage_source_mode()
+    instrument.set_current_measurement_mode()
+    return instrument
+
+
+@pytest.fixture
+def resource(instrument):
+    """Simulated VISA resource of the instrument fixture"""
+    return instrument.instrument
@@ -0,0 +1,63 @@
+import asyncio
+import numpy as np
+import pytest
+from async_instrument import AsyncInstrument
+from tsp_server import TSPServer
+
+
+@pytest.fixture
+def server():
+    server = TSPServer(("127.0.0.1", 0))
+    server.start()
+    yield server
+    server.stop()
+
+
+def run_sweep(resource_name, voltages, **settings):
+    async def main():
+        async with AsyncInstrument() as device:
+            await device.connect(resource_name)
+            await device.configure(compliance=1e-3)
+            return await device.sweep(voltages, **settings)
+    return asyncio.run(main())
+
+
+def test_long_sweep_over_socket(server):
+    voltages = np.linspace(0, 1, 3000)
+    timestamps, measured, currents = run_sweep(server.resource_name, voltages)
+    assert len(timestamps) == len(measured) == len(currents) == 3000
+    np.testing.assert_allclose(measured, voltages, atol=1e-3)
+    assert np.all(np.diff(timestamps) > 0)
+
+
+def test_fetch_in_chunks(server):
+    async def main():
+        async with AsyncInstrument() as device:
+            await device.connect(server.resource_name)
+            await device.configure()
+            await device.sweep(np.linspace(0, 0.5, 25))
+            return await device.fetch(1, 25, chunk=10), await device.fetch(1, 25)
+    chunked, whole = asyncio.run(main())
+    for a, b in zip(chunked, whole):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_stalled_sweep_times_out(server):
+    async def main():
+        async with AsyncInstrument() as device:
+            await device.connect(server.resource_name)
+            await device.configure()
+
+            async def stalled(*args, **kwargs):
+                return 0
+            device.buffered_count = stalled
+            await device.sweep(np.linspace(0, 0.5, 10), timeout=0.2)
+    with pytest.raises(TimeoutError):
+        asyncio.run(main())
+
+
+def test_sweep_timeout_scales_with_settings():
+    device = AsyncInstrument()
+    device.nplc = 10
+    assert device.sweep_timeout(1000) == pytest.approx(1000 * 0.2 * 2 + 10)
+    assert device.sweep_timeout(1000, source_delay=0.01) == pytest.approx(1000 * 0.21 * 2 + 10)
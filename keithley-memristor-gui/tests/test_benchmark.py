@@ -0,0 +1,41 @@
+from benchmark import compare_to_baseline, create_instrument, run_suite
+
+
+def test_suite_reports_every_code_path():
+    results = run_suite(points=20, repeat=1, csv_points=100)
+
+    assert [r["name"] for r in results] == [
+        "connect_and_configure", "set_voltage_measure_current", "voltage_sweep",
+        "cycling_sweep_pipelined", "ramp_voltage", "save_data_to_csv"]
+    for r in results:
+        assert r["points_per_sec"] > 0
+        assert r["peak_memory_kb"] > 0
+
+
+def test_transactions_are_counted_per_point():
+    instrument, resource = create_instrument()
+    instrument.set_voltage_source_mode()
+
+    resource.reset_counters()
+    for k in range(10):
+        instrument.set_voltage(0.01 * k)
+        instrument.measure_current()
+
+    assert resource.transactions == 30
+
+
+def test_baseline_comparison_flags_regressions():
+    baseline = {"results": [
+        {"name": "voltage_sweep", "points_per_sec": 1000.0, "transactions_per_point": 1.0},
+        {"name": "ramp_voltage", "points_per_sec": 1000.0, "transactions_per_point": 1.0},
+    ]}
+    results = [
+        {"name": "voltage_sweep", "points_per_sec": 900.0, "transactions_per_point": 1.1},
+        {"name": "ramp_voltage", "points_per_sec": 500.0, "transactions_per_point": 2.0},
+        {"name": "save_data_to_csv", "points_per_sec": 1.0, "transactions_per_point": 0.0},
+    ]
+
+    regressions = compare_to_baseline(results, baseline, tolerance=0.2)
+
+    assert len(regressions) == 2
+    assert all(r.startswith("ramp_voltage") for r in regressions)
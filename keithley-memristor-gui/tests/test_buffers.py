@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+from buffers import FLAG_COMPLIANCE, AcquisitionBuffer
+
+
+def test_linear_buffer_grows_and_keeps_every_point():
+    buffer = AcquisitionBuffer(4)
+    for k in range(3):
+        buffer.append(0.1 * k, 1e-6 * k, timestamp=k)
+    buffer.extend(np.arange(10.0), np.arange(10.0) * 1e-3, flags=FLAG_COMPLIANCE, cycles=2)
+
+    assert len(buffer) == buffer.total == 13
+    assert buffer.capacity >= 13
+    np.testing.assert_allclose(buffer.voltages[:3], [0.0, 0.1, 0.2])
+    np.testing.assert_array_equal(buffer.voltages[3:], np.arange(10.0))
+    assert np.isnan(buffer.timestamps[3:]).all()
+    np.testing.assert_array_equal(buffer.flags, [0] * 3 + [FLAG_COMPLIANCE] * 10)
+    np.testing.assert_array_equal(buffer.cycles, [0] * 3 + [2] * 10)
+
+
+def test_ring_buffer_keeps_the_latest_points_contiguous():
+    buffer = AcquisitionBuffer(5, ring=True)
+    for k in range(7):
+        buffer.append(k, -k)
+
+    assert len(buffer) == 5
+    assert buffer.total == 7
+    np.testing.assert_array_equal(buffer.voltages, [2, 3, 4, 5, 6])
+    np.testing.assert_array_equal(buffer.currents, [-2, -3, -4, -5, -6])
+    # Columns are views into the ring storage, not copies
+    assert np.shares_memory(buffer.voltages, buffer._voltages)
+
+
+def test_ring_extend_longer_than_capacity():
+    buffer = AcquisitionBuffer(4, ring=True)
+    buffer.append(-1.0, 0.0)
+    buffer.extend(np.arange(10.0), np.zeros(10), segments=np.arange(10) % 2)
+
+    assert len(buffer) == 4
+    assert buffer.total == 11
+    np.testing.assert_array_equal(buffer.voltages, [6, 7, 8, 9])
+    np.testing.assert_array_equal(buffer.segments, [0, 1, 0, 1])
+
+
+def test_clear_and_ring_capacity_validation():
+    buffer = AcquisitionBuffer(3, ring=True)
+    buffer.extend([1.0, 2.0], [0.0, 0.0])
+    buffer.clear()
+    assert len(buffer) == buffer.total == 0
+    assert len(buffer.voltages) == 0
+
+    with pytest.raises(ValueError):
+        AcquisitionBuffer(0, ring=True)
@@ -0,0 +1,135 @@
+import json
+import threading
+import numpy as np
+import pytest
+from checkpoint import ResumableSweep
+from recipe import SweepRecipe
+
+# The simulated 2602 runs at 60 Hz line frequency
+LINE_PERIOD = 1 / 60.0
+
+
+def point_period(buffer):
+    # Median step; chunk boundaries are not contiguous in time
+    return float(np.median(np.diff(buffer.timestamps)))
+
+
+def test_nplc_is_applied(instrument, tmp_path):
+    recipe = SweepRecipe(np.linspace(0, 0.2, 21), nplc=10, compliance=1e-3)
+
+    buffer = ResumableSweep(instrument, recipe, str(tmp_path / "run.checkpoint"), chunk_size=5).run()
+
+    assert len(buffer) == 21
+    assert point_period(buffer) == pytest.approx(10 * LINE_PERIOD, rel=1e-3)
+
+
+def test_resume_after_crash(instrument, tmp_path):
+    path = str(tmp_path / "run.checkpoint")
+    recipe = SweepRecipe(np.linspace(0, 0.3, 31), nplc=5, compliance=1e-3)
+    sweep = ResumableSweep(instrument, recipe, path, chunk_size=5)
+    commit = sweep._commit
+    commits = []
+
+    def crash_after_two(*args):
+        if len(commits) == 2:
+            raise RuntimeError("crash")
+        commits.append(args)
+        commit(*args)
+
+    sweep._commit = crash_after_two
+    with pytest.raises(RuntimeError):
+        sweep.run()
+    with open(path) as file:
+        assert json.load(file)["committed"] == 10
+
+    # A new run on a freshly connected instrument (NPLC back at 1) continues the checkpoint
+    instrument.set_voltage_source_mode()
+    resumed = ResumableSweep(instrument, recipe, path, chunk_size=5)
+    buffer = resumed.run()
+
+    assert resumed.resumed_from == 10
+    assert len(buffer) == 31
+    np.testing.assert_allclose(buffer.voltages, recipe.voltage_points, atol=1e-9)
+    assert float(np.median(np.diff(buffer.timestamps[10:]))) == pytest.approx(5 * LINE_PERIOD, rel=1e-3)
+
+
+def test_reconnect_keeps_nplc_and_records_reconnects(instrument, resource, tmp_path):
+    path = str(tmp_path / "run.checkpoint")
+    recipe = SweepRecipe(np.linspace(0, 0.2, 21), nplc=10, compliance=1e-3)
+    write = resource.write
+    calls = []
+
+    def drop_link_once(message):
+        calls.append(message)
+        if len(calls) == 40:
+            raise ConnectionError("link lost")
+        return write(message)
+
+    resource.write = drop_link_once
+    sweep = ResumableSweep(instrument, recipe, path, chunk_size=5, initial_delay=0)
+    update = sweep.checkpoint.update
+    persisted = []
+
+    def record(**fields):
+        update(**fields)
+        with open(path) as file:
+            persisted.append(json.load(file)["reconnects"])
+
+    sweep.checkpoint.update = record
+    buffer = sweep.run()
+
+    # Reconnecting resets the instrument; the chunks measured afterwards still use NPLC 10
+    assert persisted == [1]
+    assert len(buffer) == 21
+    steps = np.diff(buffer.timestamps)
+    assert np.all(np.isclose(steps[steps > 0], 10 * LINE_PERIOD, rtol=1e-3))
+
+
+def test_stalled_chunk_reconnects_and_resumes(instrument, tmp_path):
+    path = str(tmp_path / "run.checkpoint")
+    recipe = SweepRecipe(np.linspace(0, 0.2, 21), compliance=1e-3)
+    sweep = ResumableSweep(instrument, recipe, path, chunk_size=5, initial_delay=0)
+    sweep.chunk_timeout = lambda points: 0.05
+    buffered_count = instrument.buffered_count
+    reconnect = instrument.reconnect
+    reconnects = []
+
+    # The second chunk never fills its buffer until the link has been re-established
+    def stalled(*args, **kwargs):
+        return 0 if len(sweep.buffer) == 5 and not reconnects else buffered_count(*args, **kwargs)
+
+    def record(*args, **kwargs):
+        reconnects.append(len(sweep.buffer))
+        return reconnect(*args, **kwargs)
+
+    instrument.buffered_count = stalled
+    instrument.reconnect = record
+    buffer = sweep.run()
+
+    assert reconnects == [5]
+    assert len(buffer) == 21
+    np.testing.assert_allclose(buffer.voltages, recipe.voltage_points, atol=1e-9)
+
+
+def test_stop_keeps_committed_points_and_checkpoint(instrument, tmp_path):
+    path = str(tmp_path / "run.checkpoint")
+    recipe = SweepRecipe(np.linspace(0, 0.3, 31), compliance=1e-3)
+    stop = threading.Event()
+    sweep = ResumableSweep(instrument, recipe, path, chunk_size=5, stop_event=stop)
+    commit = sweep._commit
+
+    def stop_after_two(*args):
+        commit(*args)
+        if len(sweep.buffer) == 10:
+            stop.set()
+
+    sweep._commit = stop_after_two
+    buffer = sweep.run()
+
+    assert len(buffer) == 10
+    with open(path) as file:
+        assert json.load(file)["committed"] == 10
+
+    resumed = ResumableSweep(instrument, recipe, path, chunk_size=5)
+    assert len(resumed.run()) == 31
+    assert resumed.resumed_from == 10
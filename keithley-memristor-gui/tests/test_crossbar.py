@@ -0,0 +1,77 @@
+import csv
+import os
+
+import numpy as np
+import pytest
+from crossbar import CrossbarSequencer, DeviceMap, SimulatedSwitchMatrix
+from recipe import SweepRecipe
+from utils import load_data_from_csv, read_csv_header
+
+
+def matrix_for(resource, rows=2, columns=3):
+    return SimulatedSwitchMatrix(rows, columns, row_time=0, column_time=0, device=resource.device, seed=1)
+
+
+def test_plan_visits_the_array_row_by_row():
+    matrix = SimulatedSwitchMatrix(2, 3)
+
+    plan = DeviceMap.grid(2, 3, exclude=[(1, 1)]).plan(matrix)
+
+    # Each row continues from the column the previous one ended at
+    assert [(r, c) for r, c, _ in plan] == [(0, 0), (0, 1), (0, 2), (1, 2), (1, 0)]
+    assert plan[0][2] == "R0C0"
+
+
+def test_every_device_is_measured_and_saved(instrument, resource, tmp_path):
+    matrix = matrix_for(resource)
+    recipe = SweepRecipe(np.linspace(0, 0.5, 11), compliance=1e-3)
+    sequencer = CrossbarSequencer(instrument, matrix, DeviceMap.grid(2, 3), recipe, str(tmp_path),
+                                  metadata={"Wafer": "W1"})
+
+    results = sequencer.run()
+
+    assert [r["status"] for r in results] == ["done"] * 6
+    assert matrix.switches == 6 and matrix.route is None
+    currents = []
+    for r in results:
+        columns, header = load_data_from_csv(r["file"])
+        assert (int(header["Row"]), int(header["Column"]), header["Wafer"]) == (r["row"], r["column"], "W1")
+        currents.append(columns["Current (A)"][-1])
+    # Every cell is its own device, with device-to-device variation
+    assert len(set(currents)) == 6
+    np.testing.assert_allclose(currents, 5e-6, rtol=0.5)
+    with open(tmp_path / "summary.csv", newline="") as file:
+        columns, header = read_csv_header(file)
+        rows = list(csv.reader(file))
+    assert int(header["Devices"]) == 6
+    assert [row[2:4] for row in rows] == [[r["label"], "done"] for r in results]
+
+
+def test_failed_device_is_recorded_and_skipped(instrument, resource, tmp_path):
+    devices = DeviceMap([(0, 0, "A"), (5, 5, "outside"), (0, 1, "B")])
+    recipe = SweepRecipe(np.linspace(0, 0.2, 5), compliance=1e-3)
+
+    results = CrossbarSequencer(instrument, matrix_for(resource), devices, recipe, str(tmp_path)).run()
+
+    assert [(r["label"], r["status"]) for r in results] == [("A", "done"), ("B", "done"), ("outside", "failed")]
+    assert "outside" in results[2]["error"]
+    assert not os.path.exists(results[2]["file"])
+
+
+def test_lost_link_stops_the_run(instrument, resource, tmp_path):
+    matrix = matrix_for(resource)
+    connect = matrix.connect
+
+    def failing(row, column):
+        if (row, column) == (0, 2):
+            raise ConnectionError("link lost")
+        connect(row, column)
+
+    matrix.connect = failing
+    recipe = SweepRecipe(np.linspace(0, 0.2, 5), compliance=1e-3)
+    sequencer = CrossbarSequencer(instrument, matrix, DeviceMap.grid(2, 3), recipe, str(tmp_path))
+
+    with pytest.raises(ConnectionError):
+        sequencer.run()
+    assert [r["label"] for r in sequencer.results] == ["R0C0", "R0C1"]
+    assert os.path.exists(tmp_path / "summary.csv")
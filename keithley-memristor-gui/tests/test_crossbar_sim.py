@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+from crossbar import SimulatedSwitchMatrix
+from crossbar_sim import FLOATING, HALF, THIRD, CrossbarArray
+
+
+def nodal_current(array, row, column, voltage):
+    """Reference: solve Kirchhoff's equations with the selected row driven and column grounded"""
+    g = array.conductance()
+    n, m = array.rows, array.columns
+    laplacian = np.block([[np.diag(g.sum(axis=1)), -g], [-g.T, np.diag(g.sum(axis=0))]])
+    fixed = {row: voltage, n + column: 0.0}
+    free = [k for k in range(n + m) if k not in fixed]
+    potentials = np.zeros(n + m)
+    potentials[list(fixed)] = list(fixed.values())
+    rhs = -laplacian[np.ix_(free, list(fixed))] @ np.array(list(fixed.values()))
+    potentials[free] = np.linalg.solve(laplacian[np.ix_(free, free)], rhs)
+    return float(potentials[:n] @ g[:, column])
+
+
+def test_two_by_two_sneak_path():
+    # The selected cell in parallel with the three others in series: 0.75 R
+    array = CrossbarArray(2, 2, r_off=1e5)
+
+    current = array.read(0, 0, 1.0)[0]
+
+    assert current == pytest.approx(1.0 / 0.75e5)
+    assert array.ideal_current(0, 0, 1.0) == pytest.approx(1e-5)
+
+
+def test_floating_reads_match_a_nodal_solve():
+    array = CrossbarArray(5, 4, variation=0.2, state=np.random.default_rng(0).uniform(size=(5, 4)), seed=0)
+    rows, columns = np.meshgrid(np.arange(5), np.arange(4), indexing="ij")
+
+    currents = array.read(rows.ravel(), columns.ravel(), 0.2)
+
+    expected = [nodal_current(array, r, c, 0.2) for r, c in zip(rows.ravel(), columns.ravel())]
+    np.testing.assert_allclose(currents, expected, rtol=1e-9)
+    # Reads do not change the array
+    np.testing.assert_allclose(array.read(rows.ravel(), columns.ravel(), 0.2), currents)
+
+
+def test_bias_schemes():
+    # A high-resistance cell surrounded by low-resistance ones
+    state = np.ones((8, 8))
+    state[3, 5] = 0.0
+    array = CrossbarArray(8, 8, state=state)
+    ideal = array.ideal_current(3, 5, 0.2)
+
+    floating, half, third = (array.read(3, 5, 0.2, scheme=s)[0] for s in (FLOATING, HALF, THIRD))
+
+    # Floating lines: the sneak paths swamp the selected cell
+    assert floating > 10 * ideal
+    # Driven lines: only the other cells of the selected column add current, at V/2 or V/3
+    assert half == pytest.approx(ideal + 7 * 0.1 / 1e3)
+    assert third == pytest.approx(ideal + 7 * (0.2 / 3) / 1e3)
+    u, w = array.node_voltages(3, 5, 0.2, scheme=HALF)
+    assert u[0, 3] == 0.2 and w[0, 5] == 0.0
+    np.testing.assert_allclose(np.delete(u[0], 3), 0.1)
+
+
+def test_half_selected_cells_are_not_disturbed():
+    array = CrossbarArray(4, 4, scheme=HALF)
+
+    array.apply(1, 2, 1.5, dt=0.1)
+
+    assert array.state[1, 2] > 0.5
+    assert np.count_nonzero(array.state) == 1
+
+
+def test_switch_matrix_routes_the_simulator_to_a_cell(instrument, resource):
+    array = CrossbarArray(4, 4)
+    matrix = SimulatedSwitchMatrix(4, 4, row_time=0, column_time=0, device=resource.device, array=array)
+
+    matrix.connect(2, 1)
+    instrument.set_voltage(0.1)
+    current = instrument.measure_current()
+
+    assert current == pytest.approx(array.read(2, 1, 0.1)[0], rel=1e-4)
+    with pytest.raises(ValueError):
+        SimulatedSwitchMatrix(3, 4, array=array)
+    with pytest.raises(ValueError):
+        array.cell(4, 0)
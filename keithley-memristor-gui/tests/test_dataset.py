@@ -0,0 +1,67 @@
+import csv
+import numpy as np
+from dataset import Dataset, DatasetWriter, convert_csv
+from utils import load_data_from_csv, save_data_to_csv, write_csv_header
+
+
+def test_convert_csv_without_cycle_column(tmp_path):
+    # Retention file layout: time, voltage, current
+    filename = str(tmp_path / "retention.csv")
+    n = 2500
+    with open(filename, "w", newline="") as file:
+        writer = csv.writer(file)
+        write_csv_header(writer, ["Time (s)", "Voltage (V)", "Current (A)"], {"Bias": "0.1 V, constant"})
+        for k in range(n):
+            writer.writerow([f"{k * 0.5:.6f}", "1.00000000e-01", f"{1e-6 * (1 + k % 3):.8e}"])
+
+    data = convert_csv(filename, str(tmp_path / "retention.dataset"), chunk=300)
+
+    assert len(data) == n
+    assert data.cycle_count == 1
+    assert data.metadata["Bias"] == "0.1 V, constant"
+    np.testing.assert_allclose(data.timestamps, np.arange(n) * 0.5)
+    np.testing.assert_allclose(data.currents[:3], [1e-6, 2e-6, 3e-6])
+
+
+def test_convert_csv_keeps_cycles_across_chunks(tmp_path):
+    filename = str(tmp_path / "cycles.csv")
+    cycles = np.repeat(np.arange(7), 40)
+    voltages = np.tile(np.linspace(-1, 1, 40), 7)
+    save_data_to_csv(filename, voltages, voltages * 1e-3, {"Device": "D1"}, cycles, np.zeros(len(cycles), int))
+
+    data = convert_csv(filename, str(tmp_path / "cycles.dataset"), chunk=55)
+
+    assert data.cycle_count == 7
+    np.testing.assert_array_equal(data.cycle_numbers, np.arange(7))
+    np.testing.assert_allclose(data.voltages, voltages)
+
+
+def test_extend_grows_the_last_cycle(tmp_path):
+    path = str(tmp_path / "run.dataset")
+    with DatasetWriter(path) as writer:
+        writer.extend([0.1, 0.1], [1e-6, 2e-6])
+        writer.extend([0.1], [3e-6])
+
+    data = Dataset(path)
+
+    assert data.cycle_count == 1
+    np.testing.assert_allclose(data.cycle(0)[1], [1e-6, 2e-6, 3e-6])
+
+
+def test_csv_round_trip_keeps_time_column(tmp_path):
+    filename = str(tmp_path / "loop.csv")
+    cycles = np.repeat(np.arange(3), 10)
+    voltages = np.tile(np.linspace(-1, 1, 10), 3)
+    timestamps = np.arange(30) * 0.016667
+    save_data_to_csv(filename, voltages, voltages * 1e-3, {"Device": "D1"}, cycles, np.zeros(30, int),
+                     timestamps=timestamps)
+    data = convert_csv(filename, str(tmp_path / "loop.dataset"))
+
+    exported = str(tmp_path / "exported.csv")
+    data.to_csv(exported)
+    columns, header = load_data_from_csv(exported)
+
+    assert list(columns) == ["Cycle", "Segment", "Voltage (V)", "Current (A)", "Time (s)"]
+    assert header["Device"] == "D1"
+    np.testing.assert_allclose(columns["Time (s)"], timestamps, atol=1e-6)
+    np.testing.assert_array_equal(columns["Cycle"], cycles)
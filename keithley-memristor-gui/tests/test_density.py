@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+from matplotlib.figure import Figure
+from density import CycleDensity, DensityView
+from measurement import Measurement
+from waveform import Waveform
+
+
+def test_counts_match_a_reference_histogram():
+    rng = np.random.default_rng(0)
+    voltages = rng.uniform(-1, 1, 5000)
+    currents = 10 ** rng.uniform(-9, -3, 5000)
+    density = CycleDensity((-1, 1), (1e-10, 1e-2), bins=(40, 32))
+
+    # Added in blocks, as the cycles arrive
+    for block in np.array_split(np.arange(5000), 10):
+        density.add(voltages[block], -currents[block])
+
+    expected, _, _ = np.histogram2d(np.log10(currents), voltages, bins=(32, 40),
+                                    range=(np.log10([1e-10, 1e-2]), (-1, 1)))
+    np.testing.assert_array_equal(density.counts, expected)
+    assert (density.points, density.cycles) == (5000, 10)
+
+
+def test_out_of_range_points():
+    density = CycleDensity((0, 1), (1e-9, 1e-3), bins=(10, 6))
+
+    density.add([0.05, 0.05, 0.05, 1.5, -0.5], [0.0, 1e-12, 1.0, 1e-6, 1e-6])
+
+    # Currents clip to the lowest / highest row, voltages outside the range are dropped
+    np.testing.assert_array_equal(density.counts[:, 0], [2, 0, 0, 0, 0, 1])
+    assert density.counts.sum() == 3
+
+
+def test_median_envelope_follows_the_cycles():
+    density = CycleDensity((0, 1), (1e-9, 1e-1), bins=(10, 160))
+    voltages = np.linspace(0.05, 0.95, 10)
+    for scale in np.logspace(-4, -2, 101):
+        density.add(voltages, scale * voltages)
+
+    median = density.envelope(50)
+    np.testing.assert_allclose(median, np.log10(1e-3 * voltages), atol=0.05)
+    assert np.all(density.envelope(10) < median)
+    assert np.all(np.isnan(CycleDensity((0, 1)).envelope(50)))
+
+
+def test_simulated_cycles_are_drawn(instrument):
+    waveform = Waveform.bipolar(1.5, -1.5, 0.1, repetitions=4)
+    density = CycleDensity.for_waveform(waveform, bins=(50, 40))
+    voltages, currents = Measurement(instrument).waveform_sweep(waveform)
+    density.add(voltages, currents, cycles=4)
+
+    view = DensityView(Figure().add_subplot(), density)
+
+    assert density.v_range[0] < -1.5 and density.v_range[1] > 1.5
+    assert density.counts.sum() == len(voltages)
+    np.testing.assert_allclose(view.artist.get_array(), np.log10(1 + density.counts))
+    assert view.ax.get_title() == "I-V Density - 4 Cycles"
+    assert len(view.lines) == 3
+
+
+def test_invalid_ranges():
+    with pytest.raises(ValueError):
+        CycleDensity((1, 0))
+    with pytest.raises(ValueError):
+        CycleDensity((0, 1), (0, 1e-3))
+    with pytest.raises(ValueError):
+        CycleDensity((0, 1), bins=(0, 10))
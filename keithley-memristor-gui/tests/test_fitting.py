@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from fitting import LinearDriftModel, VTEAMModel, fit_batch, fit_cycles, fit_devices, split_cycles
+from measurement import Measurement
+from waveform import Waveform
+
+
+@pytest.fixture
+def cycles(instrument):
+    """Three bipolar cycles of the simulated device (r_on 1 kOhm, r_off 100 kOhm, thresholds +-1 V)"""
+    measurement = Measurement(instrument)
+    waveform = Waveform.bipolar(1.5, -1.5, 0.05, repetitions=3, set_compliance=1e-2, reset_compliance=1e-2)
+    measurement.waveform_sweep(waveform)
+    return split_cycles(measurement.voltages, measurement.currents, measurement.timestamps, measurement.cycles)
+
+
+def test_split_cycles():
+    parts = split_cycles([0, 1, 2, 3, 4], [0, 1, 2, 3, 4], cycles=[0, 0, 1, 1, 1])
+
+    assert [list(v) for v, _, _ in parts] == [[0, 1], [2, 3, 4]]
+    assert np.isnan(parts[0][2]).all()
+    assert len(split_cycles([0, 1], [0, 1])) == 1
+
+
+def test_parameter_transform_round_trip():
+    model = VTEAMModel()
+    params = np.array([[1e3, 1e5, 1.0, -1.0, 10.0, 5.0, 2.0, 3.0, 0.25]])
+
+    np.testing.assert_allclose(model.decode(model.encode(params)), params)
+
+
+def test_fit_recovers_the_simulated_device(cycles):
+    results = fit_cycles(LinearDriftModel(), cycles)
+
+    assert len(results) == 3
+    for result in results:
+        assert result.rmse < 0.02
+        assert result.params["r_on"] == pytest.approx(1e3, rel=0.05)
+        assert result.params["r_off"] == pytest.approx(1e5, rel=0.05)
+        assert result.params["v_set"] == pytest.approx(1.0, abs=0.05)
+        assert result.params["v_reset"] == pytest.approx(-1.0, abs=0.05)
+    # Warm-started cycles begin at the previous fit and need fewer iterations
+    assert results[2].iterations < results[0].iterations
+
+
+def test_batch_fits_cycles_independently(cycles):
+    # The same cycle with twice the current: half the resistances
+    v, i, t = cycles[1]
+    results = fit_batch(LinearDriftModel(), [(v, i, t), (v, 2 * i, t)])
+
+    ratio = results[0].params["r_on"] / results[1].params["r_on"]
+    assert ratio == pytest.approx(2.0, rel=0.05)
+
+
+def test_devices_split_over_processes_keep_their_order(cycles):
+    devices = [cycles[:1], [(v, 2 * i, t) for v, i, t in cycles[:2]], [(v, 4 * i, t) for v, i, t in cycles[:1]]]
+
+    results = fit_devices(LinearDriftModel(), devices, processes=2, max_iter=20)
+
+    expected = fit_devices(LinearDriftModel(), devices, max_iter=20)
+    assert [len(r) for r in results] == [1, 2, 1]
+    for device, reference in zip(results, expected):
+        for result, cycle in zip(device, reference):
+            assert result.params == pytest.approx(cycle.params)
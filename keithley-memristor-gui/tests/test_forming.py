@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+from forming import FormingRoutine
+from instrument import Instrument
+
+
+def test_ramp_stops_on_the_instrument_at_the_current_threshold(instrument, resource):
+    routine = FormingRoutine(instrument, 0.0, 3.0, 0.01, compliance=1e-3, context_points=10)
+    resource.reset_counters()
+
+    result = routine.run()
+
+    assert result.switched
+    # The pristine device (SET at 1 V) switches long before the end of the ramp
+    assert 1.0 <= result.voltage < 2.0
+    assert result.index == round(result.voltage / 0.01) + 1
+    assert abs(result.current) >= 0.9e-3
+    # Only the last points are transferred, all from the same ramp
+    assert len(result.voltages) == 10
+    assert result.voltages[-1] == pytest.approx(result.voltage)
+    assert np.all(np.diff(result.timestamps) > 0)
+    assert resource.transactions < 20
+    assert float(resource.query("print(smua.source.levelv)")) == 0
+
+
+def test_resistance_threshold(instrument):
+    result = FormingRoutine(instrument, 0.0, 3.0, 0.01, compliance=1e-3, current_threshold=1e-2,
+                            resistance_threshold=1e4).run()
+
+    assert result.switched
+    assert result.resistance <= 1e4
+    assert abs(result.current) < 1e-3
+
+
+def test_ramp_without_switching(instrument):
+    result = FormingRoutine(instrument, 0.0, 0.5, 0.01, compliance=1e-3).run()
+
+    assert not result.switched
+    assert result.index == 51
+    assert result.voltage == pytest.approx(0.5)
+
+
+def test_script_is_loaded_once(instrument, monkeypatch):
+    routine = FormingRoutine(instrument, 0.0, 0.2, 0.01)
+    routine.run()
+    loads = []
+    monkeypatch.setattr(instrument, "load_script", lambda *args: loads.append(args))
+
+    routine.run()
+
+    assert loads == []
+
+
+def test_host_ramp_in_simulation_mode():
+    result = FormingRoutine(Instrument(simulation_mode=True), 0.0, 3.0, 0.01, compliance=1e-3).run()
+
+    assert result.switched
+    assert result.index < 301
+
+
+def test_invalid_settings(instrument):
+    with pytest.raises(ValueError):
+        FormingRoutine(instrument, step_voltage=0)
+    with pytest.raises(ValueError):
+        FormingRoutine(instrument, compliance=0)
+    with pytest.raises(ValueError):
+        FormingRoutine(instrument, resistance_threshold=-1)
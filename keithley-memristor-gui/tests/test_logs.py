@@ -0,0 +1,69 @@
+import json
+import logging
+
+import pytest
+import logs
+from instrument import Instrument
+from logs import JsonFormatter, RateLimitFilter, configure_logging, get_logger, point_logger
+from measurement import Measurement
+
+
+@pytest.fixture
+def log_file(tmp_path):
+    """Log file path; the "memristor" loggers are restored afterwards"""
+    root = logging.getLogger(logs.ROOT)
+    saved = (list(root.handlers), root.level, root.propagate, point_logger.level, list(point_logger.filters))
+    yield str(tmp_path / "run.log")
+    logs._stop_listener()
+    root.handlers[:], root.level, root.propagate = saved[:3]
+    point_logger.setLevel(saved[3])
+    point_logger.filters[:] = saved[4]
+
+
+def read_records(filename):
+    logs._stop_listener()
+    with open(filename) as file:
+        return [json.loads(line) for line in file]
+
+
+def test_json_records_carry_extra_fields(log_file):
+    configure_logging("INFO", json_format=True, filename=log_file)
+
+    get_logger("scheduler").info("Job %s done", "abc", extra={"job": "abc", "points": 12})
+    get_logger("scheduler").debug("not logged")
+
+    record, = read_records(log_file)
+    assert record["logger"] == "memristor.scheduler"
+    assert record["message"] == "Job abc done"
+    assert (record["job"], record["points"]) == ("abc", 12)
+
+
+def test_point_logging_is_off_by_default(log_file):
+    configure_logging("DEBUG", json_format=True, filename=log_file)
+
+    Measurement(Instrument(simulation_mode=True)).voltage_sweep(0.0, 0.1, 0.05, 0.0)
+
+    assert not any(r["logger"] == logs.POINTS for r in read_records(log_file))
+
+
+def test_point_records_are_rate_limited(log_file):
+    configure_logging("DEBUG", json_format=True, filename=log_file, point_logging=True, point_interval=60)
+
+    Measurement(Instrument(simulation_mode=True)).voltage_sweep(0.0, 0.1, 0.01, 0.0)
+
+    points = [r for r in read_records(log_file) if r["logger"] == logs.POINTS]
+    assert len(points) == 1
+    assert points[0]["message"].startswith("V = 0.000000 V")
+
+
+def test_rate_limit_counts_suppressed_records(monkeypatch):
+    clock = iter([0.0, 0.05, 0.08, 0.2])
+    monkeypatch.setattr("time.monotonic", lambda: next(clock))
+    limit = RateLimitFilter(interval=0.1)
+    records = [logging.LogRecord(logs.POINTS, logging.DEBUG, "", 0, "V = %f", (k,), None) for k in range(4)]
+
+    passed = [limit.filter(record) for record in records]
+
+    assert passed == [True, False, False, True]
+    assert records[3].suppressed == 2
+    assert '"suppressed": 2' in JsonFormatter().format(records[3])
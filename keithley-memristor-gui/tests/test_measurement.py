@@ -0,0 +1,76 @@
+import itertools
+import numpy as np
+import pytest
+from instrument import Instrument
+from measurement import Measurement
+from recipe import SweepRecipe
+
+# The simulated 2602 runs at 60 Hz line frequency and NPLC 1 after reset
+LINE_PERIOD = 1 / 60.0
+
+
+def test_voltage_sweep_uses_instrument_list_sweep(instrument, resource):
+    instrument.set_current_compliance(1e-3)
+    measurement = Measurement(instrument)
+    resource.reset_counters()
+
+    voltages, currents = measurement.voltage_sweep(0.0, 1.0, 0.01, 0.0)
+
+    assert len(voltages) == len(measurement.timestamps) == 101
+    np.testing.assert_allclose(voltages, np.linspace(0, 1, 101), atol=1e-3)
+    # Instrument timestamps: one reading every NPLC, starting at 0
+    assert measurement.timestamps[0] == 0
+    np.testing.assert_allclose(np.diff(measurement.timestamps), LINE_PERIOD, rtol=1e-3)
+    # Points come back in bulk, not one query per point
+    assert resource.transactions < 101
+
+
+def test_list_sweep_reports_blocks(instrument):
+    measurement = Measurement(instrument)
+    blocks = []
+
+    timestamps, voltages, currents = measurement.list_sweep(
+        np.linspace(0, 0.5, 20), on_points=lambda first, *block: blocks.append((first, len(block[0]))))
+
+    assert sum(n for _, n in blocks) == len(timestamps) == 20
+    assert blocks[0][0] == 0
+
+
+def test_stalled_list_sweep_raises(instrument, monkeypatch):
+    measurement = Measurement(instrument)
+    monkeypatch.setattr(instrument, "buffered_count", lambda *args, **kwargs: 0)
+    monkeypatch.setattr("time.perf_counter", itertools.count(0, 100).__next__)
+
+    with pytest.raises(ConnectionError):
+        measurement.list_sweep(np.linspace(0, 0.5, 5), poll=0)
+
+
+def test_simulation_mode_sweep_measures_on_host():
+    instrument = Instrument(simulation_mode=True)
+    measurement = Measurement(instrument)
+
+    voltages, currents = measurement.voltage_sweep(0.0, 0.2, 0.1, 0.0)
+
+    assert len(voltages) == 3
+    assert np.all(np.isfinite(measurement.timestamps))
+
+
+def test_stopped_recipe_keeps_readings_taken(instrument):
+    recipe = SweepRecipe(np.linspace(0, 0.5, 11), compliance=1e-3)
+    measurement = Measurement(instrument)
+    run_script_sweep = instrument.run_script_sweep
+
+    # The simulator ignores the device clear, so the run completes; the waiting query then fails
+    def aborted(*args, **kwargs):
+        run_script_sweep(*args, **kwargs)
+        measurement.stop()
+        raise ConnectionError("device clear")
+
+    instrument.run_script_sweep = aborted
+    with pytest.raises(ConnectionError):
+        measurement.run_recipe(recipe)
+
+    assert measurement.stopped
+    assert len(measurement.voltages) == 11
+    np.testing.assert_allclose(measurement.voltages, recipe.voltage_points, atol=1e-3)
+    assert np.all(np.diff(measurement.timestamps) > 0)
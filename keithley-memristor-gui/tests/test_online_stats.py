@@ -0,0 +1,70 @@
+import math
+import numpy as np
+import pytest
+from measurement import Measurement
+from online_stats import CampaignStatistics, P2Quantile, RunningStats, cycle_metrics
+from waveform import Waveform
+
+
+def test_running_stats_match_numpy_and_merge():
+    values = np.random.default_rng(1).lognormal(8, 1, 5000)
+    first, second = RunningStats(), RunningStats()
+    for v in values[:2000]:
+        first.add(v)
+    for v in values[2000:]:
+        second.add(v)
+    first.merge(second)
+
+    assert first.count == len(values)
+    assert first.mean == pytest.approx(values.mean())
+    assert first.std == pytest.approx(values.std(ddof=1))
+    assert (first.min, first.max) == (values.min(), values.max())
+
+
+def test_p2_quantile_tracks_the_median():
+    values = np.random.default_rng(2).normal(0, 1, 20000)
+    sketch = P2Quantile(0.5)
+    for v in values:
+        sketch.add(v)
+
+    assert sketch.value == pytest.approx(np.median(values), abs=0.05)
+
+
+def test_cycle_metrics_of_a_bipolar_loop(instrument):
+    measurement = Measurement(instrument)
+    measurement.waveform_sweep(Waveform.bipolar(1.5, -1.5, 0.05, 1, 1e-3, 1e-2))
+
+    metrics = cycle_metrics(measurement.voltages, measurement.currents)
+
+    # Simulated device: 1 kOhm / 100 kOhm, switching beyond +1 V / -1 V
+    assert metrics["hrs"] == pytest.approx(1e5, rel=0.1)
+    assert metrics["lrs"] < 2e3
+    assert 1.0 <= metrics["v_set"] <= 1.5
+    assert -1.5 <= metrics["v_reset"] <= -1.0
+
+
+def test_waveform_sweep_updates_statistics(instrument):
+    statistics = CampaignStatistics()
+    Measurement(instrument).waveform_sweep(Waveform.bipolar(1.5, -1.5, 0.05, 4, 1e-3, 1e-2),
+                                           statistics=statistics)
+
+    snapshot = statistics.snapshot()
+    assert snapshot["cycles"] == 4
+    assert snapshot["yield"] == 1.0
+    summary = statistics.summary()
+    assert summary["Cycles"] == 4
+    assert summary["RATIO median"] > 10
+
+
+def test_cycling_sweep_updates_statistics_per_cycle(instrument):
+    waveform = Waveform.bipolar(1.5, -1.5, 0.1, 1, 1e-2, 1e-2)
+    points = waveform.to_recipe().voltage_points
+    statistics = CampaignStatistics()
+    seen = []
+
+    Measurement(instrument).cycling_sweep(points, 3, on_cycle=lambda cycle, *data: seen.append(statistics.cycles),
+                                          statistics=statistics)
+
+    assert seen == [1, 2, 3]
+    assert statistics.cycles == 3
+    assert not math.isnan(statistics.snapshot()["hrs"]["mean"])
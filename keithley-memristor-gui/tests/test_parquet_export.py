@@ -0,0 +1,90 @@
+import os
+import numpy as np
+import pyarrow.dataset as ds
+import scheduler
+from parquet_export import ParquetExporter, export_csv
+from scheduler import JobQueue, JobScheduler, MeasurementJob, DONE, FAILED
+from utils import save_data_to_csv
+
+
+def read(root, table):
+    return ds.dataset(os.path.join(root, table), partitioning="hive").to_table()
+
+
+def test_exporter_splits_files_and_writes_metadata(tmp_path):
+    root = str(tmp_path / "export")
+    with ParquetExporter(root, "D1", "W3", {"Compliance": 1e-3}, kind="bipolar", run_id="run1",
+                         row_group_rows=40, file_rows=100) as exporter:
+        for cycle in range(5):
+            exporter.write_cycle(cycle, np.linspace(-1, 1, 50), np.linspace(-1e-3, 1e-3, 50), np.arange(50) * 0.01)
+
+    assert exporter.points == 250 and exporter.cycles == 5
+    assert len(exporter.files) == 3
+    assert not any(name.startswith(".") for _, _, names in os.walk(root) for name in names)
+    points = read(root, "points")
+    assert points.num_rows == 250
+    assert set(points.column("device").to_pylist()) == {"D1"}
+    assert sorted(set(points.column("cycle").to_pylist())) == list(range(5))
+    metadata = dict(zip(*(read(root, "metadata").column(name).to_pylist() for name in ("key", "value"))))
+    assert metadata["Compliance"] == "0.001"
+    assert metadata["points"] == "250"
+
+
+def test_export_csv_keeps_cycles_across_chunks(tmp_path):
+    filename = str(tmp_path / "loop.csv")
+    cycles = np.repeat(np.arange(4), 30)
+    voltages = np.tile(np.linspace(-1, 1, 30), 4)
+    save_data_to_csv(filename, voltages, voltages * 1e-3, {"Device": "D7"}, cycles, np.zeros(120, int),
+                     timestamps=np.arange(120) * 0.01)
+
+    exporter = export_csv(filename, str(tmp_path / "export"), wafer="W1", chunk=25)
+
+    assert exporter.points == 120 and exporter.cycles == 4
+    points = read(str(tmp_path / "export"), "points")
+    assert set(points.column("device").to_pylist()) == {"D7"}
+    np.testing.assert_allclose(points.column("timestamp").to_numpy(), np.arange(120) * 0.01)
+
+
+def test_discard_leaves_no_files(tmp_path):
+    root = str(tmp_path / "export")
+    exporter = ParquetExporter(root, "D1", row_group_rows=10, file_rows=20)
+    exporter.write_cycle(0, np.zeros(50), np.zeros(50))
+    exporter.discard()
+
+    assert [name for _, _, names in os.walk(root) for name in names] == []
+
+
+def test_scheduler_exports_checkpointed_job_chunk_by_chunk(instrument, tmp_path, monkeypatch):
+    writes = []
+    write = scheduler.JobExport.write
+
+    def counted(self, *columns):
+        writes.append(len(columns[0]))
+        write(self, *columns)
+
+    monkeypatch.setattr(scheduler.JobExport, "write", counted)
+    queue = JobQueue(str(tmp_path / "queue.json"))
+    job = queue.add(MeasurementJob("sweep", {"start": 0, "stop": 1, "step": 0.001, "compliance": 1e-3},
+                                   device="D3"))
+    root = str(tmp_path / "export")
+
+    JobScheduler(instrument, queue, str(tmp_path / "data"), checkpoint_after=0, parquet=root, wafer="W2").run()
+
+    assert job.status == DONE, job.error
+    assert writes == [200] * 5 + [1]
+    points = read(root, "points")
+    assert points.num_rows == 1001
+    assert set(points.column("run").to_pylist()) == {job.job_id}
+    assert set(points.column("wafer").to_pylist()) == {"W2"}
+
+
+def test_failed_job_leaves_no_export(instrument, tmp_path, monkeypatch):
+    queue = JobQueue(str(tmp_path / "queue.json"))
+    job = queue.add(MeasurementJob("sweep", {"start": 0, "stop": 0.2, "step": 0.02}, device="D4"))
+    monkeypatch.setattr(scheduler, "save_data_to_csv", lambda *args, **kwargs: False)
+    root = str(tmp_path / "export")
+
+    JobScheduler(instrument, queue, str(tmp_path / "data"), parquet=root).run()
+
+    assert job.status == FAILED
+    assert [name for _, _, names in os.walk(root) for name in names] == []
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+from instrument import Instrument
+from pipeline import PipelinedAcquisition
+
+
+def test_cycles_arrive_in_order_from_alternating_buffers(instrument, monkeypatch):
+    read_buffer_iv = instrument.read_buffer_iv
+    buffers = []
+
+    def recording(start, end, buffer="smua.nvbuffer1"):
+        buffers.append(buffer)
+        return read_buffer_iv(start, end, buffer)
+
+    monkeypatch.setattr(instrument, "read_buffer_iv", recording)
+    delivered = []
+    points = np.linspace(0, 0.5, 21)
+    acquisition = PipelinedAcquisition(instrument, points, cycles=4,
+                                       on_chunk=lambda cycle, *arrays: delivered.append(cycle))
+
+    buffer = acquisition.run()
+
+    assert delivered == [0, 1, 2, 3]
+    assert acquisition.cycles_completed == 4
+    assert buffers == list(PipelinedAcquisition.BUFFERS) * 2
+    assert len(buffer) == 84
+    # Measured voltages follow the sourced ones
+    np.testing.assert_allclose(buffer.voltages, np.tile(points, 4), atol=1e-3)
+
+
+def test_unbounded_run_stops_and_keeps_the_latest_points(instrument):
+    acquisition = PipelinedAcquisition(instrument, np.linspace(0, 0.2, 10), capacity=25)
+
+    def stop_after_five(cycle, *arrays):
+        if cycle == 4:
+            acquisition.stop()
+
+    acquisition.on_chunk = stop_after_five
+    buffer = acquisition.run()
+
+    assert acquisition.cycles_completed >= 5
+    assert len(buffer) == 25
+    assert buffer.total == 10 * acquisition.cycles_completed
+
+
+def test_readout_error_shuts_down_and_raises(instrument, monkeypatch):
+    def failing(*args, **kwargs):
+        raise ConnectionError("bus error")
+
+    monkeypatch.setattr(instrument, "read_buffer_iv", failing)
+
+    with pytest.raises(ConnectionError):
+        PipelinedAcquisition(instrument, np.linspace(0, 0.2, 10), cycles=3).run()
+    assert float(instrument.instrument.query("print(smua.source.output)")) == 0
+
+
+def test_host_cycles_in_simulation_mode():
+    acquisition = PipelinedAcquisition(Instrument(simulation_mode=True), [0.0, 0.1, 0.2], cycles=2)
+
+    buffer = acquisition.run()
+
+    assert len(buffer) == 6
+    assert np.all(np.diff(buffer.timestamps) > 0)
+
+
+def test_invalid_settings():
+    instrument = Instrument(simulation_mode=True)
+    with pytest.raises(ValueError):
+        PipelinedAcquisition(instrument, [])
+    with pytest.raises(ValueError):
+        PipelinedAcquisition(instrument, [0.0, 0.1], cycles=0)
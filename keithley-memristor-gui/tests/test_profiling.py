@@ -0,0 +1,90 @@
+import pstats
+import time
+
+import pytest
+from measurement import Measurement
+from profiling import PerformanceMonitor, Profiler, TkLoopMonitor
+
+
+def test_points_per_second_over_the_window(monkeypatch):
+    clock = iter([0.0, 2.0, 3.0, 3.0])
+    monkeypatch.setattr("time.perf_counter", lambda: next(clock))
+    monitor = PerformanceMonitor(window=2.0)
+
+    monitor.add_points(100)
+    monitor.add_points(50)
+    monitor.add_points(30)
+
+    # The first block fell out of the 2 s window
+    assert monitor.points_per_second() == pytest.approx(40.0)
+    assert monitor.total_points == 180
+
+
+def test_snapshot_timings_and_gauges():
+    monitor = PerformanceMonitor(samples=2)
+    for seconds in (0.5, 0.002, 0.004):
+        monitor.record("frame", seconds)
+    with monitor.timed("bus"):
+        time.sleep(0.01)
+    monitor.add_gauge("queue", lambda: 3)
+    monitor.add_gauge("broken", lambda: 1 / 0)
+
+    snapshot = monitor.snapshot()
+
+    assert snapshot["frame_mean"] == pytest.approx(0.003)
+    assert snapshot["frame_max"] == pytest.approx(0.004)
+    assert snapshot["bus_mean"] >= 0.01
+    assert snapshot["loop_mean"] is None
+    assert snapshot["queue"] == 3
+    assert snapshot["broken"].startswith("error:")
+    assert "queue:" in monitor.format()
+
+
+def test_profiler_accumulates_measurement_runs(instrument, tmp_path):
+    profiler = Profiler()
+    measurement = Measurement(instrument)
+
+    assert profiler.call(measurement.voltage_sweep, 0.0, 0.2, 0.1, 0.0) is not None
+    assert profiler.runs == 0
+    profiler.enabled = True
+    for _ in range(2):
+        profiler.call(measurement.voltage_sweep, 0.0, 0.2, 0.1, 0.0)
+
+    assert profiler.summary().startswith("2 profiled run(s)")
+    assert "voltage_sweep" in profiler.summary()
+    filename = str(tmp_path / "run.prof")
+    profiler.export(filename)
+    assert any(name == "voltage_sweep" for _, _, name in pstats.Stats(filename).stats)
+
+    profiler.reset()
+    with pytest.raises(ValueError):
+        profiler.export(filename)
+
+
+class FakeMaster:
+    """Records after() callbacks instead of running a Tk event loop"""
+
+    def __init__(self):
+        self.callbacks = {}
+
+    def after(self, interval, callback):
+        job = len(self.callbacks)
+        self.callbacks[job] = callback
+        return job
+
+    def after_cancel(self, job):
+        del self.callbacks[job]
+
+
+def test_loop_latency_is_the_delay_beyond_the_interval():
+    master = FakeMaster()
+    monitor = PerformanceMonitor()
+    loop = TkLoopMonitor(master, monitor, interval=10)
+
+    loop.start()
+    time.sleep(0.05)
+    master.callbacks[0]()
+    loop.stop()
+
+    assert monitor.snapshot()["loop_max"] >= 0.035
+    assert list(master.callbacks) == [0]
@@ -0,0 +1,35 @@
+import numpy as np
+from measurement import Measurement
+from recipe import RecipeCache, SweepRecipe
+
+
+def user_scripts(resource):
+    return int(float(resource.query("_n = 0 for _ in pairs(script.user.scripts) do _n = _n + 1 end print(_n)")))
+
+
+def test_cached_recipe_is_loaded_once(instrument, resource):
+    cache = RecipeCache()
+    recipe = SweepRecipe(np.linspace(0, 0.5, 11), compliance=1e-3)
+    measurement = Measurement(instrument)
+
+    measurement.run_recipe(recipe, cache)
+    resource.reset_counters()
+    voltages, currents = measurement.run_recipe(SweepRecipe(np.linspace(0, 0.5, 11), compliance=1e-3), cache)
+
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert user_scripts(resource) == 1
+    np.testing.assert_allclose(voltages, recipe.voltage_points, atol=1e-3)
+    # A cached run is a ramp, one call with a bulk transfer and a ramp back; no script upload
+    assert resource.bytes_written < 2000
+
+
+def test_eviction_deletes_scripts_on_the_instrument(instrument, resource):
+    cache = RecipeCache(max_entries=2)
+    for stop in (0.3, 0.4, 0.5):
+        cache.prepare(instrument, SweepRecipe(np.linspace(0, stop, 5), compliance=1e-3))
+
+    assert len(cache) == 2
+    assert user_scripts(resource) == 2
+
+    cache.clear(instrument)
+    assert user_scripts(resource) == 0
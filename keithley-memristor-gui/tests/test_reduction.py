@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+from instrument import Instrument
+from reduction import ReducedCycling
+from waveform import Waveform
+
+READS = {"hrs": (0, 0.2), "lrs": (1, 0.2)}
+THRESHOLDS = {"set": (0, 5e-5, True), "reset": (2, 5e-5, False)}
+
+
+def bipolar(repetitions):
+    return Waveform.bipolar(1.5, -1.5, 0.1, repetitions=repetitions, set_compliance=1e-3, reset_compliance=1e-2)
+
+
+def test_instrument_reduction_matches_the_host_one(instrument, resource):
+    cycling = ReducedCycling(instrument, bipolar(5), READS, THRESHOLDS)
+    resource.reset_counters()
+
+    summaries = cycling.run()
+
+    assert [s.cycle for s in summaries] == [0, 1, 2, 3, 4]
+    # A few numbers per cycle cross the bus instead of 60 readings
+    assert cycling.bytes_transferred < 5 * 100
+    (currents,) = instrument.read_buffer_columns(1, 61 + 4 * 60, ("smua.nvbuffer1.readings",))
+    expected = cycling.reduce(currents, 5)
+    for summary, row in zip(summaries, expected):
+        assert (summary.minimum, summary.maximum) == pytest.approx(tuple(row[:2]), rel=1e-5)
+        assert (summary.reads["hrs"], summary.reads["lrs"]) == pytest.approx(tuple(row[2:4]), rel=1e-5)
+        assert summary.thresholds["set"] == pytest.approx(cycling.voltages[int(row[4])])
+        assert summary.thresholds["reset"] == pytest.approx(cycling.voltages[int(row[5])])
+        # The simulated device switches: low resistance on the way back
+        assert summary.resistance("hrs", 0.2) > summary.resistance("lrs", 0.2)
+        assert 0 < summary.thresholds["set"] <= 1.5
+        assert -1.5 <= summary.thresholds["reset"] < 0
+
+
+def test_cycles_are_run_in_batches_that_fit_the_buffer(instrument):
+    batches = []
+    cycling = ReducedCycling(instrument, bipolar(5), READS, capacity=130)
+
+    cycling.run(on_batch=lambda summaries: batches.append([s.cycle for s in summaries]))
+
+    assert cycling.batch_cycles == 2
+    assert batches == [[0, 1], [2, 3], [4]]
+    assert cycling.last_batch == (4, 1)
+    with pytest.raises(ValueError):
+        cycling.raw(3)
+
+
+def test_raw_readings_decimated_on_the_instrument(instrument):
+    cycling = ReducedCycling(instrument, bipolar(3))
+    cycling.run()
+
+    currents = cycling.raw(2)
+    decimated = cycling.raw(2, decimate=7)
+
+    assert len(currents) == 60
+    bins = [currents[k:k + 7] for k in range(0, 60, 7)]
+    np.testing.assert_allclose(decimated, [f(b) for b in bins for f in (np.min, np.max)], rtol=1e-5)
+
+
+def test_host_reduction_in_simulation_mode():
+    cycling = ReducedCycling(Instrument(simulation_mode=True), bipolar(2), READS, THRESHOLDS)
+
+    summaries = cycling.run()
+
+    assert len(summaries) == 2
+    assert summaries[1].maximum == pytest.approx(cycling.raw(1).max())
+
+
+def test_invalid_threshold(instrument):
+    with pytest.raises(ValueError):
+        ReducedCycling(instrument, bipolar(1), thresholds={"set": (0, 0, True)})
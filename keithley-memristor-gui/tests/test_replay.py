@@ -0,0 +1,55 @@
+import time
+
+import numpy as np
+import pytest
+from measurement import Measurement
+from replay import Recording, ReplayModel, connect_replay
+from utils import save_data_to_csv
+
+
+def test_recorded_sweep_replays_through_the_instrument(instrument, tmp_path):
+    recorded = Measurement(instrument)
+    voltages, currents = recorded.voltage_sweep(0.0, 1.0, 0.05, 0.0)
+    filename = str(tmp_path / "run.csv")
+    save_data_to_csv(filename, voltages, currents, timestamps=recorded.timestamps)
+
+    replay, model = connect_replay(filename)
+    replay.set_voltage_source_mode()
+    replayed_voltages, replayed_currents = Measurement(replay).voltage_sweep(0.0, 1.0, 0.05, 0.0)
+
+    np.testing.assert_allclose(replayed_currents, currents, rtol=1e-5)
+    np.testing.assert_allclose(replayed_voltages, voltages, atol=1e-3)
+    assert (model.replayed, model.mismatches) == (21, 0)
+
+
+def test_playback_follows_the_recorded_time():
+    recording = Recording(np.zeros(11), np.arange(11.0), timestamps=np.linspace(0, 1, 11))
+    model = ReplayModel(recording, speed=10)
+
+    start = time.perf_counter()
+    currents = [model.current(0.0, 0.0) for _ in range(11)]
+
+    assert time.perf_counter() - start >= 0.09
+    assert currents == list(range(11))
+
+
+def test_end_of_recording_loops_or_stops():
+    recording = Recording([0.1, 0.2], [1.0, 2.0])
+
+    looping = ReplayModel(recording)
+    assert [looping.current(v, 0.0) for v in (0.1, 0.2, 0.1)] == [1.0, 2.0, 1.0]
+    assert looping.mismatches == 0
+
+    once = ReplayModel(recording, loop=False)
+    assert [once.current(0.5, 0.0) for _ in range(3)] == [1.0, 2.0, 0.0]
+    # 0.5 V was programmed where 0.1 V and 0.2 V were recorded
+    assert once.mismatches == 2
+
+
+def test_invalid_recordings():
+    with pytest.raises(ValueError):
+        Recording([0.0], [1.0, 2.0])
+    with pytest.raises(ValueError):
+        Recording([], [])
+    with pytest.raises(ValueError):
+        ReplayModel(Recording([0.0], [1.0]), speed=0)
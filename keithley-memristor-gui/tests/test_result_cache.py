@@ -0,0 +1,96 @@
+import time
+
+import pytest
+from forming import FormingRoutine
+from result_cache import ResultCache, probe_state, state_fingerprint
+from scheduler import DONE, JobQueue, JobScheduler, MeasurementJob
+
+SWEEP = {"start": 0, "stop": 0.2, "step": 0.02, "compliance": 1e-3}
+
+
+def test_fingerprint_quantizes_the_resistance():
+    assert state_fingerprint(1.0e5) == state_fingerprint(1.02e5) == "5.000"
+    assert state_fingerprint(1.0e3) == "3.000"
+    assert state_fingerprint(float("inf")) == state_fingerprint(0) == "open"
+
+
+def test_probe_reads_the_simulated_device(instrument):
+    assert probe_state(instrument) == pytest.approx(1e5, rel=0.05)
+    FormingRoutine(instrument, 0.0, 3.0, 0.01, compliance=1e-3).run()
+    assert probe_state(instrument) < 1e4
+
+
+def test_lookup_checks_key_age_and_output(tmp_path):
+    output = tmp_path / "run.csv"
+    output.write_text("data")
+    cache = ResultCache()
+    cache.store("D1", "abc", "5.000", str(output), job="j1", resistance=1e5)
+
+    entry = cache.lookup("D1", "abc", "5.000")
+    assert (entry["job"], entry["hits"], entry["info"]) == ("j1", 1, {"resistance": 1e5})
+    assert cache.lookup("D1", "abc", "3.000") is None
+    assert cache.lookup("D2", "abc", "5.000") is None
+    time.sleep(0.01)
+    assert cache.lookup("D1", "abc", "5.000", max_age=0.001) is None
+    output.unlink()
+    assert cache.lookup("D1", "abc", "5.000") is None
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_expired_entries_are_dropped(tmp_path):
+    cache = ResultCache(ttl=0.01)
+    cache.store("D1", "abc", "5.000", None)
+    cache.store("D2", "abc", "5.000", None, ttl=60)
+
+    time.sleep(0.02)
+
+    assert cache.prune() == 1
+    assert [e["device"] for e in cache.entries()] == ["D2"]
+
+
+def test_least_recently_used_are_evicted_and_the_cache_persists(tmp_path):
+    path = str(tmp_path / "cache.json")
+    cache = ResultCache(path, max_entries=2)
+    for device in ("D1", "D2"):
+        cache.store(device, "abc", "5.000", None)
+    cache.lookup("D1", "abc", "5.000")
+    cache.store("D3", "abc", "5.000", None)
+
+    reloaded = ResultCache(path, max_entries=2)
+
+    assert [e["device"] for e in reloaded.entries()] == ["D1", "D3"]
+    reloaded.invalidate("D1")
+    assert [e["device"] for e in ResultCache(path).entries()] == ["D3"]
+
+
+def test_scheduler_reuses_the_result_of_an_unchanged_device(instrument, tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.json"))
+    first = queue.add(MeasurementJob("sweep", SWEEP, device="D1"))
+    second = queue.add(MeasurementJob("sweep", SWEEP, device="D1"))
+    opted_out = queue.add(MeasurementJob("sweep", dict(SWEEP, cache=0), device="D1"))
+    cache = ResultCache(str(tmp_path / "cache.json"))
+
+    JobScheduler(instrument, queue, str(tmp_path / "data"), result_cache=cache).run()
+
+    assert [job.status for job in (first, second, opted_out)] == [DONE] * 3
+    assert first.cache["hit"] is False
+    assert second.cache["hit"] is True and second.cache["source_job"] == first.job_id
+    assert second.output == first.output
+    assert opted_out.output != first.output
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_switched_device_is_measured_again(instrument, tmp_path):
+    queue = JobQueue(str(tmp_path / "queue.json"))
+    cache = ResultCache()
+    scheduler = JobScheduler(instrument, queue, str(tmp_path / "data"), result_cache=cache)
+    first = queue.add(MeasurementJob("sweep", SWEEP, device="D1"))
+    scheduler.run()
+
+    FormingRoutine(instrument, 0.0, 3.0, 0.01, compliance=1e-3).run()
+    second = queue.add(MeasurementJob("sweep", SWEEP, device="D1"))
+    scheduler.run()
+
+    assert second.cache["hit"] is False
+    assert second.cache["fingerprint"] != first.cache["fingerprint"]
+    assert second.output != first.output
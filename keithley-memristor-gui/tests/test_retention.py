@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from instrument import Instrument
+from retention import MultiResolutionSummary, RetentionMeasurement
+from utils import load_data_from_csv
+
+
+def test_summary_bins_min_max_mean_per_level():
+    summary = MultiResolutionSummary(factor=10, levels=2, capacity=100)
+    times = np.arange(1000.0)
+    # Added in uneven blocks: incomplete bins carry over between calls
+    for block in np.array_split(np.arange(1000), 7):
+        summary.add(times[block], times[block])
+
+    t, lo, hi, mean = summary.series(max_points=100)
+    assert len(t) == 100
+    np.testing.assert_allclose(lo, np.arange(0, 1000, 10))
+    np.testing.assert_allclose(hi, np.arange(9, 1000, 10))
+    np.testing.assert_allclose(mean, np.arange(4.5, 1000, 10))
+
+    # Too many level-0 bins: the coarser level covers the whole run
+    t, lo, hi, mean = summary.series(max_points=50)
+    assert len(t) == 10
+    np.testing.assert_allclose(mean, np.arange(49.5, 1000, 100))
+
+
+def test_summary_memory_is_bounded():
+    summary = MultiResolutionSummary(factor=2, levels=3, capacity=8)
+    summary.add(np.arange(1000.0), np.ones(1000))
+
+    assert summary.samples == 1000
+    assert all(level.size <= 8 for level in summary.levels)
+    # No level holds the whole run, so the coarsest one is returned
+    assert len(summary.series(max_points=8)[0]) == 8
+
+
+def test_buffered_retention_streams_full_rate_data(instrument, tmp_path):
+    filename = str(tmp_path / "retention.csv")
+    chunks = []
+    retention = RetentionMeasurement(instrument, 0.2, 0.02, duration=10.0, filename=filename,
+                                     chunk_size=200, on_chunk=lambda t, c: chunks.append(len(t)))
+
+    summary = retention.run()
+
+    assert retention.samples == summary.samples == sum(chunks) == 500
+    columns, header = load_data_from_csv(filename)
+    assert float(header["Bias Voltage (V)"]) == 0.2
+    assert len(columns["Current (A)"]) == 500
+    # Instrument-timed readings, one per sampling interval
+    np.testing.assert_allclose(np.diff(columns["Time (s)"])[:199], 0.02, atol=1e-5)
+    np.testing.assert_allclose(columns["Current (A)"], 2e-6, rtol=0.1)
+    assert float(instrument.instrument.query("print(smua.source.levelv)")) == 0
+
+
+def test_host_timed_retention_in_simulation_mode():
+    retention = RetentionMeasurement(Instrument(simulation_mode=True), 0.1, 0.001, duration=0.02)
+
+    retention.run()
+
+    assert retention.samples == 20
+
+
+def test_invalid_interval():
+    with pytest.raises(ValueError):
+        RetentionMeasurement(Instrument(simulation_mode=True), 0.1, 0)
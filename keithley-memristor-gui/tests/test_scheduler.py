@@ -0,0 +1,83 @@
+import json
+import numpy as np
+import pytest
+import checkpoint
+from scheduler import JobQueue, JobScheduler, MeasurementJob, DONE
+from utils import load_data_from_csv
+
+SWEEP = {"start": 0, "stop": 0.2, "step": 0.02, "compliance": 1e-3}
+
+
+@pytest.fixture
+def queue(tmp_path):
+    return JobQueue(str(tmp_path / "queue.json"))
+
+
+@pytest.fixture
+def resumable_runs(monkeypatch):
+    """Count the runs that go through ResumableSweep"""
+    runs = []
+    run = checkpoint.ResumableSweep.run
+
+    def counted(self):
+        runs.append(self)
+        return run(self)
+
+    monkeypatch.setattr(checkpoint.ResumableSweep, "run", counted)
+    return runs
+
+
+def test_short_job_uses_cached_recipe(instrument, queue, tmp_path, resumable_runs):
+    job = queue.add(MeasurementJob("sweep", SWEEP, device="D1"))
+    scheduler = JobScheduler(instrument, queue, str(tmp_path / "data"))
+
+    scheduler.run()
+
+    assert job.status == DONE, job.error
+    assert resumable_runs == []
+    assert scheduler.recipe_cache.misses == 1
+
+
+def test_long_job_is_checkpointed_with_its_nplc(instrument, queue, tmp_path, resumable_runs):
+    job = queue.add(MeasurementJob("sweep", dict(SWEEP, nplc=10), device="D1"))
+    scheduler = JobScheduler(instrument, queue, str(tmp_path / "data"), checkpoint_after=0)
+
+    scheduler.run()
+
+    assert job.status == DONE, job.error
+    assert len(resumable_runs) == 1
+    columns, header = load_data_from_csv(job.output)
+    assert len(columns["Current (A)"]) == 11
+    assert float(np.median(np.diff(columns["Time (s)"]))) == pytest.approx(10 / 60.0, rel=1e-3)
+
+
+def test_existing_checkpoint_forces_resumable_run(instrument, queue, tmp_path, resumable_runs):
+    output = tmp_path / "data"
+    output.mkdir()
+    job = queue.add(MeasurementJob("sweep", SWEEP, device="D1"))
+    # Left by an interrupted run of another recipe: the job starts over, checkpointed
+    (output / f"{job.job_id}.checkpoint").write_text(json.dumps({"key": "stale", "committed": 0}))
+    scheduler = JobScheduler(instrument, queue, str(output))
+
+    scheduler.run()
+
+    assert job.status == DONE, job.error
+    assert len(resumable_runs) == 1
+    assert not (output / f"{job.job_id}.checkpoint").exists()
+
+
+def test_bipolar_job_records_statistics(instrument, queue, tmp_path):
+    job = queue.add(MeasurementJob("bipolar", {"set_voltage": 1.5, "reset_voltage": -1.5, "step": 0.05,
+                                               "cycles": 3}, device="D2"))
+    scheduler = JobScheduler(instrument, queue, str(tmp_path / "data"))
+
+    scheduler.run()
+
+    assert job.status == DONE, job.error
+    assert job.statistics["cycles"] == 3
+    assert job.statistics["yield"] == 1.0
+    _, header = load_data_from_csv(job.output)
+    assert header["Cycles"] == "3"
+    assert float(header["Yield (%)"]) == 100.0
+    # The snapshot is saved with the queue
+    assert JobQueue(queue.path).jobs[0].statistics["cycles"] == 3
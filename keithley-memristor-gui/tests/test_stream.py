@@ -0,0 +1,72 @@
+import time
+
+import numpy as np
+import pytest
+from measurement import Measurement
+from stream import StreamClient, StreamServer, _Subscriber
+
+
+@pytest.fixture
+def server():
+    server = StreamServer(("127.0.0.1", 0))
+    server.start()
+    yield server
+    server.stop()
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def receive(client, count):
+    messages = iter(client)
+    return [next(messages) for _ in range(count)]
+
+
+def test_clients_watch_a_cycling_run(instrument, server):
+    clients = [StreamClient(*server.server_address[:2]) for _ in range(2)]
+    wait_for(lambda: server.subscribers == 2)
+    measurement = Measurement(instrument, stream=server)
+
+    measurement.cycling_sweep(np.linspace(0, 0.5, 11), 3)
+
+    for client in clients:
+        with client.socket:
+            messages = receive(client, 5)
+        assert [m["type"] for m in messages] == ["status", "chunk", "chunk", "chunk", "status"]
+        assert [m["state"] for m in (messages[0], messages[-1])] == ["running", "done"]
+        assert [m["cycle"] for m in messages[1:4]] == [0, 1, 2]
+        np.testing.assert_allclose(messages[1]["voltages"], np.linspace(0, 0.5, 11), atol=1e-3)
+        assert np.all(np.diff([m["seq"] for m in messages]) > 0)
+
+
+def test_subscription_filters_message_types(server):
+    client = StreamClient(*server.server_address[:2], types=["status"])
+    wait_for(lambda: server.subscribers == 1 and server._subscribers[0].types is not None)
+
+    server.publish_chunk("sweep", [0.0, 0.1], [0.0, 1e-6])
+    server.publish_status("done")
+
+    with client.socket:
+        message, = receive(client, 1)
+    assert (message["type"], message["state"]) == ("status", "done")
+
+
+def test_slow_subscriber_drops_the_oldest_messages():
+    subscriber = _Subscriber(max_queue=3)
+    for k in range(5):
+        subscriber.put("chunk", k)
+
+    assert subscriber.get() == (2, 2)
+    assert subscriber.get() == (3, 0)
+
+
+def test_publishing_without_subscribers_does_not_queue(server):
+    server.publish_chunk("sweep", np.zeros(1000), np.zeros(1000))
+    server.publish_status("done")
+
+    assert server.pending == 0
+    assert server.seq == 1
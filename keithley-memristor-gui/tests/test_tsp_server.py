@@ -0,0 +1,55 @@
+import socket
+
+import pytest
+from tsp_server import TSPServer
+
+
+@pytest.fixture
+def server():
+    server = TSPServer(("127.0.0.1", 0))
+    server.start()
+    yield server
+    server.stop()
+
+
+def connect(server):
+    client = socket.create_connection(server.server_address[:2], timeout=5)
+    return client, client.makefile("rwb")
+
+
+def send(stream, message):
+    stream.write((message + "\n").encode("ascii"))
+    stream.flush()
+
+
+def test_resource_name_is_a_visa_socket(server):
+    host, port = server.server_address[:2]
+    assert server.resource_name == f"TCPIP::{host}::{port}::SOCKET"
+
+
+def test_measures_the_simulated_device(server):
+    client, stream = connect(server)
+    with client:
+        send(stream, "smua.source.levelv = 0.5")
+        send(stream, "smua.source.output = 1")
+        send(stream, "print(smua.measure.i())")
+        current = float(stream.readline())
+
+    # Pristine device in its high resistance state (100 kOhm)
+    assert current == pytest.approx(5e-6, rel=0.1)
+
+
+def test_clients_share_one_instrument(server):
+    first, first_stream = connect(server)
+    second, second_stream = connect(server)
+    with first, second:
+        send(first_stream, "loadscript shared")
+        send(first_stream, "answer = 6 * 7")
+        send(first_stream, "endscript")
+        send(first_stream, "shared()")
+        send(first_stream, "print(answer)")
+        assert float(first_stream.readline()) == 42
+        send(second_stream, "print(answer)")
+        assert float(second_stream.readline()) == 42
+        assert server.connections == 2
+        assert server.messages == 6
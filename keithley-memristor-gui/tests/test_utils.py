@@ -0,0 +1,39 @@
+import numpy as np
+from utils import save_data_to_csv, load_data_from_csv
+
+
+def test_round_trip_with_comma_in_metadata(tmp_path):
+    # Like the GUI's bipolar save: csv.writer quotes this header line
+    metadata = {"Waveform Segments": "0 -> 1.5 V step 0.05 V, compliance 0.001 A; 1.5 -> 0 V",
+                "Device": "W3-D12"}
+    filename = str(tmp_path / "loop.csv")
+    voltages = np.array([0.0, 0.5, 1.0, 0.5])
+    currents = np.array([0.0, 1e-6, 1e-3, 2e-4])
+    assert save_data_to_csv(filename, voltages, currents, metadata, [0, 0, 1, 1], [0, 1, 0, 1])
+
+    columns, header = load_data_from_csv(filename)
+
+    assert header["Waveform Segments"] == metadata["Waveform Segments"]
+    assert header["Device"] == "W3-D12"
+    assert list(columns) == ["Cycle", "Segment", "Voltage (V)", "Current (A)"]
+    np.testing.assert_allclose(columns["Voltage (V)"], voltages)
+    np.testing.assert_allclose(columns["Current (A)"], currents)
+    np.testing.assert_array_equal(columns["Cycle"], [0, 0, 1, 1])
+
+
+def test_timestamps_are_saved(tmp_path):
+    filename = str(tmp_path / "sweep.csv")
+    assert save_data_to_csv(filename, [0.0, 0.1], [0.0, 1e-6], timestamps=[0.0, 0.0167])
+
+    columns, _ = load_data_from_csv(filename)
+
+    np.testing.assert_allclose(columns["Time (s)"], [0.0, 0.0167])
+
+
+def test_without_timestamps_has_no_time_column(tmp_path):
+    filename = str(tmp_path / "sweep.csv")
+    assert save_data_to_csv(filename, [0.0, 0.1], [0.0, 1e-6])
+
+    columns, _ = load_data_from_csv(filename)
+
+    assert list(columns) == ["Voltage (V)", "Current (A)"]
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from measurement import Measurement
+from waveform import Waveform
+
+
+def test_bipolar_loop_shares_the_points_between_segments():
+    waveform = Waveform.bipolar(1.0, -1.0, 0.1, repetitions=3)
+
+    voltages, limits, segments, first = waveform.cycle()
+
+    # 0 -> 1 (11 points), back to 0 and out to -1 and back (10 each): joints measured once
+    assert len(voltages) == 41
+    assert first == 1
+    np.testing.assert_array_equal(np.bincount(segments), [11, 10, 10, 10])
+    assert waveform.segment_range(2) == (21, 30)
+    assert voltages[waveform.point_index(0, 0.5)] == pytest.approx(0.5)
+
+    voltages, limits, cycles, segments = waveform.build()
+    # Later cycles drop the 0 V point that repeats the end of the previous cycle
+    assert len(voltages) == 41 + 2 * 40
+    np.testing.assert_array_equal(np.bincount(cycles), [41, 40, 40])
+    assert not np.any(np.diff(voltages) == 0)
+
+
+def test_segment_compliance_and_default():
+    waveform = Waveform(compliance=0.05).add_segment(0, 1, 0.5, compliance=1e-3).add_segment(1, -1, 0.5)
+
+    voltages, limits, segments, first = waveform.cycle()
+
+    np.testing.assert_allclose(voltages, [0, 0.5, 1, 0.5, 0, -0.5, -1])
+    np.testing.assert_allclose(limits, [1e-3] * 3 + [0.05] * 4)
+    assert first == 0
+
+
+def test_invalid_waveforms():
+    with pytest.raises(ValueError):
+        Waveform().cycle()
+    with pytest.raises(ValueError):
+        Waveform().add_segment(0, 1, 0)
+    with pytest.raises(ValueError):
+        Waveform.bipolar(-1.0, 1.0, 0.1)
+    with pytest.raises(ValueError):
+        Waveform(repetitions=0)
+
+
+def test_waveform_runs_as_one_list_with_per_segment_compliance(instrument, resource):
+    waveform = Waveform.bipolar(1.5, -1.5, 0.1, repetitions=2, set_compliance=1e-4, reset_compliance=1e-2)
+    measurement = Measurement(instrument)
+    resource.reset_counters()
+
+    voltages, currents = measurement.waveform_sweep(waveform)
+
+    assert len(voltages) == 121
+    np.testing.assert_array_equal(measurement.cycles, waveform.build()[2])
+    np.testing.assert_array_equal(measurement.segments, waveform.build()[3])
+    # Both cycles in a handful of bus transactions, not one per point
+    assert resource.transactions < 20
+    # The SET half is clamped at its own compliance; the RESET half at 1e-2 is not
+    set_half = measurement.segments <= 1
+    assert np.abs(currents[set_half]).max() == pytest.approx(1e-4, rel=1e-3)
+    assert np.abs(currents[~set_half]).max() > 1e-4